@@ -0,0 +1,78 @@
+import json
+import os
+from typing import List, Dict
+
+from entity import Individual
+from fitness import get_canonical_orders
+
+
+def get_archive_key(job_names: List[str], max_gpu_num: int, used_slice: bool) -> str:
+    return '\n'.join(sorted(set(job_names))) + f'\n{max_gpu_num}\n{int(used_slice)}'
+
+
+def translate_orders(orders: Dict[str, int], job_names: List[str]) -> List[int]:
+    # 已归档的作业沿用原来的相对次序, 新增的作业放在最后一个批次之后, 重新编号后仍在1~作业数之间。
+    known = [orders[job_name] for job_name in job_names if job_name in orders]
+    last_order = max(known) + 1 if len(known) > 0 else 1
+    return list(get_canonical_orders([orders.get(job_name, last_order) for job_name in job_names]))
+
+
+class ScheduleArchive:
+    def __init__(self, path: str, capacity: int = 5, max_entries: int = 100, min_overlap: float = 0.5):
+        self.path = path
+        self.capacity = capacity
+        self.max_entries = max_entries
+        self.min_overlap = min_overlap
+        self.entries = {}
+        # 未指定路径时只保存在内存中(如常驻的调度服务)。
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def lookup(self, job_names: List[str], max_gpu_num: int, used_slice: bool) -> List[List[int]]:
+        # 优先使用相同作业集合的记录, 否则按作业重合的比例从高到低使用GPU数目相同的记录。
+        entry = self.entries.get(get_archive_key(job_names, max_gpu_num, used_slice))
+        if entry is not None:
+            return [translate_orders(orders, job_names) for orders in entry['orders']]
+        current = set(job_names)
+        candidates = []
+        for entry in self.entries.values():
+            if entry['max_gpu_num'] != max_gpu_num or entry['used_slice'] != used_slice:
+                continue
+            overlap = len(current.intersection(entry['orders'][0])) / len(current.union(entry['orders'][0]))
+            if overlap >= self.min_overlap:
+                candidates.append((overlap, entry))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        seeds = [translate_orders(orders, job_names) for _, entry in candidates for orders in entry['orders']]
+        return seeds[:self.capacity]
+
+    def update(self, job_names: List[str], max_gpu_num: int, used_slice: bool, group: List[Individual]):
+        key = get_archive_key(job_names, max_gpu_num, used_slice)
+        entry = self.entries.pop(key, None)
+        records = [(individual.total_time, dict(zip(job_names, get_canonical_orders(individual.orders))))
+                   for individual in group]
+        if entry is not None:
+            records += list(zip(entry['total_time'], entry['orders']))
+        best_records = {}
+        for total_time, orders in sorted(records, key=lambda r: r[0]):
+            best_records.setdefault(tuple(orders[job_name] for job_name in job_names), (total_time, orders))
+        best_records = list(best_records.values())[:self.capacity]
+        # 字典按插入顺序保存, 超过上限时丢弃最久未更新的记录。
+        self.entries[key] = {'max_gpu_num': max_gpu_num,
+                             'used_slice': used_slice,
+                             'total_time': [total_time for total_time, _ in best_records],
+                             'orders': [orders for _, orders in best_records]}
+        while len(self.entries) > self.max_entries:
+            self.entries.pop(next(iter(self.entries)))
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
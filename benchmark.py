@@ -0,0 +1,404 @@
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import List, Dict, Tuple, Iterator
+
+from database import get_training_data
+from entity import TrainingData, TimeSlice, Batch, Plan, Job
+from exact import exact_execution
+from experiment import sequential_execution, parallel_execution, optimus_execution, ga_execution, get_job_list, \
+    get_plan, maximum_allocation, sorting_allocation, get_utility, get_optimus_plan
+from main import parser as main_parser, EXACT_MAX_JOBS
+from local_search import local_search_execution
+from online import OnlineScheduler, OptimusPolicy, PlanPolicy
+from workload import generate_training_data, generate_arrivals, SCALING_MODELS, SIZE_DISTRIBUTIONS
+
+SCHEDULERS = ['sequential', 'parallel', 'optimus', 'exact', 'ga', 'ga_slice']
+# 启动耗时基准: 作业启动器会反复调用调度命令, 这些命令的启动耗时和导入的可选依赖需要保持稳定。
+STARTUP_COMMANDS = {'help': ['main.py', '--help'],
+                    'import': ['-c', 'import main'],
+                    'csv': ['main.py', '-c', 'image', '--source', 'csv', '-i', '1', '-n', '2']}
+OPTIONAL_MODULES = ['mysql', 'matplotlib', 'numpy']
+
+parser = argparse.ArgumentParser(description='')
+parser.add_argument('--jobs', default=[5, 50, 500], type=int, nargs='*')
+parser.add_argument('--gpus', default=[8, 128, 1024], type=int, nargs='+')
+parser.add_argument('-m', '--model', default='mixed', choices=['mixed'] + SCALING_MODELS)
+parser.add_argument('-d', '--distribution', default='lognormal', choices=SIZE_DISTRIBUTIONS)
+parser.add_argument('--categories', default=[], type=str, nargs='*')
+parser.add_argument('--source', default=None, choices=['mysql', 'sqlite', 'csv', 'json'])
+parser.add_argument('--source-path', default=None, type=str)
+parser.add_argument('--seeds', default=[0], type=int, nargs='+')
+parser.add_argument('--schedulers', default=SCHEDULERS, choices=SCHEDULERS, nargs='+')
+parser.add_argument('-i', '--iteration-times', default=20, type=int)
+parser.add_argument('-n', '--individual-num', default=20, type=int)
+parser.add_argument('-o', '--output', default='./benchmark_results.json', type=str)
+parser.add_argument('-b', '--baseline', default=None, type=str)
+parser.add_argument('-r', '--repeat', default=3, type=int)
+parser.add_argument('--time-threshold', default=0.5, type=float)
+parser.add_argument('--time-tolerance', default=0.05, type=float)
+parser.add_argument('--memory-threshold', default=0.2, type=float)
+parser.add_argument('--makespan-threshold', default=0.001, type=float)
+parser.add_argument('--utilization-threshold', default=0.1, type=float)
+parser.add_argument('--startup', action='store_true')
+parser.add_argument('--startup-commands', default=list(STARTUP_COMMANDS), choices=list(STARTUP_COMMANDS), nargs='+')
+parser.add_argument('--startup-repeat', default=10, type=int)
+parser.add_argument('--allocation', action='store_true')
+parser.add_argument('--online', action='store_true')
+parser.add_argument('--local-search', action='store_true')
+parser.add_argument('--local-search-ms', default=0, type=float)
+parser.add_argument('--online-min-rate', default=1000, type=float)
+
+
+def run_scheduler(scheduler: str,
+                  job_names: List[str],
+                  max_gpu_num: int,
+                  data: Dict[str, Dict[int, TrainingData]],
+                  ga_args,
+                  seed: int) -> Plan:
+    ga_args.seed = seed
+    with contextlib.redirect_stdout(io.StringIO()):
+        if scheduler == 'sequential':
+            return sequential_execution(job_names, max_gpu_num, data)
+        elif scheduler == 'parallel':
+            return parallel_execution(job_names, max_gpu_num, data)
+        elif scheduler == 'optimus':
+            return optimus_execution(job_names, max_gpu_num, data)
+        elif scheduler == 'exact':
+            return exact_execution(job_names, max_gpu_num, data)
+        return ga_execution(job_names, max_gpu_num, data, ga_args, scheduler == 'ga_slice')
+
+
+def get_workloads(args) -> Iterator[Tuple[str, int, int, List[str], Dict[str, Dict[int, TrainingData]]]]:
+    for job_nums in args.jobs:
+        for max_gpu_num in args.gpus:
+            for seed in args.seeds:
+                yield ('synthetic', max_gpu_num, seed) + generate_training_data(job_nums, max_gpu_num, seed,
+                                                                                args.model, args.distribution)
+    for category in args.categories:
+        with open(f'./job_name_data/{category}.txt', 'r') as f:
+            job_names = [job_name.strip() for job_name in f]
+        for max_gpu_num in args.gpus:
+            data = get_training_data(job_names, max_gpu_num, source_type=args.source, source_path=args.source_path)
+            for seed in args.seeds:
+                yield category, max_gpu_num, seed, job_names, data
+
+
+def benchmark(args) -> List[Dict]:
+    ga_args = main_parser.parse_args(['-i', str(args.iteration_times), '-n', str(args.individual_num)])
+    results = []
+    for category, max_gpu_num, seed, job_names, data in get_workloads(args):
+        job_nums = len(job_names)
+        group_results = []
+        for scheduler in args.schedulers:
+            if scheduler == 'exact' and job_nums > EXACT_MAX_JOBS:
+                continue
+            wall_time = float('inf')
+            for _ in range(args.repeat):
+                start_time = time.perf_counter()
+                plan = run_scheduler(scheduler, job_names, max_gpu_num, data, ga_args, seed)
+                wall_time = min(wall_time, time.perf_counter() - start_time)
+
+            # 内存跟踪会拖慢运行, 因此峰值内存单独再运行一次统计。
+            tracemalloc.start()
+            run_scheduler(scheduler, job_names, max_gpu_num, data, ga_args, seed)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            plan.cal_utilization_rate()
+            result = {'scheduler': scheduler,
+                      'category': category,
+                      'job_nums': job_nums,
+                      'gpu_num': max_gpu_num,
+                      'seed': seed,
+                      'wall_time': wall_time,
+                      'peak_memory': peak_memory,
+                      'total_time': plan.total_time,
+                      'utilization_rate': plan.utilization_rate}
+            group_results.append(result)
+
+        # 同一负载的所有调度算法都与该负载的精确求解比较, 与调度算法的运行顺序无关。
+        exact_time = next((r['total_time'] for r in group_results if r['scheduler'] == 'exact'), None)
+        for result in group_results:
+            gap = ''
+            if exact_time is not None:
+                # 精确求解只在遗传算法不利用时间片的染色体空间内最优(每个批次按maximum_allocation分配GPU),
+                # 并不是全局最优: 利用时间片或以其他方式分配GPU的调度可能更短, 此时差距为负数。
+                result['exact_gap'] = result['total_time'] / exact_time - 1
+                gap = f', 与不利用时间片的最优划分相差: {round(result["exact_gap"] * 100, 3)}%'
+            results.append(result)
+            print(f'{result["scheduler"]:>10} {category:>9} jobs={job_nums:<4} gpus={max_gpu_num:<5} seed={seed} '
+                  f'耗时: {round(result["wall_time"], 3)}s, 峰值内存: {round(result["peak_memory"] / 2 ** 20, 3)}MB, '
+                  f'完成时间: {round(result["total_time"] / 60)}minutes, '
+                  f'利用率: {round(result["utilization_rate"], 3)}%{gap}.')
+    return results
+
+
+# 基于线性扫描的原始贪心分配, 作为堆实现的参照。
+def linear_maximum_allocation(max_gpu_num: int,
+                              job_list: List[Job],
+                              data: Dict[str, Dict[int, TrainingData]]):
+    for _ in range(max_gpu_num - len(job_list)):
+        max(job_list, key=lambda j: j.completion_time).add_gpu(1, data)
+    job_list.sort(key=lambda j: j.completion_time)
+
+
+def linear_sorting_allocation(job_list: List[Job],
+                              max_gpu_num: int,
+                              reverse: bool) -> Plan:
+    job_list.sort(key=lambda j: j.completion_time, reverse=reverse)
+    slice_list = [TimeSlice([job], job.gpu_num) for job in job_list[:max_gpu_num]]
+    for job in job_list[max_gpu_num:]:
+        min(slice_list, key=lambda s: s.actual_length).add_job(job)
+    plan = Plan([Batch(slice_list)], max_gpu_num)
+    plan.arrange_plan()
+    return plan
+
+
+def linear_optimus_allocation(max_gpu_num: int,
+                              job_list: List[Job],
+                              data: Dict[str, Dict[int, TrainingData]]):
+    for _ in range(max_gpu_num - len(job_list)):
+        utility_list = [get_utility(job, data) for job in job_list]
+        job_list[utility_list.index(max(utility_list))].add_gpu(1, data)
+    job_list.sort(key=lambda j: j.completion_time)
+
+
+def run_allocation(allocation,
+                   job_names: List[str],
+                   max_gpu_num: int,
+                   data: Dict[str, Dict[int, TrainingData]]) -> Plan:
+    if allocation is get_optimus_plan:
+        return get_optimus_plan(job_names, max_gpu_num, data)
+    job_list = get_job_list(job_names, [1] * len(job_names), [1] * len(job_names), data)
+    if allocation in (sorting_allocation, linear_sorting_allocation):
+        return allocation(job_list, max_gpu_num, True)
+    allocation(max_gpu_num, job_list, data)
+    return get_plan([job_list], max_gpu_num)
+
+
+def allocation_benchmark(args) -> List[Dict]:
+    # 堆实现每次分配为O(log n), 线性扫描为O(n), 大规模负载下比较两者的耗时。
+    job_names, data = generate_training_data(300, 1025, 0)
+    sorting_job_names, sorting_data = generate_training_data(3000, 1, 0)
+    workloads = [('optimus', get_optimus_plan, linear_optimus_allocation, job_names, 1024, data),
+                 ('maximum', maximum_allocation, linear_maximum_allocation, job_names, 1024, data),
+                 ('sorting', sorting_allocation, linear_sorting_allocation, sorting_job_names, 256, sorting_data)]
+    results = []
+    for name, allocation, linear_allocation, job_names, max_gpu_num, data in workloads:
+        times = {}
+        for key, func in [('heap', allocation), ('linear', linear_allocation)]:
+            times[key] = float('inf')
+            for _ in range(args.repeat):
+                start_time = time.perf_counter()
+                plan = run_allocation(func, job_names, max_gpu_num, data)
+                times[key] = min(times[key], time.perf_counter() - start_time)
+            times[f'{key}_total_time'] = plan.total_time
+        results.append({'allocation': name, 'job_nums': len(job_names), 'gpu_num': max_gpu_num,
+                        'heap_time': times['heap'], 'linear_time': times['linear'],
+                        'heap_total_time': times['heap_total_time'], 'linear_total_time': times['linear_total_time']})
+        print(f'{"allocation":>10} {name:>9} jobs={len(job_names):<4} gpus={max_gpu_num:<5} '
+              f'堆: {round(times["heap"], 3)}s, 线性: {round(times["linear"], 3)}s.')
+    return results
+
+
+def check_allocation(results: List[Dict]) -> List[str]:
+    # 堆实现必须与线性扫描的结果一致, 并且在大规模负载下更快。
+    regressions = []
+    for result in results:
+        name = f'allocation {result["allocation"]}'
+        if result['heap_total_time'] != result['linear_total_time']:
+            regressions.append(f'{name}: 完成时间 {result["linear_total_time"]:.3f} -> {result["heap_total_time"]:.3f}')
+        if result['heap_time'] >= result['linear_time']:
+            regressions.append(f'{name}: 堆 {result["heap_time"]:.3f}s 不快于线性 {result["linear_time"]:.3f}s')
+    return regressions
+
+
+def local_search_benchmark(args) -> List[Dict]:
+    # 相同的总耗时下比较两种做法: 遗传算法(-i次迭代)之后做局部搜索, 以及只运行遗传算法直到用完同样的时间。
+    results = []
+    for category, max_gpu_num, seed, job_names, data in get_workloads(args):
+        for scheduler in ['ga', 'ga_slice']:
+            used_slice = scheduler == 'ga_slice'
+            ga_args = main_parser.parse_args(['-i', str(args.iteration_times), '-n', str(args.individual_num),
+                                              '-s', str(seed)])
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                ga_plan = ga_execution(job_names, max_gpu_num, data, ga_args, used_slice)
+                plan = local_search_execution(ga_plan, job_names, max_gpu_num, data, used_slice,
+                                              time_budget_ms=args.local_search_ms)
+            wall_time = time.perf_counter() - start_time
+
+            budget_args = main_parser.parse_args(['-i', str(2 ** 31 - 1), '-n', str(args.individual_num),
+                                                  '-s', str(seed), '--time-budget-ms', str(wall_time * 1000)])
+            with contextlib.redirect_stdout(io.StringIO()):
+                budget_plan = ga_execution(job_names, max_gpu_num, data, budget_args, used_slice)
+            results.append({'scheduler': scheduler,
+                            'category': category,
+                            'job_nums': len(job_names),
+                            'gpu_num': max_gpu_num,
+                            'seed': seed,
+                            'wall_time': wall_time,
+                            'ga_total_time': ga_plan.total_time,
+                            'local_search_total_time': plan.total_time,
+                            'budget_total_time': budget_plan.total_time})
+            print(f'{scheduler:>10} {category:>9} jobs={len(job_names):<4} gpus={max_gpu_num:<5} seed={seed} '
+                  f'耗时: {round(wall_time, 3)}s, 遗传算法: {round(ga_plan.total_time / 60)}minutes, '
+                  f'加局部搜索: {round(plan.total_time / 60)}minutes, '
+                  f'同样时间的遗传算法: {round(budget_plan.total_time / 60)}minutes.')
+    wins = sum(r['local_search_total_time'] < r['budget_total_time'] for r in results)
+    losses = sum(r['local_search_total_time'] > r['budget_total_time'] for r in results)
+    print(f'局部搜索更短: {wins}次, 遗传算法更短: {losses}次, 相同: {len(results) - wins - losses}次.')
+    return results
+
+
+def online_benchmark(args) -> List[Dict]:
+    # 在线调度在64个GPU上处理50种作业的5000次到达(共10000个到达和完成事件), 只统计事件循环的耗时。
+    job_names, data = generate_training_data(50, 64, 0)
+    arrivals = generate_arrivals(job_names, 5000, 0.02, 0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = sequential_execution(job_names, 64, data)
+    results = []
+    for name, get_policy in [('optimus', OptimusPolicy), ('plan', lambda: PlanPolicy(plan))]:
+        wall_time = float('inf')
+        for _ in range(args.repeat):
+            scheduler = OnlineScheduler(64, data, get_policy())
+            for arrival_time, job_name in arrivals:
+                scheduler.submit(job_name, arrival_time)
+            start_time = time.perf_counter()
+            scheduler.run()
+            wall_time = min(wall_time, time.perf_counter() - start_time)
+        results.append({'policy': name,
+                        'event_nums': scheduler.event_nums,
+                        'wall_time': wall_time,
+                        'event_rate': scheduler.event_nums / max(wall_time, 1e-9)})
+        print(f'{"online":>10} {name:>9} 事件数: {scheduler.event_nums}, 耗时: {round(wall_time, 3)}s, '
+              f'每秒处理事件: {round(results[-1]["event_rate"])}.')
+    return results
+
+
+def check_online(results: List[Dict],
+                 args) -> List[str]:
+    return [f'online {result["policy"]}: 每秒处理事件 {round(result["event_rate"])} < {args.online_min_rate}'
+            for result in results if result['event_rate'] < args.online_min_rate]
+
+
+def parse_import_time(stderr: str) -> Tuple[float, List[str]]:
+    # 解析-X importtime的输出(单位为微秒), 顶层模块的累计耗时之和即为总的导入耗时。
+    import_time = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name[1:].startswith(' '):
+            import_time += int(cumulative) / 1e6
+        modules.add(name.strip().split('.')[0])
+    return import_time, [module for module in OPTIONAL_MODULES if module in modules]
+
+
+def startup_benchmark(args) -> List[Dict]:
+    results = []
+    for name in args.startup_commands:
+        command = [sys.executable] + STARTUP_COMMANDS[name]
+        wall_times = []
+        for _ in range(args.startup_repeat):
+            start_time = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            wall_times.append(time.perf_counter() - start_time)
+        # 导入耗时单独再运行一次统计, 同时记录导入了哪些可选依赖。
+        completed = subprocess.run(command[:1] + ['-X', 'importtime'] + command[1:], stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        import_time, modules = parse_import_time(completed.stderr)
+        results.append({'command': name,
+                        'wall_time': min(wall_times),
+                        'median_wall_time': statistics.median(wall_times),
+                        'import_time': import_time,
+                        'optional_modules': modules})
+        print(f'{"startup":>10} {name:>9} 耗时: {round(min(wall_times) * 1000, 3)}ms '
+              f'(中位数 {round(statistics.median(wall_times) * 1000, 3)}ms), '
+              f'导入耗时: {round(import_time * 1000, 3)}ms, 可选依赖: {", ".join(modules) or "无"}.')
+    return results
+
+
+def check_regression(results: List[Dict],
+                     baseline_results: List[Dict],
+                     args) -> List[str]:
+    def get_key(r: Dict) -> tuple:
+        return r['scheduler'], r['category'], r['job_nums'], r['gpu_num'], r['seed']
+
+    baseline = {get_key(r): r for r in baseline_results}
+    regressions = []
+    for result in results:
+        base = baseline.get(get_key(result))
+        if base is None:
+            continue
+        name = '{} {} jobs={} gpus={} seed={}'.format(*get_key(result))
+        # 耗时很短的调度器受计时噪声影响较大, 因此同时要求超出一个绝对容差。
+        if result['wall_time'] > max(base['wall_time'] * (1 + args.time_threshold),
+                                     base['wall_time'] + args.time_tolerance):
+            regressions.append(f'{name}: 耗时 {base["wall_time"]:.3f}s -> {result["wall_time"]:.3f}s')
+        if result['peak_memory'] > base['peak_memory'] * (1 + args.memory_threshold):
+            regressions.append(f'{name}: 峰值内存 {base["peak_memory"]} -> {result["peak_memory"]}')
+        if result['total_time'] > base['total_time'] * (1 + args.makespan_threshold):
+            regressions.append(f'{name}: 完成时间 {base["total_time"]:.3f} -> {result["total_time"]:.3f}')
+        if result['utilization_rate'] < base['utilization_rate'] - args.utilization_threshold:
+            regressions.append(f'{name}: 利用率 {base["utilization_rate"]:.3f}% -> {result["utilization_rate"]:.3f}%')
+    return regressions
+
+
+def check_startup_regression(results: List[Dict],
+                             baseline_results: List[Dict],
+                             args) -> List[str]:
+    baseline = {r['command']: r for r in baseline_results}
+    regressions = []
+    for result in results:
+        base = baseline.get(result['command'])
+        if base is None:
+            continue
+        name = f'startup {result["command"]}'
+        if result['wall_time'] > max(base['wall_time'] * (1 + args.time_threshold),
+                                     base['wall_time'] + args.time_tolerance):
+            regressions.append(f'{name}: 耗时 {base["wall_time"]:.3f}s -> {result["wall_time"]:.3f}s')
+        modules = set(result['optional_modules']) - set(base['optional_modules'])
+        if len(modules) > 0:
+            regressions.append(f'{name}: 新导入了 {", ".join(sorted(modules))}')
+    return regressions
+
+
+def main():
+    args = parser.parse_args()
+    # --startup/--allocation/--online/--local-search只运行对应的基准, 不运行各调度算法的基准。
+    results = benchmark(args) if not (args.startup or args.allocation or args.online or args.local_search) else []
+    startup_results = startup_benchmark(args) if args.startup else []
+    allocation_results = allocation_benchmark(args) if args.allocation else []
+    online_results = online_benchmark(args) if args.online else []
+    local_search_results = local_search_benchmark(args) if args.local_search else []
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+                   'results': results,
+                   'startup': startup_results,
+                   'allocation': allocation_results,
+                   'online': online_results,
+                   'local_search': local_search_results}, f, ensure_ascii=False, indent=2)
+
+    regressions = check_allocation(allocation_results) + check_online(online_results, args)
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions += check_regression(results, baseline['results'], args) + \
+            check_startup_regression(startup_results, baseline.get('startup', []), args)
+    for regression in regressions:
+        print(f'性能回退: {regression}')
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,280 @@
 import configparser
-from typing import List, Dict
-
-import mysql.connector
+import csv
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sqlite3
+from typing import List, Dict, Iterable, Tuple
 
 from entity import TrainingData
 
 
-def get_training_data(job_names: List[str],
-                      max_gpu_num: int) -> Dict[str, Dict[int, TrainingData]]:
+def build_training_data(rows: Iterable[Tuple[str, int, int, float]],
+                        job_names: List[str],
+                        max_gpu_num: int,
+                        interpolate: bool = False) -> Dict[str, Dict[int, TrainingData]]:
+    if interpolate:
+        # 只测量了部分GPU数目时, 由加速模型补全1~max_gpu_num个GPU的数据; 加速模型依赖numpy, 只在此时导入。
+        from speedup import fit_training_data
+        data, flags = fit_training_data(rows, job_names, max_gpu_num)
+        for job_name, reason in flags.items():
+            print(f'警告: 作业 {job_name} 的训练数据较为稀疏({reason}), 插值结果可能不准确.')
+        return data
+
+    data = {job_name: {} for job_name in job_names}
+    for job_name, gpu_num, epoch_num, epoch_time in rows:
+        if job_name in data and gpu_num <= max_gpu_num:
+            data[job_name].setdefault(gpu_num, TrainingData(epoch_num, epoch_time))
+
+    missing = [f'{job_name}(gpu_num={gpu_num})'
+               for job_name in job_names
+               for gpu_num in range(1, max_gpu_num + 1)
+               if gpu_num not in data[job_name]]
+    if len(missing) > 0:
+        raise ValueError(f'training_times 中缺少 {len(missing)} 条训练数据: {", ".join(missing)}')
+    return data
+
+
+# TrainingData等实体改为__slots__后旧快照无法反序列化, 格式变化时递增版本号使旧快照失效。
+SNAPSHOT_VERSION = 2
+
+
+def get_snapshot_path(cache_dir: str,
+                      job_names: List[str],
+                      max_gpu_num: int,
+                      interpolate: bool = False) -> str:
+    key = '\n'.join(sorted(set(job_names))) + f'\n{max_gpu_num}'
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    suffix = '_dense' if interpolate else ''
+    return os.path.join(cache_dir, f'training_data_v{SNAPSHOT_VERSION}_{digest}{suffix}.pickle')
+
+
+def load_snapshot(path: str) -> Tuple[tuple, Dict[str, Dict[int, TrainingData]]]:
+    with open(path, 'rb') as f:
+        snapshot = pickle.load(f)
+    return snapshot['table_version'], snapshot['data']
+
+
+def save_snapshot(path: str,
+                  table_version: tuple,
+                  data: Dict[str, Dict[int, TrainingData]]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump({'table_version': table_version, 'data': data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+INSERT_COLUMNS = ('job_name', 'dataset', 'batch_size', 'epoch_num', 'gpu_num', 'epoch_time')
+
+
+def get_insert_records(rows: Iterable[Tuple[str, int, int, float]],
+                       dataset: str = 'synthetic') -> Iterable[tuple]:
+    for job_name, gpu_num, epoch_num, epoch_time in rows:
+        yield job_name, dataset, 0, epoch_num, gpu_num, epoch_time
+
+
+def get_chunks(records: Iterable[tuple], chunk_size: int = 1000) -> Iterable[List[tuple]]:
+    records = iter(records)
+    chunk = list(itertools.islice(records, chunk_size))
+    while len(chunk) > 0:
+        yield chunk
+        chunk = list(itertools.islice(records, chunk_size))
+
+
+# max_gpu_num为None时读取作业的全部测量值: 插值时超过目标GPU数目的测量值同样参与拟合。
+class DataSource:
+    def fetch_rows(self,
+                   job_names: List[str],
+                   max_gpu_num: int = None) -> List[Tuple[str, int, int, float]]:
+        raise NotImplementedError
+
+    def write_rows(self, rows: Iterable[Tuple[str, int, int, float]]):
+        raise NotImplementedError
+
+    def get_training_data(self,
+                          job_names: List[str],
+                          max_gpu_num: int,
+                          refresh: bool = False,
+                          interpolate: bool = False) -> Dict[str, Dict[int, TrainingData]]:
+        rows = self.fetch_rows(job_names, None if interpolate else max_gpu_num)
+        return build_training_data(rows, job_names, max_gpu_num, interpolate)
+
+
+class MySQLSource(DataSource):
+    def __init__(self,
+                 user: str,
+                 password: str,
+                 database: str,
+                 cache_dir: str,
+                 validate: bool):
+        self.user = user
+        self.password = password
+        self.database = database
+        self.cache_dir = cache_dir
+        self.validate = validate
+
+    def _connect(self):
+        # 只有实际访问MySQL时才导入驱动, 使用其他数据源或读取快照时不需要安装和加载它。
+        import mysql.connector
+        return mysql.connector.connect(user=self.user, password=self.password, database=self.database)
+
+    def fetch_rows(self,
+                   job_names: List[str],
+                   max_gpu_num: int = None) -> List[Tuple[str, int, int, float]]:
+        return self._query(job_names, max_gpu_num)[1]
+
+    def _query(self,
+               job_names: List[str],
+               max_gpu_num: int = None,
+               snapshot_version: tuple = None) -> Tuple[tuple, List[Tuple[str, int, int, float]]]:
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT COUNT(*), MAX(id) FROM training_times')
+        table_version = tuple(cursor.fetchone())
+        rows = None
+        if snapshot_version != table_version:
+            placeholders = ', '.join(['%s'] * len(job_names))
+            gpu_filter = ' AND gpu_num <= %s' if max_gpu_num is not None else ''
+            cursor.execute(f'SELECT job_name, gpu_num, epoch_num, epoch_time FROM training_times '
+                           f'WHERE job_name IN ({placeholders}){gpu_filter} ORDER BY id',
+                           [*job_names] + ([max_gpu_num] if max_gpu_num is not None else []))
+            rows = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+        return table_version, rows
+
+    def write_rows(self, rows: Iterable[Tuple[str, int, int, float]]):
+        conn = self._connect()
+        cursor = conn.cursor()
+        for chunk in get_chunks(get_insert_records(rows)):
+            cursor.executemany(f'INSERT INTO training_times ({", ".join(INSERT_COLUMNS)}) '
+                               f'VALUES ({", ".join(["%s"] * len(INSERT_COLUMNS))})', chunk)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    def get_training_data(self,
+                          job_names: List[str],
+                          max_gpu_num: int,
+                          refresh: bool = False,
+                          interpolate: bool = False) -> Dict[str, Dict[int, TrainingData]]:
+        # 快照以作业集合和GPU数目为键, 默认直接使用快照而不连接数据库; 插值补全后的完整数据单独保存快照。
+        snapshot_path = get_snapshot_path(self.cache_dir, job_names, max_gpu_num, interpolate)
+        snapshot_version, snapshot_data = None, None
+        if not refresh and os.path.exists(snapshot_path):
+            snapshot_version, snapshot_data = load_snapshot(snapshot_path)
+            if not self.validate:
+                return snapshot_data
+
+        table_version, rows = self._query(job_names, None if interpolate else max_gpu_num, snapshot_version)
+        if rows is None:
+            return snapshot_data
+
+        data = build_training_data(rows, job_names, max_gpu_num, interpolate)
+        save_snapshot(snapshot_path, table_version, data)
+        return data
+
+
+class SQLiteSource(DataSource):
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch_rows(self,
+                   job_names: List[str],
+                   max_gpu_num: int = None) -> List[Tuple[str, int, int, float]]:
+        conn = sqlite3.connect(self.path)
+        placeholders = ', '.join(['?'] * len(job_names))
+        gpu_filter = ' AND gpu_num <= ?' if max_gpu_num is not None else ''
+        rows = conn.execute(f'SELECT job_name, gpu_num, epoch_num, epoch_time FROM training_times '
+                            f'WHERE job_name IN ({placeholders}){gpu_filter} ORDER BY id',
+                            [*job_names] + ([max_gpu_num] if max_gpu_num is not None else [])).fetchall()
+        conn.close()
+        return rows
+
+    def write_rows(self, rows: Iterable[Tuple[str, int, int, float]]):
+        conn = sqlite3.connect(self.path)
+        with open('./sql/database_sqlite.sql', 'r', encoding='utf-8') as f:
+            conn.executescript(f.read())
+        for chunk in get_chunks(get_insert_records(rows)):
+            conn.executemany(f'INSERT INTO training_times ({", ".join(INSERT_COLUMNS)}) '
+                             f'VALUES ({", ".join(["?"] * len(INSERT_COLUMNS))})', chunk)
+        conn.commit()
+        conn.close()
+
+
+class FileSource(DataSource):
+    def __init__(self, path: str):
+        self.path = path
+
+    def read_records(self) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+    def fetch_rows(self,
+                   job_names: List[str],
+                   max_gpu_num: int = None) -> List[Tuple[str, int, int, float]]:
+        job_name_set = set(job_names)
+        records = [r for r in self.read_records()
+                   if r['job_name'] in job_name_set and (max_gpu_num is None or int(r['gpu_num']) <= max_gpu_num)]
+        records.sort(key=lambda r: int(r.get('id', 0)))
+        return [(r['job_name'], int(r['gpu_num']), int(r['epoch_num']), float(r['epoch_time'])) for r in records]
+
+
+class CSVSource(FileSource):
+    def read_records(self) -> List[Dict[str, str]]:
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+
+    def write_rows(self, rows: Iterable[Tuple[str, int, int, float]]):
+        with open(self.path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('id',) + INSERT_COLUMNS)
+            for i, record in enumerate(get_insert_records(rows), 1):
+                writer.writerow((i,) + record)
+
+
+class JSONSource(FileSource):
+    def read_records(self) -> List[Dict[str, str]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_rows(self, rows: Iterable[Tuple[str, int, int, float]]):
+        # 逐条写入数组元素, 避免先在内存中构造整个列表。
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for i, record in enumerate(get_insert_records(rows), 1):
+                f.write(',\n' if i > 1 else '\n')
+                json.dump(dict(zip(('id',) + INSERT_COLUMNS, (i,) + record)), f)
+            f.write('\n]\n')
+
+
+def get_data_source(source_type: str = None, source_path: str = None) -> DataSource:
     cp = configparser.ConfigParser()
     cp.read('./database_config.ini', encoding='utf-8')
+    source_type = source_type or cp.get('source', 'type', fallback='mysql')
+    source_path = source_path or cp.get('source', source_type, fallback=None)
 
-    conn = mysql.connector.connect(user=cp['debug']['user'],
-                                   password=cp['debug']['password'],
-                                   database=cp['debug']['database'])
-    cursor = conn.cursor()
+    if source_type == 'mysql':
+        return MySQLSource(user=cp['debug']['user'],
+                           password=cp['debug']['password'],
+                           database=cp['debug']['database'],
+                           cache_dir=cp.get('cache', 'path', fallback='./cache'),
+                           validate=cp.getboolean('cache', 'validate', fallback=False))
+    elif source_type == 'sqlite':
+        return SQLiteSource(source_path)
+    elif source_type == 'csv':
+        return CSVSource(source_path)
+    elif source_type == 'json':
+        return JSONSource(source_path)
+    raise ValueError(f'未知的数据源类型: {source_type}')
 
-    data = {}
-    for job_name in job_names:
-        data.setdefault(job_name, {})
-        for gpu_num in range(1, max_gpu_num + 1):
-            cursor.execute('SELECT epoch_num, epoch_time FROM training_times WHERE job_name=%s AND gpu_num=%s',
-                           [job_name, gpu_num])
-            result = cursor.fetchone()
-            data[job_name][gpu_num] = TrainingData(result[0], result[1])
 
-    cursor.close()
-    conn.close()
-
-    return data
+def get_training_data(job_names: List[str],
+                      max_gpu_num: int,
+                      refresh: bool = False,
+                      source_type: str = None,
+                      source_path: str = None,
+                      interpolate: bool = False) -> Dict[str, Dict[int, TrainingData]]:
+    return get_data_source(source_type, source_path).get_training_data(job_names, max_gpu_num, refresh, interpolate)
@@ -1,10 +1,5 @@
 from typing import Dict, List
 
-import matplotlib
-import matplotlib.pyplot as plt
-
-matplotlib.rcParams['font.family'] = ['Microsoft YaHei']
-
 alexnet = [25.245, 16.03, 14.637, 9.074, 8.987, 7.541, 6.419, 5.63]
 resnet50 = [33.595, 18.84, 16.389, 13.064, 11.136, 9.81, 8.786, 8.068]
 resnext50 = [71.954, 40.441, 28.105, 21.81, 18.178, 15.688, 13.771, 12.428]
@@ -38,6 +33,11 @@ action_data_dict = {
 def draw_epoch_data(file_name: str,
                     data_dict: Dict[str, List[int]],
                     y_ticks: List[int]) -> None:
+    # 只有绘图时才导入matplotlib, 只使用本模块中的测量数据时不依赖它。
+    import matplotlib
+    import matplotlib.pyplot as plt
+    matplotlib.rcParams['font.family'] = ['Microsoft YaHei']
+
     x_data = [1, 2, 4, 8, 16, 32]
     x_index = [1, 2, 3, 4, 5, 6]
 
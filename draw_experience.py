@@ -1,62 +1,56 @@
-from typing import Dict, List
-
-import matplotlib
-import matplotlib.pyplot as plt
-
-matplotlib.rcParams['font.family'] = ['Microsoft YaHei']
-
-image_data_dict = {
-    'SeqEx': [537, 301, 178],
-    'NoReuse': [520, 266, 145],
-    'Themis': [480, 298, 172],
-    'Optimus': [520, 382, 172],
-    'OMRU': [462, 254, 135]
-}
-action_data_dict = {
-    'SeqEx': [1197, 654, 381],
-    'NoReuse': [1171, 631, 349],
-    'Themis': [1314, 1314, 380],
-    'Optimus': [1671, 1356, 694],
-    'OMRU': [1097, 566, 303]
-}
-
-image_ratio_dict = {
-    'SeqEx': [537 / 462, 301 / 254, 178 / 135],
-    'NoReuse': [520 / 462, 266 / 254, 145 / 135],
-    'Themis': [480 / 462, 298 / 254, 172 / 135],
-    'Optimus': [520 / 462, 382 / 254, 172 / 135]
-}
-action_ratio_dict = {
-    'SeqEx': [1197 / 1097, 654 / 566, 381 / 303],
-    'NoReuse': [1171 / 1097, 631 / 566, 349 / 303],
-    'Themis': [1314 / 1097, 1314 / 566, 380 / 303],
-    'Optimus': [1671 / 1097, 1356 / 566, 694 / 303]
-}
-
-image_resource_dict = {
-    'SeqEx': [100, 100, 100],
-    'NoReuse': [88.758, 98.219, 90.67],
-    'Themis': [99.839, 77.562, 72.708],
-    'Optimus': [88.758, 60.464, 72.708],
-    'OMRU': [99.839, 99.936, 97.996]
-}
-action_resource_dict = {
-    'SeqEx': [100, 100, 100],
-    'NoReuse': [97.127, 98.265, 98.613],
-    'Themis': [80.744, 40.372, 73.959],
-    'Optimus': [63.502, 39.113, 40.954],
-    'OMRU': [99.897, 99.964, 98.754]
-}
+import json
+import math
+import statistics
+import sys
+from typing import Dict, List, Tuple
+
+BASE_NAMES = ['OMRU', 'ga_slice']
+
+
+def load_experience_data(file_name: str,
+                         category: str,
+                         metric: str,
+                         gpus_per_node: int = 8) -> Tuple[List[int], Dict[str, List[float]]]:
+    # 同一调度算法在同一GPU数目下可能有多条记录(多个种子或重复运行), 取平均值后按GPU数目对齐到横轴;
+    # 缺少的点为nan, 绘图时跳过。
+    with open(file_name, 'r', encoding='utf-8') as f:
+        results = [r for r in json.load(f)['results'] if r['category'] == category]
+    gpu_nums = sorted({r['gpu_num'] for r in results})
+    values = {}
+    for r in sorted(results, key=lambda r: r['gpu_num']):
+        values.setdefault(r['scheduler'], {}).setdefault(r['gpu_num'], []).append(r[metric])
+    data_dict = {scheduler: [statistics.mean(by_gpu[g]) if g in by_gpu else math.nan for g in gpu_nums]
+                 for scheduler, by_gpu in values.items()}
+    return [gpu_num // gpus_per_node for gpu_num in gpu_nums], data_dict
+
+
+def get_base_name(data_dict: Dict[str, List[float]]) -> str:
+    # 论文结果中的OMRU即benchmark.py输出中利用时间片的遗传算法ga_slice。
+    for base_name in BASE_NAMES:
+        if base_name in data_dict:
+            return base_name
+    raise ValueError(f'结果文件中没有 {"/".join(BASE_NAMES)}, 请指定基准调度算法: {", ".join(data_dict)}')
+
+
+def get_ratio_dict(data_dict: Dict[str, List[float]],
+                   base_name: str) -> Dict[str, List[float]]:
+    return {name: [x / y for x, y in zip(data, data_dict[base_name])]
+            for name, data in data_dict.items() if name != base_name}
 
 
 def draw_experience_data(file_name: str,
+                         x_data: List[int],
                          data_dict: Dict[str, List[float]],
                          y_ticks: List[float],
                          ratio: int):
-    x_data = [2, 4, 8]
-    x_index = [1, 2, 3]
+    # 只有绘图时才导入matplotlib, 读取和换算实验数据不依赖它。
+    import matplotlib
+    import matplotlib.pyplot as plt
+    matplotlib.rcParams['font.family'] = ['Microsoft YaHei']
 
-    colors = ['#0000ff', '#ff0000', '#000000', '#007f00', '#00bfbf']
+    x_index = list(range(1, len(x_data) + 1))
+
+    colors = ['#0000ff', '#ff0000', '#000000', '#007f00', '#00bfbf', '#bf00bf']
     shapes = ['d', 'p', '^', 's', 'D', 'o']
 
     index = 0
@@ -87,11 +81,20 @@ def draw_experience_data(file_name: str,
 
 
 if __name__ == '__main__':
-    draw_experience_data('1', image_data_dict, [2, 4, 6, 8], 60)
-    draw_experience_data('2', action_data_dict, [5, 10, 15, 20, 25], 60)
+    # 默认读取论文实验结果, 也可以传入benchmark.py输出的结果文件。
+    results_file = sys.argv[1] if len(sys.argv) > 1 else './benchmark_data/paper_results.json'
+
+    image_nodes, image_data_dict = load_experience_data(results_file, 'image', 'total_time')
+    action_nodes, action_data_dict = load_experience_data(results_file, 'action', 'total_time')
+    base_name = sys.argv[2] if len(sys.argv) > 2 else get_base_name(image_data_dict)
+    draw_experience_data('1', image_nodes, image_data_dict, [2, 4, 6, 8], 3600)
+    draw_experience_data('2', action_nodes, action_data_dict, [5, 10, 15, 20, 25], 3600)
 
-    draw_experience_data('11', image_ratio_dict, [1.1, 1.2, 1.3, 1.4, 1.5], 1)
-    draw_experience_data('22', action_ratio_dict, [1.00, 1.25, 1.50, 1.75, 2.00, 2.25], 1)
+    draw_experience_data('11', image_nodes, get_ratio_dict(image_data_dict, base_name), [1.1, 1.2, 1.3, 1.4, 1.5], 1)
+    draw_experience_data('22', action_nodes, get_ratio_dict(action_data_dict, base_name),
+                         [1.00, 1.25, 1.50, 1.75, 2.00, 2.25], 1)
 
-    draw_experience_data('111', image_resource_dict, [60, 70, 80, 90, 100], 1)
-    draw_experience_data('222', action_resource_dict, [40, 60, 80, 100], 1)
+    _, image_resource_dict = load_experience_data(results_file, 'image', 'utilization_rate')
+    _, action_resource_dict = load_experience_data(results_file, 'action', 'utilization_rate')
+    draw_experience_data('111', image_nodes, image_resource_dict, [60, 70, 80, 90, 100], 1)
+    draw_experience_data('222', action_nodes, action_resource_dict, [40, 60, 80, 100], 1)
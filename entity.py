@@ -1,9 +1,21 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from typing import List, Dict
 
 
+# python3.7的dataclass不支持slots参数, 这里按字段重新创建带__slots__的类, 去掉每个实例的__dict__。
+def slotted(cls):
+    cls_dict = dict(cls.__dict__)
+    cls_dict['__slots__'] = tuple(f.name for f in fields(cls))
+    for name in cls_dict['__slots__']:
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+@slotted
 @dataclass
 class Job:
     name: str
@@ -26,20 +38,27 @@ class Job:
         self.cal_completion_time()
 
 
+@slotted
 @dataclass
 class TimeSlice:
     job_list: List[Job]
     gpu_num: int
-    actual_length: float = 0
+    actual_length: float = None
     remain_length: float = 0
+    gpu_ids: List[int] = field(default=None, repr=False)
+
+    # 没有传入实际时间时按作业列表累加一次, 之后随作业的添加和弹出增量维护。
+    def __post_init__(self):
+        if self.actual_length is None:
+            self.cal_actual_length()
 
     def add_job(self, job: Job):
         self.job_list.append(job)
-        self.cal_actual_length()
+        self.actual_length += job.completion_time
 
     def pop_job(self) -> Job:
         job = self.job_list.pop()
-        self.cal_actual_length()
+        self.actual_length = self.actual_length - job.completion_time if self.job_list else 0
         return job
 
     def cal_actual_length(self):
@@ -51,24 +70,61 @@ class TimeSlice:
         self.remain_length = max_slice_length - self.actual_length
 
 
+@slotted
 @dataclass
 class Batch:
     slice_list: List[TimeSlice]
     max_slice_length: float = 0
 
-    def arrange_batch(self):
-        for ts in self.slice_list:
-            ts.cal_actual_length()
+    def cal_max_slice_length(self):
         self.max_slice_length = max(self.slice_list, key=lambda s: s.actual_length).actual_length
         for ts in self.slice_list:
             ts.cal_remain_length(self.max_slice_length)
+
+    def arrange_batch(self):
+        self.cal_max_slice_length()
         self.slice_list.sort(key=lambda s: s.actual_length)
 
+    # 以下方法要求slice_list已经按实际长度升序排列(arrange_batch之后)。
     def get_reverse_slice_list(self) -> List[TimeSlice]:
-        self.slice_list.sort(key=lambda s: s.actual_length, reverse=True)
-        return self.slice_list
+        # 从长到短逐组取出, 长度相同的时间片保持原有先后, 与稳定的降序排序结果一致, 但不改变slice_list。
+        reverse_slice_list = []
+        end = len(self.slice_list)
+        while end > 0:
+            start = end - 1
+            while start > 0 and self.slice_list[start - 1].actual_length == self.slice_list[end - 1].actual_length:
+                start -= 1
+            reverse_slice_list += self.slice_list[start:end]
+            end = start
+        return reverse_slice_list
+
+    def insert_slice(self, ts: TimeSlice):
+        # 二分查找插入到长度相同的时间片之前(python3.7的bisect不支持key参数)。
+        lo, hi = 0, len(self.slice_list)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.slice_list[mid].actual_length < ts.actual_length:
+                lo = mid + 1
+            else:
+                hi = mid
+        self.slice_list.insert(lo, ts)
+
+    def update_slices(self, changed_slice_list: List[TimeSlice]):
+        # 只把长度变化了的时间片取出后重新插入, 其余时间片保持有序。changed_slice_list按修改前的先后给出,
+        # 倒序插入到相同长度之前, 使结果与按新长度重新稳定排序一致; 最大长度不变时只需更新这些时间片的剩余时间。
+        changed_ids = {id(ts) for ts in changed_slice_list}
+        self.slice_list = [ts for ts in self.slice_list if id(ts) not in changed_ids]
+        for ts in reversed(changed_slice_list):
+            self.insert_slice(ts)
+        max_slice_length = self.slice_list[-1].actual_length
+        if max_slice_length != self.max_slice_length:
+            self.max_slice_length = max_slice_length
+            changed_slice_list = self.slice_list
+        for ts in changed_slice_list:
+            ts.cal_remain_length(self.max_slice_length)
 
 
+@slotted
 @dataclass
 class Plan:
     plan: List[Batch]
@@ -107,13 +163,56 @@ class Plan:
         print('=' * 100)
 
 
+@slotted
 @dataclass
 class Individual:
     orders: List[int] = None
     plan: Plan = None
+    total_time: float = 0
+
+    # 方案在每次评估时都会重新计算, 复制个体时只需复制染色体及其适应度。
+    def copy(self) -> Individual:
+        return Individual(self.orders[:], total_time=self.total_time)
 
 
+@slotted
 @dataclass
 class TrainingData:
     epoch_num: int
     epoch_time: float
+
+
+@slotted
+@dataclass
+class Cluster:
+    node_num: int
+    gpus_per_node: int
+    intra_node_speed: float = 1
+    inter_node_speed: float = 1
+
+    def get_max_gpu_num(self) -> int:
+        return self.node_num * self.gpus_per_node
+
+    def get_node_span(self, gpu_num: int) -> int:
+        return -(-gpu_num // self.gpus_per_node)
+
+    def get_speed(self, node_span: int) -> float:
+        return self.intra_node_speed if node_span <= 1 else self.inter_node_speed
+
+    # 按最少需要跨越的节点数调整迭代时间, 调度算法无需改动即可感知拓扑。
+    def adjust_training_data(self, data: Dict[str, Dict[int, TrainingData]]) -> Dict[str, Dict[int, TrainingData]]:
+        speeds = {gpu_num: self.get_speed(self.get_node_span(gpu_num))
+                  for gpu_num in range(1, self.get_max_gpu_num() + 1)}
+        return {job_name: {gpu_num: TrainingData(td.epoch_num, td.epoch_time / speeds[gpu_num])
+                           for gpu_num, td in job_data.items() if gpu_num in speeds}
+                for job_name, job_data in data.items()}
+
+
+@slotted
+@dataclass
+class ParetoPlan:
+    orders: List[int]
+    plan: Plan
+    total_time: float
+    utilization_rate: float
+    average_jct: float
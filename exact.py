@@ -0,0 +1,120 @@
+import time
+from typing import List, Dict
+
+import numpy as np
+
+from entity import TrainingData, Plan, Individual, Cluster
+from experiment import cal_individual_plan, report_plan, get_heuristic_orders
+from fitness import pack_training_data, cal_group_fitness
+
+
+class ExactSolver:
+    # 不利用空闲时间片时各批次相互独立, 总时间为各批次最长时间之和, 与批次的先后无关,
+    # 因此只需在作业集合的划分上求最小值: 每个子集作为一个批次, 不足max_gpu_num个作业时按
+    # maximum_allocation分配GPU, 恰好max_gpu_num个作业时各占一个GPU(与cal_individual_plan的切分一致)。
+    # 因此得到的是遗传算法不利用时间片的染色体空间内的最优划分, 批次内GPU的分配方式固定为上述贪心,
+    # 并不是所有调度方案中的最优解, Optimus等以其他方式分配GPU的方案可能更短。
+    def __init__(self,
+                 job_names: List[str],
+                 max_gpu_num: int,
+                 data: Dict[str, Dict[int, TrainingData]]):
+        self.job_names = job_names
+        self.job_nums = len(job_names)
+        self.max_gpu_num = max_gpu_num
+        self.epoch_num, self.epoch_time = pack_training_data(job_names, max_gpu_num, data)
+        # 与get_job_list一致, 迭代次数取1个GPU时的值。
+        self.completion_time = self.epoch_num[:, 1, None] * self.epoch_time
+        self.masks = np.arange(1 << self.job_nums)
+        self.members = (self.masks[:, None] >> np.arange(self.job_nums)) & 1 == 1
+        self.sizes = self.members.sum(axis=1)
+        self.batch_time = self.get_batch_time()
+        self.lower_bound = self.get_lower_bound()
+        self.state_nums = 0
+        self.pruned_nums = 0
+
+    def get_batch_time(self) -> np.ndarray:
+        # 对所有不超过max_gpu_num个作业的子集同时执行maximum_allocation: 作业按1个GPU时的完成时间稳定排序,
+        # argmax取第一个最大值, 与以(-完成时间, 下标)为键的堆在完成时间相同时的选择一致。
+        job_index = np.argsort(self.completion_time[:, 1], kind='stable')
+        members = self.members[:, job_index]
+        valid = self.sizes <= self.max_gpu_num
+        members = members[valid]
+        rows = np.arange(len(members))
+        gpu = members.astype(np.int64)
+        own = np.where(members, self.completion_time[job_index, 1], -np.inf)
+        spare = self.max_gpu_num - members.sum(axis=1)
+        while True:
+            active = rows[spare > 0]
+            if len(active) == 0:
+                break
+            k = own[active].argmax(axis=1)
+            gpu[active, k] += 1
+            own[active, k] = self.completion_time[job_index[k], gpu[active, k]]
+            spare[active] -= 1
+        batch_time = np.full(len(self.masks), np.inf)
+        batch_time[valid] = own.max(axis=1, initial=0)
+        return batch_time
+
+    def get_lower_bound(self) -> np.ndarray:
+        # 下界取两者中的较大值: 作业按任意GPU数目下的最短时间降序排列后, 每个批次至多容纳max_gpu_num个作业,
+        # 第k个批次的最长时间不小于第k*max_gpu_num个作业的最短时间; 所有作业最少的GPU时间平摊到全部GPU上。
+        min_time = self.completion_time[:, 1:].min(axis=1)
+        min_area = (self.completion_time[:, 1:] * np.arange(1, self.max_gpu_num + 1)).min(axis=1)
+        area = self.members @ min_area / self.max_gpu_num
+        sorted_time = -np.sort(-np.where(self.members, min_time, 0), axis=1)
+        batch_bound = sorted_time[:, ::self.max_gpu_num].sum(axis=1)
+        return np.maximum(area, batch_bound)
+
+    def solve(self, upper_bound: float = np.inf) -> List[int]:
+        # 按子集从小到大的顺序做状态压缩动态规划, total_time[mask]为把mask中的作业划分为若干批次的最短总时间,
+        # 每次取包含编号最小作业的子集作为一个批次。已用作业和剩余作业的下界之和不小于上界的状态直接剪枝。
+        full_mask = len(self.masks) - 1
+        total_time = np.full(len(self.masks), np.inf)
+        total_time[0] = 0
+        first_batch = np.zeros(len(self.masks), dtype=np.int64)
+        weights = 1 << np.arange(self.job_nums)
+        for mask in range(1, full_mask + 1):
+            if self.lower_bound[mask] + self.lower_bound[full_mask ^ mask] >= upper_bound:
+                self.pruned_nums += 1
+                continue
+            self.state_nums += 1
+            low = mask & -mask
+            bits = weights[self.members[mask ^ low]]
+            batches = self.members[:1 << len(bits), :len(bits)] @ bits | low
+            candidates = self.batch_time[batches] + total_time[mask ^ batches]
+            k = int(candidates.argmin())
+            total_time[mask] = candidates[k]
+            first_batch[mask] = batches[k]
+        self.total_time = total_time[full_mask]
+        if self.total_time >= upper_bound:
+            return []
+
+        orders = [0] * self.job_nums
+        mask, order = full_mask, 1
+        while mask > 0:
+            for k in range(self.job_nums):
+                if first_batch[mask] >> k & 1:
+                    orders[k] = order
+            mask ^= int(first_batch[mask])
+            order += 1
+        return orders
+
+
+def exact_execution(job_names: List[str],
+                    max_gpu_num: int,
+                    data: Dict[str, Dict[int, TrainingData]],
+                    cluster: Cluster = None) -> Plan:
+    start_time = time.perf_counter()
+    solver = ExactSolver(job_names, max_gpu_num, data)
+    # 以启发式调度方案中最好的一个作为初始上界, 动态规划找不到更好的划分时沿用该方案。
+    heuristic_orders = get_heuristic_orders(job_names, max_gpu_num, data)
+    heuristic_time, _ = cal_group_fitness(np.array(heuristic_orders), max_gpu_num, solver.epoch_num,
+                                          solver.epoch_time, False)
+    k = int(heuristic_time.argmin())
+    orders = solver.solve(heuristic_time[k])
+    best_individual = Individual(orders if len(orders) > 0 else heuristic_orders[k])
+    elapsed_time = time.perf_counter() - start_time
+    cal_individual_plan(best_individual, max_gpu_num, job_names, data, False)
+    report_plan(best_individual.plan, data, cluster)
+    print(f'搜索状态数: {solver.state_nums}, 剪枝状态数: {solver.pruned_nums}, 耗时: {round(elapsed_time * 1000, 3)}ms.')
+    return best_individual.plan
@@ -1,8 +1,20 @@
+import heapq
 import itertools
-from typing import List, Dict
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Callable
 
-from entity import Job, TrainingData, TimeSlice, Plan, Individual, Batch
-from genetic_algorithm import init_individual, selection, cross_over, mutation_process, preferential_admission
+import numpy as np
+
+from entity import Job, TrainingData, TimeSlice, Plan, Individual, Batch, Cluster
+from fitness import pack_training_data, evaluate_group, evaluate_orders, get_canonical_orders, FitnessCache, \
+    EvaluationPool
+from genetic_algorithm import init_individual, selection, cross_over, mutation_process, preferential_admission, \
+    migration, Termination, get_random, spawn_random, matrix_selection, matrix_cross_over, matrix_mutation, \
+    matrix_preferential_admission
+from archive import ScheduleArchive
+from instrumentation import Instrumentation, call
+from topology import place_plan, print_placement
 
 
 def get_job_list(job_names: List[str],
@@ -41,10 +53,14 @@ def get_plan(group_list: List[List[Job]],
 def maximum_allocation(max_gpu_num: int,
                        job_list: List[Job],
                        data: Dict[str, Dict[int, TrainingData]]):
+    # 以(-完成时间, 下标)为键的最大堆, 完成时间相同时与max一样取列表中靠前的作业。
+    heap = [(-job.completion_time, i) for i, job in enumerate(job_list)]
+    heapq.heapify(heap)
     remain_gpu_num = max_gpu_num - len(job_list)
     while remain_gpu_num > 0:
-        max_time_job = max(job_list, key=lambda j: j.completion_time)
-        max_time_job.add_gpu(1, data)
+        _, i = heap[0]
+        job_list[i].add_gpu(1, data)
+        heapq.heapreplace(heap, (-job_list[i].completion_time, i))
         remain_gpu_num -= 1
     job_list.sort(key=lambda j: j.completion_time)
 
@@ -77,8 +93,9 @@ def cal_individual_plan(individual: Individual,
                     available_slice_list.append(ts)
             if len(available_slice_list) > 0:
                 next_batch = individual.plan.plan[i + 1]
+                reverse_slice_list = next_batch.get_reverse_slice_list()
                 # TODO: 可以考虑时间片长短和占有的GPU数目之间的关系来分配。
-                for cas, nrs in zip(available_slice_list, next_batch.get_reverse_slice_list()):
+                for cas, nrs in zip(available_slice_list, reverse_slice_list):
                     job = nrs.pop_job()
                     epoch_time = data[job.name][cas.gpu_num].epoch_time
                     epoch_num = int(cas.remain_length // epoch_time)
@@ -90,23 +107,45 @@ def cal_individual_plan(individual: Individual,
                     # 为一个时间片添加JOB，只会影响这个时间片的实际时间和剩余时间，因为上述的代码逻辑，
                     # 实际上这个批次中的最大时间片不会变化。
                     cas.add_job(new_job)
-                # TODO: 感觉还是得把剩余时间的计算单独拿出来，不然这些不同的arrange之间会有重复操作。
-                next_batch.arrange_batch()
-                current_batch.arrange_batch()
+                # 两个批次中只有配对过的时间片长度发生了变化, 只需把它们重新插入到有序位置。
+                pair_num = min(len(available_slice_list), len(reverse_slice_list))
+                next_batch.update_slices(reverse_slice_list[:pair_num])
+                current_batch.update_slices(available_slice_list[:pair_num])
 
-    individual.plan.arrange_plan()
+    # 每个被修改过的批次都已保持有序, 这里只需重新累加总时间。
+    individual.plan.cal_total_time()
+    individual.total_time = individual.plan.total_time
 
 
-def sequential_execution(job_names: List[str],
-                         max_gpu_num: int,
-                         data: Dict[str, Dict[int, TrainingData]]):
+def report_plan(plan: Plan,
+                data: Dict[str, Dict[int, TrainingData]],
+                cluster: Cluster):
+    # 多节点集群中先把时间片放置到具体的GPU上, 再输出方案和各节点的分配情况。
+    if cluster is not None:
+        place_plan(plan, cluster, data)
+    plan.print_plan()
+    if cluster is not None:
+        print_placement(plan, cluster)
+
+
+def get_sequential_plan(job_names: List[str],
+                        max_gpu_num: int,
+                        data: Dict[str, Dict[int, TrainingData]]) -> Plan:
     job_list = get_job_list(job_names, list(range(1, len(job_names) + 1)), [max_gpu_num] * len(job_names), data)
     final_group_list = []
     for job in job_list:
         final_group_list.append([job])
 
-    plan = get_plan(final_group_list, max_gpu_num)
-    plan.print_plan()
+    return get_plan(final_group_list, max_gpu_num)
+
+
+def sequential_execution(job_names: List[str],
+                         max_gpu_num: int,
+                         data: Dict[str, Dict[int, TrainingData]],
+                         cluster: Cluster = None) -> Plan:
+    plan = get_sequential_plan(job_names, max_gpu_num, data)
+    report_plan(plan, data, cluster)
+    return plan
 
 
 def sorting_allocation(job_list: List[Job],
@@ -115,68 +154,353 @@ def sorting_allocation(job_list: List[Job],
     job_list.sort(key=lambda j: j.completion_time, reverse=reverse)
     slice_list = []
     for job in job_list[:max_gpu_num]:
-        slice_list.append(TimeSlice([job], job.gpu_num, job.completion_time))
+        slice_list.append(TimeSlice([job], job.gpu_num))
+    # 以(实际长度, 下标)为键的最小堆, 长度相同时与min一样取靠前的时间片。
+    heap = [(ts.actual_length, i) for i, ts in enumerate(slice_list)]
+    heapq.heapify(heap)
     for job in job_list[max_gpu_num:]:
-        minimum_slice = min(slice_list, key=lambda s: s.actual_length)
-        minimum_slice.add_job(job)
+        _, i = heap[0]
+        slice_list[i].add_job(job)
+        heapq.heapreplace(heap, (slice_list[i].actual_length, i))
     batch = Batch(slice_list)
     plan = Plan([batch], max_gpu_num)
     plan.arrange_plan()
     return plan
 
 
-def parallel_execution(job_names: List[str],
-                       max_gpu_num: int,
-                       data: Dict[str, Dict[int, TrainingData]]):
+def get_parallel_plan(job_names: List[str],
+                      max_gpu_num: int,
+                      data: Dict[str, Dict[int, TrainingData]]) -> Plan:
     job_list = get_job_list(job_names, [1] * len(job_names), [1] * len(job_names), data)
     if max_gpu_num > len(job_list):
         maximum_allocation(max_gpu_num, job_list, data)
-        plan = get_plan([job_list], max_gpu_num)
-    else:
-        plan = sorting_allocation(job_list, max_gpu_num, True)
-    plan.print_plan()
+        return get_plan([job_list], max_gpu_num)
+    return sorting_allocation(job_list, max_gpu_num, True)
 
 
-def optimus_execution(job_names: List[str],
-                      max_gpu_num: int,
-                      data: Dict[str, Dict[int, TrainingData]]):
+def parallel_execution(job_names: List[str],
+                       max_gpu_num: int,
+                       data: Dict[str, Dict[int, TrainingData]],
+                       cluster: Cluster = None) -> Plan:
+    plan = get_parallel_plan(job_names, max_gpu_num, data)
+    report_plan(plan, data, cluster)
+    return plan
+
+
+def get_utility(job: Job,
+                data: Dict[str, Dict[int, TrainingData]]) -> float:
+    epoch_time = data[job.name][job.gpu_num + 1].epoch_time
+    # TODO: 效用公式有待商榷。
+    return (job.completion_time - job.epoch_num * epoch_time) / job.gpu_num
+
+
+def get_optimus_plan(job_names: List[str],
+                     max_gpu_num: int,
+                     data: Dict[str, Dict[int, TrainingData]]) -> Plan:
     job_list = get_job_list(job_names, [1] * len(job_names), [1] * len(job_names), data)
     if max_gpu_num >= len(job_names):
+        # 每个作业的效用只取决于自身, 因此只需在分配后重新计算被选中作业的效用,
+        # 以(-效用, 下标)为键的最大堆在效用相同时与index(max(...))一样取靠前的作业。
+        # 没有剩余GPU时不计算效用, 否则会读取不存在的GPU数目(作业数等于GPU数目时)。
         remain_gpu_num = max_gpu_num - len(job_list)
+        heap = [(-get_utility(job, data), i) for i, job in enumerate(job_list)] if remain_gpu_num > 0 else []
+        heapq.heapify(heap)
         while remain_gpu_num > 0:
-            utility_list = []
-            for job in job_list:
-                epoch_time = data[job.name][job.gpu_num + 1].epoch_time
-                # TODO: 效用公式有待商榷。
-                utility_list.append((job.completion_time - job.epoch_num * epoch_time) / job.gpu_num)
-            job = job_list[utility_list.index(max(utility_list))]
-            job.add_gpu(1, data)
+            _, i = heap[0]
+            job_list[i].add_gpu(1, data)
             remain_gpu_num -= 1
+            if remain_gpu_num > 0:
+                heapq.heapreplace(heap, (-get_utility(job_list[i], data), i))
         job_list.sort(key=lambda j: j.completion_time)
-        plan = get_plan([job_list], max_gpu_num)
+        return get_plan([job_list], max_gpu_num)
+    return sorting_allocation(job_list, max_gpu_num, False)
+
+
+def optimus_execution(job_names: List[str],
+                      max_gpu_num: int,
+                      data: Dict[str, Dict[int, TrainingData]],
+                      cluster: Cluster = None) -> Plan:
+    plan = get_optimus_plan(job_names, max_gpu_num, data)
+    report_plan(plan, data, cluster)
+    return plan
+
+
+def get_plan_orders(plan: Plan) -> Dict[str, int]:
+    # 作业按所在批次的先后确定优先级, 切分到多个批次的作业取最早的批次。
+    orders = {}
+    for i, batch in enumerate(plan.plan, 1):
+        for ts in batch.slice_list:
+            for job in ts.job_list:
+                orders.setdefault(job.name, i)
+    return orders
+
+
+def get_heuristic_orders(job_names: List[str],
+                         max_gpu_num: int,
+                         data: Dict[str, Dict[int, TrainingData]]) -> List[List[int]]:
+    # 把顺序、并行和Optimus调度的方案按批次先后转换为染色体, 作为遗传算法初始种群中的个体。
+    seeds = []
+    for get_heuristic_plan in [get_sequential_plan, get_parallel_plan, get_optimus_plan]:
+        orders = get_plan_orders(get_heuristic_plan(job_names, max_gpu_num, data))
+        seeds.append([orders[job_name] for job_name in job_names])
+    return seeds
+
+
+def get_seed_orders(job_names: List[str],
+                    max_gpu_num: int,
+                    data: Dict[str, Dict[int, TrainingData]],
+                    args,
+                    used_slice: bool,
+                    archive: ScheduleArchive = None,
+                    seed_orders: List[List[int]] = None) -> List[List[int]]:
+    # 依次放入调用方给出的染色体、之前运行中保存的最优染色体和启发式调度的方案, 重新编号后相同的只保留一个。
+    seeds = list(seed_orders) if seed_orders is not None else []
+    if archive is not None:
+        seeds += archive.lookup(job_names, max_gpu_num, used_slice)
+    if args.warm_start:
+        seeds += get_heuristic_orders(job_names, max_gpu_num, data)
+    unique_seeds = {}
+    for orders in seeds:
+        unique_seeds.setdefault(get_canonical_orders(orders), orders)
+    return list(unique_seeds.values())[:args.individual_num]
+
+
+_island_context = {}
+
+
+def _init_island_worker(job_names: List[str],
+                        max_gpu_num: int,
+                        epoch_num: np.ndarray,
+                        epoch_time: np.ndarray,
+                        used_slice: bool,
+                        cache_size: int):
+    _island_context.update(job_names=job_names,
+                           max_gpu_num=max_gpu_num,
+                           epoch_num=epoch_num,
+                           epoch_time=epoch_time,
+                           used_slice=used_slice,
+                           cache=FitnessCache(cache_size) if cache_size > 0 else None)
+
+
+def _evolve_island(island: List[Individual],
+                   seed_orders: List[List[int]],
+                   rd,
+                   individual_num: int,
+                   iteration_times: int,
+                   deadline: float,
+                   target_time: float,
+                   instrumented: bool) -> tuple:
+    # 每个岛屿使用独立的随机数生成器, 随种群一起在进程间传递。
+    job_names = _island_context['job_names']
+    job_orders = list(range(1, len(job_names) + 1))
+    cache = _island_context['cache']
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    fitness_args = (_island_context['max_gpu_num'],
+                    _island_context['epoch_num'],
+                    _island_context['epoch_time'],
+                    _island_context['used_slice'],
+                    cache)
+    generations, evaluations = 0, 0
+    instrumentation = Instrumentation([]) if instrumented else None
+    measure = instrumentation.measure if instrumented else call
+
+    if island is None:
+        island = [Individual(orders[:]) for orders in seed_orders]
+        island += [init_individual(job_names, rd) for _ in range(individual_num - len(island))]
+        evaluations += measure('evaluation', evaluate_group, island, *fitness_args)
+
+    for _ in range(iteration_times):
+        after_group = measure('selection', selection, island, rd)
+        measure('cross_over', cross_over, after_group, job_names, rd)
+        measure('mutation', mutation_process, after_group, job_orders, rd)
+        evaluations += measure('evaluation', evaluate_group, after_group, *fitness_args)
+        island = preferential_admission(island, after_group)
+        generations += 1
+        if island[0].total_time <= target_time or time.time() >= deadline:
+            break
+
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    timings = instrumentation.timings if instrumented else None
+    return island, rd, generations, evaluations, hits, misses, timings
+
+
+def island_evolution(job_names: List[str],
+                     max_gpu_num: int,
+                     epoch_num: np.ndarray,
+                     epoch_time: np.ndarray,
+                     args,
+                     used_slice: bool,
+                     termination: Termination,
+                     rd,
+                     seed_orders: List[List[int]],
+                     instrumentation: Instrumentation = None) -> List[Individual]:
+    rds = [spawn_random(rd) for _ in range(args.islands)]
+    islands = [None] * args.islands
+    hits, misses = 0, 0
+    finished_times = 0
+
+    # 每个岛屿固定在一个进程上演化, 岛屿的缓存也随之留在该进程中。
+    executors = [ProcessPoolExecutor(max_workers=1,
+                                     initializer=_init_island_worker,
+                                     initargs=(job_names, max_gpu_num, epoch_num, epoch_time, used_slice,
+                                               args.cache_size)) for _ in range(args.islands)]
+    while True:
+        iteration_times = min(max(args.migration_interval, 1), args.iteration_times - finished_times)
+        # 初始种群中的种子个体轮流分配给各个岛屿。
+        futures = [executor.submit(_evolve_island, island, seed_orders[k::args.islands], island_rd,
+                                   args.individual_num, iteration_times, termination.deadline,
+                                   termination.target_time, instrumentation is not None)
+                   for k, (executor, island, island_rd) in enumerate(zip(executors, islands, rds))]
+        results = [future.result() for future in futures]
+        islands = [result[0] for result in results]
+        rds = [result[1] for result in results]
+        termination.update(min(island[0].total_time for island in islands),
+                           max(result[2] for result in results),
+                           sum(result[3] for result in results))
+        hits += sum(result[4] for result in results)
+        misses += sum(result[5] for result in results)
+        finished_times += iteration_times
+        if instrumentation is not None:
+            # 各岛屿在子进程中演化, 每轮迁移前汇总一次所有岛屿的统计信息。
+            for result in results:
+                instrumentation.add_timings(result[6])
+            instrumentation.record(termination.generations, [i for island in islands for i in island],
+                                   sum(result[3] for result in results), cache_hits=hits, cache_misses=misses,
+                                   island_best_times=[island[0].total_time for island in islands])
+        if finished_times >= args.iteration_times or termination.is_finished():
+            break
+        migration(islands, args.migration_topology, args.migration_num)
+    for executor in executors:
+        executor.shutdown()
+
+    if args.cache_size > 0:
+        print(f'缓存命中: {hits}, 未命中: {misses}.')
+    return sorted((i for island in islands for i in island), key=lambda i: i.total_time)
+
+
+def record_generation(instrumentation: Instrumentation,
+                      termination: Termination,
+                      group: List[Individual],
+                      evaluations: int,
+                      cache: FitnessCache):
+    if cache is not None:
+        instrumentation.record(termination.generations, group, evaluations, cache_hits=cache.hits,
+                               cache_misses=cache.misses)
     else:
-        plan = sorting_allocation(job_list, max_gpu_num, False)
-    plan.print_plan()
+        instrumentation.record(termination.generations, group, evaluations)
+
+
+def matrix_evolution(job_nums: int,
+                     max_gpu_num: int,
+                     epoch_num: np.ndarray,
+                     epoch_time: np.ndarray,
+                     args,
+                     used_slice: bool,
+                     termination: Termination,
+                     cache: FitnessCache,
+                     pool: EvaluationPool,
+                     seed_orders: List[List[int]],
+                     instrumentation: Instrumentation = None) -> List[Individual]:
+    # 种群以矩阵表示, 每代只需少量的数组运算, 向量化算子需要使用numpy的随机数生成器。
+    rd = get_random(args.seed, 'numpy')
+    measure = instrumentation.measure if instrumentation is not None else call
+    fitness_args = (max_gpu_num, epoch_num, epoch_time, used_slice, cache, pool)
+
+    def to_group(orders: np.ndarray, total_time: np.ndarray) -> List[Individual]:
+        return [Individual(o, total_time=t) for o, t in zip(orders.tolist(), total_time.tolist())]
+
+    orders = rd.integers(1, job_nums + 1, (args.individual_num, job_nums))
+    if len(seed_orders) > 0:
+        orders[:len(seed_orders)] = seed_orders
+    total_time, evaluations = measure('evaluation', evaluate_orders, orders, *fitness_args)
+    termination.update(total_time.min(), 0, evaluations)
+    if instrumentation is not None:
+        record_generation(instrumentation, termination, to_group(orders, total_time), evaluations, cache)
+
+    for _ in range(args.iteration_times):
+        if termination.is_finished():
+            break
+        after_orders = measure('selection', matrix_selection, orders, total_time, rd)
+        measure('cross_over', matrix_cross_over, after_orders, rd)
+        measure('mutation', matrix_mutation, after_orders, rd)
+        after_time, evaluations = measure('evaluation', evaluate_orders, after_orders, *fitness_args)
+        orders, total_time = matrix_preferential_admission(orders, total_time, after_orders, after_time)
+        termination.update(total_time[0], 1, evaluations)
+        if instrumentation is not None:
+            record_generation(instrumentation, termination, to_group(orders, total_time), evaluations, cache)
+
+    return sorted(to_group(orders, total_time), key=lambda i: i.total_time)
 
 
 def ga_execution(job_names: List[str],
                  max_gpu_num: int,
                  data: Dict[str, Dict[int, TrainingData]],
                  args,
-                 used_slice: bool):
+                 used_slice: bool,
+                 cluster: Cluster = None,
+                 callbacks: List[Callable[[Dict], None]] = None,
+                 seed_orders: List[List[int]] = None) -> Plan:
+    termination = Termination(args.patience, args.epsilon, args.time_budget_ms, args.target_time)
+    rd = get_random(args.seed, args.rng)
+    # 只有传入回调时才统计每代的信息, 否则各阶段直接调用, 几乎没有额外开销。
+    instrumentation = Instrumentation(callbacks, used_slice=used_slice) if callbacks else None
+    measure = instrumentation.measure if instrumentation is not None else call
     job_nums = len(job_names)
     job_orders = list(range(1, job_nums + 1))
 
-    new_group = [init_individual(job_names) for _ in range(args.individual_num)]
-    for individual in new_group:
-        cal_individual_plan(individual, max_gpu_num, job_names, data, used_slice)
+    # 迭代过程中只批量计算完成时间, 最终只为最优个体构建执行方案。
+    epoch_num, epoch_time = pack_training_data(job_names, max_gpu_num, data)
+    archive = ScheduleArchive(args.archive, args.archive_size) if args.archive is not None else None
+    seed_orders = get_seed_orders(job_names, max_gpu_num, data, args, used_slice, archive, seed_orders)
+    if args.islands > 1:
+        new_group = island_evolution(job_names, max_gpu_num, epoch_num, epoch_time, args, used_slice,
+                                     termination, rd, seed_orders, instrumentation)
+        best_individual = new_group[0]
+        cal_individual_plan(best_individual, max_gpu_num, job_names, data, used_slice)
+        report_plan(best_individual.plan, data, cluster)
+        if archive is not None:
+            archive.update(job_names, max_gpu_num, used_slice, new_group)
+        termination.print_summary()
+        return best_individual.plan
 
-    for _ in range(args.iteration_times):
-        after_group = selection(new_group)
-        cross_over(after_group, job_names)
-        mutation_process(after_group, job_orders)
-        for individual in after_group:
-            cal_individual_plan(individual, max_gpu_num, job_names, data, used_slice)
-        new_group = preferential_admission(new_group, after_group)
-
-    new_group[0].plan.print_plan()
+    cache = FitnessCache(args.cache_size) if args.cache_size > 0 else None
+    pool = EvaluationPool(args.workers, max_gpu_num, epoch_num, epoch_time, used_slice) if args.workers > 1 else None
+
+    if args.operators == 'matrix':
+        new_group = matrix_evolution(job_nums, max_gpu_num, epoch_num, epoch_time, args, used_slice, termination,
+                                     cache, pool, seed_orders, instrumentation)
+    else:
+        new_group = [Individual(orders[:]) for orders in seed_orders]
+        new_group += [init_individual(job_names, rd) for _ in range(args.individual_num - len(new_group))]
+        evaluations = measure('evaluation', evaluate_group, new_group, max_gpu_num, epoch_num, epoch_time,
+                              used_slice, cache, pool)
+        termination.update(min(i.total_time for i in new_group), 0, evaluations)
+        if instrumentation is not None:
+            record_generation(instrumentation, termination, new_group, evaluations, cache)
+
+        for _ in range(args.iteration_times):
+            if termination.is_finished():
+                break
+            after_group = measure('selection', selection, new_group, rd)
+            measure('cross_over', cross_over, after_group, job_names, rd)
+            measure('mutation', mutation_process, after_group, job_orders, rd)
+            evaluations = measure('evaluation', evaluate_group, after_group, max_gpu_num, epoch_num, epoch_time,
+                                  used_slice, cache, pool)
+            new_group = preferential_admission(new_group, after_group)
+            termination.update(new_group[0].total_time, 1, evaluations)
+            if instrumentation is not None:
+                record_generation(instrumentation, termination, new_group, evaluations, cache)
+
+    if pool is not None:
+        pool.shutdown()
+
+    best_individual = new_group[0]
+    cal_individual_plan(best_individual, max_gpu_num, job_names, data, used_slice)
+    report_plan(best_individual.plan, data, cluster)
+    if archive is not None:
+        archive.update(job_names, max_gpu_num, used_slice, new_group)
+    if cache is not None:
+        print(f'缓存命中: {cache.hits}, 未命中: {cache.misses}.')
+    termination.print_summary()
+    return best_individual.plan
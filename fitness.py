@@ -0,0 +1,419 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Hashable
+
+import numpy as np
+
+from entity import TrainingData, Individual
+
+
+def pack_training_data(job_names: List[str],
+                       max_gpu_num: int,
+                       data: Dict[str, Dict[int, TrainingData]]) -> Tuple[np.ndarray, np.ndarray]:
+    epoch_num = np.zeros((len(job_names), max_gpu_num + 1), dtype=np.int64)
+    epoch_time = np.ones((len(job_names), max_gpu_num + 1), dtype=np.float64)
+    for i, job_name in enumerate(job_names):
+        for gpu_num in range(1, max_gpu_num + 1):
+            epoch_num[i, gpu_num] = data[job_name][gpu_num].epoch_num
+            epoch_time[i, gpu_num] = data[job_name][gpu_num].epoch_time
+    return epoch_num, epoch_time
+
+
+def _reorder(state: Dict[str, np.ndarray], perm: np.ndarray, rows: np.ndarray, b: int):
+    for value in state.values():
+        value[rows, b] = np.take_along_axis(value[rows, b], perm, axis=1)
+
+
+def _arrange(state: Dict[str, np.ndarray],
+             max_length: np.ndarray,
+             rows: np.ndarray,
+             b: int):
+    # 与Batch.arrange_batch一致: 计算最大时间片长度, 并按实际长度稳定升序排列。
+    valid = state['job'][rows, b] >= 0
+    actual = state['own'][rows, b] + state['extra'][rows, b]
+    max_length[rows, b] = np.where(valid, actual, -np.inf).max(axis=1, initial=0)
+    perm = np.argsort(np.where(valid, actual, np.inf), axis=1, kind='stable')
+    _reorder(state, perm, rows, b)
+
+
+def _simulate(orders: np.ndarray,
+              max_gpu_num: int,
+              epoch_num: np.ndarray,
+              epoch_time: np.ndarray,
+              used_slice: bool,
+              track_extra_job: bool = False,
+              head: Dict[str, np.ndarray] = None,
+              base_time: np.ndarray = None,
+              snapshots: List[Dict[str, np.ndarray]] = None) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+    # 利用空闲时间片时可以从中间的批次继续模拟: head为每行已经模拟过的最后一个批次在填入下一批次的作业之前的
+    # 状态, 放在第0个批次, 其之前各批次的时间之和为base_time, 编号为负数的作业属于这些批次, 不再放入批次。
+    # snapshots按批次记录各行的这一状态。
+    orders = np.asarray(orders, dtype=np.int64)
+    individual_num, job_nums = orders.shape
+    rows = np.arange(individual_num)
+    positions = np.arange(job_nums)
+
+    # 与get_job_list一致: 按(order, completion_time)稳定排序。
+    first_time = epoch_num[:, 1] * epoch_time[:, 1]
+    job_index = np.lexsort((np.broadcast_to(first_time, orders.shape), orders), axis=1)
+    sorted_orders = np.take_along_axis(orders, job_index, axis=1)
+
+    placed = sorted_orders >= 0
+    group_head = np.ones(orders.shape, dtype=bool)
+    group_head[:, 1:] = sorted_orders[:, 1:] != sorted_orders[:, :-1]
+    group_id = np.cumsum(group_head, axis=1) - 1
+    group_rank = positions - np.maximum.accumulate(np.where(group_head, positions, 0), axis=1)
+    group_size = np.zeros(orders.shape, dtype=np.int64)
+    np.add.at(group_size, (rows[:, None], group_id), placed.astype(np.int64))
+    job_group_size = np.take_along_axis(group_size, group_id, axis=1)
+
+    # 作业数不少于GPU数的分组会被切分为多个批次, 每个作业占用一个GPU。
+    group_batch_num = (group_size + max_gpu_num - 1) // max_gpu_num
+    group_batch_start = np.cumsum(group_batch_num, axis=1) - group_batch_num + (head is not None)
+    job_batch = np.take_along_axis(group_batch_start, group_id, axis=1) + group_rank // max_gpu_num
+    job_slot = group_rank % max_gpu_num
+    batch_num = int(job_batch[placed].max()) + 1
+    slot_num = int(job_slot[placed].max()) + 1
+    if head is not None:
+        slot_num = max(slot_num, head['job'].shape[1])
+
+    shape = (individual_num, batch_num, slot_num)
+    state = {
+        'job': np.full(shape, -1, dtype=np.int64),
+        'gpu': np.zeros(shape, dtype=np.int64),
+        'num': np.zeros(shape, dtype=np.int64),
+        'own': np.zeros(shape, dtype=np.float64),
+        'extra': np.zeros(shape, dtype=np.float64),
+    }
+    if track_extra_job:
+        # 记录填入空闲时间片的作业, 用于计算每个作业的完成时刻。
+        state['extra_job'] = np.full(shape, -1, dtype=np.int64)
+    job_rows = np.broadcast_to(rows[:, None], orders.shape)[placed]
+    job_index, job_batch, job_slot = job_index[placed], job_batch[placed], job_slot[placed]
+    index = (job_rows, job_batch, job_slot)
+    state['job'][index] = job_index
+    state['gpu'][index] = 1
+    state['num'][index] = epoch_num[job_index, 1]
+    state['own'][index] = first_time[job_index]
+    if head is not None:
+        for key, value in head.items():
+            state[key][:, 0, :value.shape[1]] = value
+    valid = state['job'] >= 0
+    job = np.where(valid, state['job'], 0)
+
+    spare_gpu = np.zeros((individual_num, batch_num), dtype=np.int64)
+    job_group_size = job_group_size[placed]
+    spare_gpu[job_rows, job_batch] = np.where(job_group_size < max_gpu_num, max_gpu_num - job_group_size, 0)
+
+    # 与maximum_allocation一致: 每次把一个GPU分配给完成时间最长的作业。
+    while True:
+        active_rows, active_batches = np.nonzero(spare_gpu > 0)
+        if len(active_rows) == 0:
+            break
+        own = np.where(valid[active_rows, active_batches], state['own'][active_rows, active_batches], -np.inf)
+        active_slots = own.argmax(axis=1)
+        active = (active_rows, active_batches, active_slots)
+        state['gpu'][active] += 1
+        state['own'][active] = state['num'][active] * epoch_time[job[active], state['gpu'][active]]
+        spare_gpu[active_rows, active_batches] -= 1
+
+    max_length = np.zeros((individual_num, batch_num), dtype=np.float64)
+    for b in range(batch_num):
+        _arrange(state, max_length, rows, b)
+
+    if used_slice:
+        for b in range(batch_num - 1):
+            if snapshots is not None:
+                snapshots.append({key: value[:, b].copy() for key, value in state.items()})
+            valid = state['job'][:, b] >= 0
+            remain = max_length[:, b, None] - (state['own'][:, b] + state['extra'][:, b])
+            available = valid & (remain > 0)
+            next_num = (state['job'][:, b + 1] >= 0).sum(axis=1)
+            current_rows = np.nonzero(available.any(axis=1) & (next_num > 0))[0]
+            if len(current_rows) == 0:
+                continue
+
+            # 与get_reverse_slice_list一致: 下一批次按实际长度稳定降序排列。
+            next_valid = state['job'][current_rows, b + 1] >= 0
+            next_actual = state['own'][current_rows, b + 1] + state['extra'][current_rows, b + 1]
+            perm = np.argsort(np.where(next_valid, -next_actual, np.inf), axis=1, kind='stable')
+            _reorder(state, perm, current_rows, b + 1)
+
+            available = available[current_rows]
+            available_rank = np.cumsum(available, axis=1) - 1
+            paired = available & (available_rank < next_num[current_rows, None])
+            pair_index = np.nonzero(paired)
+            pair_rows, pair_slots = current_rows[pair_index[0]], pair_index[1]
+            next_slots = available_rank[pair_index]
+
+            cas = (pair_rows, b, pair_slots)
+            nrs = (pair_rows, b + 1, next_slots)
+            next_job = state['job'][nrs]
+            cas_epoch_time = epoch_time[next_job, state['gpu'][cas]]
+            cas_epoch_num = np.floor_divide(remain[pair_rows, pair_slots], cas_epoch_time).astype(np.int64)
+            cas_epoch_num = np.minimum(cas_epoch_num, state['num'][nrs])
+            state['num'][nrs] -= cas_epoch_num
+            state['own'][nrs] = state['num'][nrs] * epoch_time[next_job, state['gpu'][nrs]]
+            state['extra'][cas] = cas_epoch_num * cas_epoch_time
+            if track_extra_job:
+                state['extra_job'][cas] = next_job
+
+            _arrange(state, max_length, current_rows, b + 1)
+            _arrange(state, max_length, current_rows, b)
+
+        for b in range(batch_num):
+            _arrange(state, max_length, rows, b)
+
+    total_time = np.zeros(individual_num, dtype=np.float64) if base_time is None else base_time.astype(np.float64)
+    for b in range(batch_num):
+        total_time += max_length[:, b]
+    return state, max_length, total_time
+
+
+def _cal_utilization_rate(state: Dict[str, np.ndarray],
+                          max_length: np.ndarray,
+                          total_time: np.ndarray,
+                          max_gpu_num: int) -> np.ndarray:
+    valid = state['job'] >= 0
+    remain = max_length[:, :, None] - (state['own'] + state['extra'])
+    unused_resource = np.where(valid, remain * state['gpu'], 0).reshape(len(total_time), -1)
+    unused_resource = np.cumsum(unused_resource, axis=1)[:, -1]
+    used_resource = total_time * max_gpu_num
+    return (used_resource - unused_resource) / used_resource * 100
+
+
+def cal_group_fitness(orders: np.ndarray,
+                      max_gpu_num: int,
+                      epoch_num: np.ndarray,
+                      epoch_time: np.ndarray,
+                      used_slice: bool) -> Tuple[np.ndarray, np.ndarray]:
+    state, max_length, total_time = _simulate(orders, max_gpu_num, epoch_num, epoch_time, used_slice)
+    return total_time, _cal_utilization_rate(state, max_length, total_time, max_gpu_num)
+
+
+def get_batch_states(orders: List[int],
+                     max_gpu_num: int,
+                     epoch_num: np.ndarray,
+                     epoch_time: np.ndarray) -> Tuple[List[Dict[str, np.ndarray]], List[float]]:
+    # 利用空闲时间片时, 返回每个批次在填入下一批次的作业之前的状态, 以及该批次之前各批次的时间之和,
+    # 只修改了后面批次的染色体可以从这里继续模拟(cal_suffix_time)。
+    snapshots = []
+    _, max_length, _ = _simulate(np.array([orders]), max_gpu_num, epoch_num, epoch_time, True, snapshots=snapshots)
+    return [{key: value[0] for key, value in snapshot.items()} for snapshot in snapshots], \
+        get_prefix_times(0.0, max_length[0])
+
+
+def get_prefix_times(base_time: float, max_length: np.ndarray) -> List[float]:
+    # 与_simulate中累加总时间的顺序一致, 得到的时间之和完全相同。
+    prefix_times = [base_time]
+    for length in max_length[:-1].tolist():
+        prefix_times.append(prefix_times[-1] + length)
+    return prefix_times
+
+
+def stack_heads(heads: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    # 各行的head批次可能来自时间片数不同的模拟, 按最多的时间片数补齐(空位的作业为-1); None为空批次。
+    existing = [head for head in heads if head is not None]
+    if len(existing) == 0:
+        return {'job': np.full((len(heads), 0), -1, dtype=np.int64)}
+    slot_num = max(len(head['job']) for head in existing)
+    stacked = {key: np.zeros((len(heads), slot_num), dtype=value.dtype) for key, value in existing[0].items()}
+    stacked['job'][:] = -1
+    for i, head in enumerate(heads):
+        for key, value in (head or {}).items():
+            stacked[key][i, :len(value)] = value
+    return stacked
+
+
+def cal_suffix_time(orders: np.ndarray,
+                    max_gpu_num: int,
+                    epoch_num: np.ndarray,
+                    epoch_time: np.ndarray,
+                    head: Dict[str, np.ndarray] = None,
+                    base_time: np.ndarray = None,
+                    snapshots: List[Dict[str, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # 利用空闲时间片时每行从head批次继续模拟(参数含义见_simulate), 完成时间与模拟整个染色体的结果完全相同。
+    _, max_length, total_time = _simulate(orders, max_gpu_num, epoch_num, epoch_time, True, head=head,
+                                          base_time=base_time, snapshots=snapshots)
+    return total_time, max_length
+
+
+def cal_group_objectives(orders: np.ndarray,
+                         max_gpu_num: int,
+                         epoch_num: np.ndarray,
+                         epoch_time: np.ndarray,
+                         used_slice: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # 在计算完成时间的同一次模拟中得到利用率和平均作业完成时间(JCT), 所有作业都在0时刻提交。
+    # 时间片内先执行自身的作业, 再执行从下一批次填入的作业; 作业的完成时刻取其最后一部分的结束时刻。
+    state, max_length, total_time = _simulate(orders, max_gpu_num, epoch_num, epoch_time, used_slice, True)
+    individual_num, job_nums = np.shape(orders)
+    batch_start = (np.cumsum(max_length, axis=1) - max_length)[:, :, None]
+    own_end = batch_start + state['own']
+    extra_end = own_end + state['extra']
+    rows = np.broadcast_to(np.arange(individual_num)[:, None, None], state['job'].shape)
+    job_end = np.zeros((individual_num, job_nums), dtype=np.float64)
+    own = (state['job'] >= 0) & (state['num'] > 0)
+    np.maximum.at(job_end, (rows[own], state['job'][own]), own_end[own])
+    extra = (state['extra_job'] >= 0) & (state['extra'] > 0)
+    np.maximum.at(job_end, (rows[extra], state['extra_job'][extra]), extra_end[extra])
+    utilization_rate = _cal_utilization_rate(state, max_length, total_time, max_gpu_num)
+    return total_time, utilization_rate, job_end.mean(axis=1)
+
+
+def get_canonical_orders(orders: List[int]) -> Tuple[int, ...]:
+    # 方案只取决于编号的相对大小(分组及批次先后), 因此按升序重新编号为1, 2, 3...
+    ranks = {order: rank for rank, order in enumerate(sorted(set(orders)), 1)}
+    return tuple(ranks[order] for order in orders)
+
+
+class FitnessCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def canonical_key(orders: List[int],
+                      max_gpu_num: int,
+                      used_slice: bool) -> Hashable:
+        return get_canonical_orders(orders), max_gpu_num, used_slice
+
+    def get(self, key: Hashable) -> float:
+        total_time = self._cache.get(key)
+        if total_time is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        return total_time
+
+    def put(self, key: Hashable, total_time: float):
+        self._cache[key] = total_time
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+
+_worker_context = {}
+
+
+def _init_worker(max_gpu_num: int,
+                 epoch_num: np.ndarray,
+                 epoch_time: np.ndarray,
+                 used_slice: bool):
+    _worker_context.update(max_gpu_num=max_gpu_num,
+                           epoch_num=epoch_num,
+                           epoch_time=epoch_time,
+                           used_slice=used_slice)
+
+
+def _cal_worker_total_time(orders: np.ndarray) -> np.ndarray:
+    total_time, _ = cal_group_fitness(orders, **_worker_context)
+    return total_time
+
+
+class EvaluationPool:
+    def __init__(self,
+                 workers: int,
+                 max_gpu_num: int,
+                 epoch_num: np.ndarray,
+                 epoch_time: np.ndarray,
+                 used_slice: bool):
+        # 训练数据只在进程启动时传递一次, 之后每代只传递编码和完成时间。
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            initializer=_init_worker,
+                                            initargs=(max_gpu_num, epoch_num, epoch_time, used_slice))
+
+    def cal_total_time(self, orders: np.ndarray) -> np.ndarray:
+        chunks = np.array_split(orders, min(self.workers, len(orders)))
+        return np.concatenate(list(self.executor.map(_cal_worker_total_time, chunks)))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def evaluate_group(group: List[Individual],
+                   max_gpu_num: int,
+                   epoch_num: np.ndarray,
+                   epoch_time: np.ndarray,
+                   used_slice: bool,
+                   cache: FitnessCache = None,
+                   pool: EvaluationPool = None) -> int:
+    if cache is None:
+        pending = {i: [individual] for i, individual in enumerate(group)}
+    else:
+        pending = {}
+        for individual in group:
+            key = FitnessCache.canonical_key(individual.orders, max_gpu_num, used_slice)
+            if key in pending:
+                cache.hits += 1
+                pending[key].append(individual)
+                continue
+            total_time = cache.get(key)
+            if total_time is None:
+                pending[key] = [individual]
+            else:
+                individual.total_time = total_time
+    if len(pending) == 0:
+        return 0
+
+    orders = np.array([individuals[0].orders for individuals in pending.values()], dtype=np.int64)
+    if pool is None:
+        total_time, _ = cal_group_fitness(orders, max_gpu_num, epoch_num, epoch_time, used_slice)
+    else:
+        total_time = pool.cal_total_time(orders)
+    for (key, individuals), individual_time in zip(pending.items(), total_time.tolist()):
+        for individual in individuals:
+            individual.total_time = individual_time
+        if cache is not None:
+            cache.put(key, individual_time)
+    return len(pending)
+
+
+def canonical_orders(orders: np.ndarray) -> np.ndarray:
+    # get_canonical_orders的向量化版本, 对种群矩阵的每行分别重新编号。
+    order_index = np.argsort(orders, axis=1, kind='stable')
+    sorted_orders = np.take_along_axis(orders, order_index, axis=1)
+    is_new = np.ones(orders.shape, dtype=bool)
+    is_new[:, 1:] = sorted_orders[:, 1:] != sorted_orders[:, :-1]
+    ranks = np.empty_like(orders)
+    np.put_along_axis(ranks, order_index, np.cumsum(is_new, axis=1), axis=1)
+    return ranks
+
+
+def evaluate_orders(orders: np.ndarray,
+                    max_gpu_num: int,
+                    epoch_num: np.ndarray,
+                    epoch_time: np.ndarray,
+                    used_slice: bool,
+                    cache: FitnessCache = None,
+                    pool: EvaluationPool = None) -> Tuple[np.ndarray, int]:
+    # 种群矩阵中重新编号后相同的染色体只评估一次, 缓存键与evaluate_group相同。
+    unique_orders, unique_index, inverse = np.unique(canonical_orders(orders), axis=0, return_index=True,
+                                                     return_inverse=True)
+    unique_time = np.zeros(len(unique_orders), dtype=np.float64)
+    pending = np.ones(len(unique_orders), dtype=bool)
+    keys = None
+    if cache is not None:
+        cache.hits += len(orders) - len(unique_orders)
+        keys = [(tuple(row), max_gpu_num, used_slice) for row in unique_orders.tolist()]
+        for k, key in enumerate(keys):
+            total_time = cache.get(key)
+            if total_time is not None:
+                unique_time[k] = total_time
+                pending[k] = False
+
+    pending_index = np.nonzero(pending)[0]
+    if len(pending_index) > 0:
+        pending_orders = orders[unique_index[pending_index]]
+        if pool is None:
+            pending_time, _ = cal_group_fitness(pending_orders, max_gpu_num, epoch_num, epoch_time, used_slice)
+        else:
+            pending_time = pool.cal_total_time(pending_orders)
+        unique_time[pending_index] = pending_time
+        if cache is not None:
+            for k, total_time in zip(pending_index.tolist(), pending_time.tolist()):
+                cache.put(keys[k], total_time)
+    return unique_time[inverse.reshape(-1)], len(pending_index)
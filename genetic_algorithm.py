@@ -1,61 +1,191 @@
 import bisect
-import copy
 import itertools
 import random
-from typing import List
+import time
+from typing import List, Tuple
+
+import numpy as np
 
 from entity import Individual
 
 
-def init_individual(job_names: List[str]) -> Individual:
-    return Individual([random.choice(range(1, len(job_names) + 1)) for _ in range(len(job_names))])
+def get_random(seed: int = None, rng: str = 'python'):
+    # 未指定种子时沿用全局的random模块, 与原来的随机数流一致。
+    if rng == 'numpy':
+        return np.random.default_rng(seed)
+    return random.Random(seed) if seed is not None else random
+
+
+def spawn_random(rd):
+    if isinstance(rd, np.random.Generator):
+        return np.random.default_rng(rd.integers(2 ** 63))
+    return random.Random(rd.getrandbits(64))
+
+
+# 以下函数一次抽取整代所需的随机数, numpy的Generator可以向量化地批量抽取。
+def draw_random(rd, size: int) -> List[float]:
+    if isinstance(rd, np.random.Generator):
+        return rd.random(size).tolist()
+    return [rd.random() for _ in range(size)]
+
+
+def draw_integers(rd, low: int, high: int, size: int) -> List[int]:
+    if isinstance(rd, np.random.Generator):
+        return rd.integers(low, high, size).tolist()
+    return [rd.randrange(low, high) for _ in range(size)]
 
 
-def selection(group: List[Individual]) -> List[Individual]:
+def draw_permutation(rd, size: int) -> List[int]:
+    if isinstance(rd, np.random.Generator):
+        return rd.permutation(size).tolist()
+    return rd.sample(list(range(size)), size)
+
+
+def draw_mutations(rd, job_nums: int, size: int) -> List[Tuple[int, int]]:
+    if isinstance(rd, np.random.Generator):
+        return list(zip(rd.integers(0, job_nums, size).tolist(), rd.integers(0, job_nums - 1, size).tolist()))
+    return [(rd.randrange(job_nums), rd.randrange(job_nums - 1)) for _ in range(size)]
+
+
+def init_individual(job_names: List[str], rd=random) -> Individual:
+    return Individual(draw_integers(rd, 1, len(job_names) + 1, len(job_names)))
+
+
+def selection(group: List[Individual], rd=random) -> List[Individual]:
     def adaptability_func(total_time: float) -> float:
         return 1 / total_time
 
     adaptability_list = []
     for individual in group:
-        adaptability_list.append(adaptability_func(individual.plan.total_time))
+        adaptability_list.append(adaptability_func(individual.total_time))
     all_adaptability = sum(adaptability_list)
 
     isp = [a / all_adaptability for a in adaptability_list]
     cp = list(itertools.accumulate(isp))
-    rn = [random.random() for _ in range(len(group))]
+    rn = draw_random(rd, len(group))
 
-    return [copy.deepcopy(group[bisect.bisect_left(cp, rn[i])]) for i in range(len(group))]
+    return [group[bisect.bisect_left(cp, rn[i])].copy() for i in range(len(group))]
 
 
-def cross_over(group: List[Individual], job_names: List[str]):
-    cross_orders = random.sample(list(range(len(group))), len(group))
+def cross_over(group: List[Individual], job_names: List[str], rd=random):
+    cross_orders = draw_permutation(rd, len(group))
 
     cross_couples = [(cross_orders[i], cross_orders[i + 1]) for i in range(0, len(cross_orders), 2)]
+    cross_points = draw_integers(rd, 1, len(job_names), len(cross_couples))
 
-    for cross_couple in cross_couples:
+    for cross_couple, cross_point in zip(cross_couples, cross_points):
         fos = group[cross_couple[0]].orders
         sos = group[cross_couple[1]].orders
 
-        cross_point = random.choice(list(range(1, len(job_names))))
         fos, sos = fos[:cross_point] + sos[cross_point:], sos[:cross_point] + fos[cross_point:]
 
         group[cross_couple[0]].orders = fos
         group[cross_couple[1]].orders = sos
 
 
-def mutation_process(group: List[Individual], job_orders: List[int]):
-    def mutation(x: int, cl: List[int]) -> int:
-        cl.remove(x)
-        return random.choice(cl)
+def mutation_process(group: List[Individual], job_orders: List[int], rd=random):
+    # 变异后的编号从除原编号外的其余编号中等概率选取, 即跳过原编号后的第k个编号。
+    def mutation(x: int, k: int) -> int:
+        return job_orders[k] if job_orders[k] < x else job_orders[k + 1]
 
-    for individual in group:
+    for individual, (mutation_point, k) in zip(group, draw_mutations(rd, len(job_orders), len(group))):
         ios = individual.orders
 
-        mutation_point = random.choice(list(range(1, len(job_orders) + 1)))
-        ios[mutation_point - 1] = mutation(ios[mutation_point - 1], job_orders[:])
+        ios[mutation_point] = mutation(ios[mutation_point], k)
 
         individual.orders = ios
 
 
 def preferential_admission(origin_group: List[Individual], change_group: List[Individual]) -> List[Individual]:
-    return sorted(origin_group + change_group, key=lambda i: i.plan.total_time)[:len(origin_group)]
+    return sorted(origin_group + change_group, key=lambda i: i.total_time)[:len(origin_group)]
+
+
+# 以下为种群矩阵(每行一个个体的染色体)上的向量化算子, 列表实现的算子保留作为参照。
+def matrix_selection(orders: np.ndarray, total_time: np.ndarray, rd: np.random.Generator) -> np.ndarray:
+    adaptability = 1 / total_time
+    cp = np.cumsum(adaptability / adaptability.sum())
+    index = np.searchsorted(cp, rd.random(len(orders)), side='left')
+    return orders[np.minimum(index, len(orders) - 1)]
+
+
+def matrix_cross_over(orders: np.ndarray, rd: np.random.Generator):
+    individual_num, job_nums = orders.shape
+    cross_orders = rd.permutation(individual_num)
+    first, second = cross_orders[0:individual_num - 1:2], cross_orders[1::2]
+    cross_points = rd.integers(1, job_nums, len(first))
+    mask = np.arange(job_nums) >= cross_points[:, None]
+    fos, sos = orders[first], orders[second]
+    orders[first] = np.where(mask, sos, fos)
+    orders[second] = np.where(mask, fos, sos)
+
+
+def matrix_mutation(orders: np.ndarray, rd: np.random.Generator):
+    # 原编号加上1~J-1的随机偏移后对J取模, 等概率地变为其余的某个编号。
+    individual_num, job_nums = orders.shape
+    rows = np.arange(individual_num)
+    mutation_points = rd.integers(0, job_nums, individual_num)
+    offsets = rd.integers(1, job_nums, individual_num)
+    orders[rows, mutation_points] = (orders[rows, mutation_points] - 1 + offsets) % job_nums + 1
+
+
+def matrix_preferential_admission(origin_orders: np.ndarray,
+                                  origin_time: np.ndarray,
+                                  change_orders: np.ndarray,
+                                  change_time: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    orders = np.concatenate([origin_orders, change_orders])
+    total_time = np.concatenate([origin_time, change_time])
+    index = np.argsort(total_time, kind='stable')[:len(origin_orders)]
+    return orders[index], total_time[index]
+
+
+def migration(islands: List[List[Individual]], topology: str, migration_num: int):
+    island_num = len(islands)
+    if topology == 'ring':
+        sources = [[(k - 1) % island_num] for k in range(island_num)]
+    else:
+        sources = [[j for j in range(island_num) if j != k] for k in range(island_num)]
+    migrants = [[individual.copy() for individual in island[:migration_num]] for island in islands]
+
+    # 各岛屿中的个体已按完成时间升序排列, 迁入的最优个体替换本岛最差的个体。
+    for k in range(island_num):
+        immigrants = [individual for j in sources[k] for individual in migrants[j]][:len(islands[k])]
+        remain_group = islands[k][:len(islands[k]) - len(immigrants)]
+        islands[k] = sorted(remain_group + immigrants, key=lambda i: i.total_time)
+
+
+class Termination:
+    def __init__(self,
+                 patience: int,
+                 epsilon: float,
+                 time_budget_ms: float,
+                 target_time: float):
+        self.patience = patience
+        self.epsilon = epsilon
+        self.target_time = target_time
+        self.start_time = time.time()
+        self.deadline = self.start_time + time_budget_ms / 1000 if time_budget_ms > 0 else float('inf')
+        self.best_time = float('inf')
+        self.stall_times = 0
+        self.generations = 0
+        self.evaluations = 0
+
+    def update(self, best_time: float, generations: int = 1, evaluations: int = 0):
+        self.generations += generations
+        self.evaluations += evaluations
+        if best_time < self.best_time - self.epsilon:
+            self.stall_times = 0
+        else:
+            self.stall_times += generations
+        self.best_time = min(self.best_time, best_time)
+
+    def is_finished(self) -> bool:
+        if 0 < self.patience <= self.stall_times:
+            return True
+        if self.best_time <= self.target_time:
+            return True
+        return time.time() >= self.deadline
+
+    def print_summary(self):
+        elapsed_time = (time.time() - self.start_time) * 1000
+        generation_time = elapsed_time / self.generations if self.generations > 0 else 0
+        print(f'迭代次数: {self.generations}, 评估次数: {self.evaluations}, 每代耗时: {round(generation_time, 3)}ms.')
@@ -0,0 +1,86 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from typing import List, Dict, Tuple, Callable
+
+from entity import Individual
+from fitness import get_canonical_orders
+
+STAGES = ['selection', 'cross_over', 'mutation', 'evaluation']
+
+
+def call(stage: str, func: Callable, *args):
+    return func(*args)
+
+
+def get_diversity(group: List[Individual]) -> Tuple[float, float]:
+    # 返回不同染色体所占的比例, 以及各个体与最优个体之间的平均归一化汉明距离。
+    chromosomes = [get_canonical_orders(individual.orders) for individual in group]
+    best = chromosomes[min(range(len(group)), key=lambda k: group[k].total_time)]
+    distance = sum(sum(x != y for x, y in zip(chromosome, best)) for chromosome in chromosomes)
+    return len(set(chromosomes)) / len(group), distance / (len(group) * len(best))
+
+
+class Instrumentation:
+    def __init__(self, callbacks: List[Callable[[Dict], None]], **labels):
+        self.callbacks = callbacks
+        self.labels = labels
+        self.start_time = time.perf_counter()
+        self.timings = dict.fromkeys(STAGES, 0)
+        self.total_evaluations = 0
+
+    def measure(self, stage: str, func: Callable, *args):
+        start_time = time.perf_counter()
+        result = func(*args)
+        self.timings[stage] += time.perf_counter() - start_time
+        return result
+
+    def add_timings(self, timings: Dict[str, float]):
+        for stage, timing in timings.items():
+            self.timings[stage] += timing
+
+    def record(self, generation: int, group: List[Individual], evaluations: int, **extra):
+        total_times = [individual.total_time for individual in group]
+        diversity, distance = get_diversity(group)
+        self.total_evaluations += evaluations
+        stats = dict(self.labels)
+        stats.update(generation=generation,
+                     best_time=min(total_times),
+                     mean_time=sum(total_times) / len(total_times),
+                     worst_time=max(total_times),
+                     diversity=diversity,
+                     distance=distance,
+                     evaluations=evaluations,
+                     total_evaluations=self.total_evaluations,
+                     elapsed_ms=(time.perf_counter() - self.start_time) * 1000)
+        stats.update({f'{stage}_ms': timing * 1000 for stage, timing in self.timings.items()})
+        stats.update(extra)
+        self.timings = dict.fromkeys(STAGES, 0)
+        for callback in self.callbacks:
+            callback(stats)
+
+
+class JsonLinesWriter:
+    def __init__(self, path: str):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def __call__(self, stats: Dict):
+        self.file.write(json.dumps(stats, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run_profiled(func: Callable, top: int, *args):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(*args)
+    finally:
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('tottime').print_stats(top)
+        print(stream.getvalue())
@@ -0,0 +1,205 @@
+import time
+from typing import List, Dict, Tuple, Callable
+
+import numpy as np
+
+from entity import TrainingData, Plan, Individual, Cluster
+from experiment import get_job_list, maximum_allocation, cal_individual_plan, report_plan, get_plan_orders
+from fitness import pack_training_data, cal_group_fitness, get_batch_states, get_prefix_times, stack_heads, \
+    cal_suffix_time
+
+
+def get_groups(orders: List[int]) -> List[List[int]]:
+    # 染色体中编号相同的作业为一组, 组内按作业下标排列, 各组按编号从小到大排列。
+    groups = {}
+    for k, order in enumerate(orders):
+        groups.setdefault(order, []).append(k)
+    return [groups[order] for order in sorted(groups)]
+
+
+def get_orders(groups: List[List[int]], job_nums: int) -> List[int]:
+    orders = [0] * job_nums
+    for order, group in enumerate((g for g in groups if len(g) > 0), 1):
+        for k in group:
+            orders[k] = order
+    return orders
+
+
+class LocalSearch:
+    # 在遗传算法的染色体上做局部搜索: 把一个作业移动到另一个批次(或新的批次), 或交换两个批次中的作业。
+    # 不利用空闲时间片时各批次相互独立, 每个移动只需重新计算涉及的两个批次的时间(按作业集合缓存);
+    # 利用空闲时间片时相邻批次互相影响, 以此为顺序分批向量化评估候选移动, 并且只从涉及的第一个分组的
+    # 前一个批次开始重新模拟, 之前的批次沿用当前方案的结果。
+    def __init__(self,
+                 job_names: List[str],
+                 max_gpu_num: int,
+                 data: Dict[str, Dict[int, TrainingData]],
+                 used_slice: bool):
+        self.job_names = job_names
+        self.max_gpu_num = max_gpu_num
+        self.data = data
+        self.used_slice = used_slice
+        self.epoch_num, self.epoch_time = pack_training_data(job_names, max_gpu_num, data)
+        self.group_time = {(): 0}
+        self.move_nums = 0
+        self.evaluations = 0
+
+    def get_group_time(self, group: Tuple[int, ...]) -> float:
+        # 与cal_individual_plan一致: 不足max_gpu_num个作业时按maximum_allocation分配GPU,
+        # 否则按完成时间依次切分为多个批次, 每个作业占用一个GPU。
+        group_time = self.group_time.get(group)
+        if group_time is None:
+            job_names = [self.job_names[k] for k in group]
+            job_list = get_job_list(job_names, [1] * len(job_names), [1] * len(job_names), self.data)
+            if self.max_gpu_num > len(job_list):
+                maximum_allocation(self.max_gpu_num, job_list, self.data)
+                group_time = job_list[-1].completion_time
+            else:
+                group_time = sum(job_list[min(i + self.max_gpu_num, len(job_list)) - 1].completion_time
+                                 for i in range(0, len(job_list), self.max_gpu_num))
+            self.group_time[group] = group_time
+            self.evaluations += 1
+        return group_time
+
+    def get_total_time(self, orders: List[int]) -> float:
+        if self.used_slice:
+            self.evaluations += 1
+            total_time, _ = cal_group_fitness(np.array([orders]), self.max_gpu_num, self.epoch_num,
+                                              self.epoch_time, True)
+            return float(total_time[0])
+        return sum(self.get_group_time(tuple(group)) for group in get_groups(orders))
+
+    def get_moves(self, groups: List[List[int]]) -> List[Tuple[float, tuple]]:
+        # 列出所有移动以及按不利用空闲时间片计算的时间变化(负数为改进), 只重新计算涉及的两个批次。
+        times = [self.get_group_time(tuple(group)) for group in groups]
+        moves = []
+        for a, source in enumerate(groups):
+            for j in source:
+                rest = tuple(k for k in source if k != j)
+                rest_delta = self.get_group_time(rest) - times[a]
+                for b, target in enumerate(groups + [[]]):
+                    if b == a or (b == len(groups) and len(rest) == 0):
+                        continue
+                    target_time = times[b] if b < len(groups) else 0
+                    delta = rest_delta + self.get_group_time(tuple(sorted(target + [j]))) - target_time
+                    moves.append((delta, (a, j, b, None)))
+                    if b == len(groups) or b < a:
+                        continue
+                    for k in target:
+                        delta = self.get_group_time(tuple(sorted(rest + (k,)))) - times[a] + \
+                                self.get_group_time(tuple(sorted(x if x != k else j for x in target))) - times[b]
+                        moves.append((delta, (a, j, b, k)))
+        return moves
+
+    def get_neighbour_time(self,
+                           groups: List[List[int]],
+                           moves: List[tuple],
+                           neighbours: List[List[List[int]]],
+                           batch_states: Tuple[List[Dict[str, np.ndarray]], List[float]]) -> Tuple[np.ndarray, Callable]:
+        # 移动(a, j, b, k)之前的分组与当前方案相同, 每个邻居从第min(a, b)个分组的前一个批次继续模拟,
+        # 之前的作业编号置为-1; 移动涉及第一个分组时从头模拟(空的head批次)。
+        # 同时返回由第i个邻居的模拟结果得到其各批次状态的函数, 接受移动后不必重新模拟整个方案。
+        job_nums = len(self.job_names)
+        snapshots, prefix_times = batch_states
+        batch_start = [0]
+        for group in groups:
+            batch_start.append(batch_start[-1] + (len(group) + self.max_gpu_num - 1) // self.max_gpu_num)
+
+        orders = np.array([get_orders(neighbour, job_nums) for neighbour in neighbours])
+        head_batches, heads = [], []
+        for i, (a, _, b, _) in enumerate(moves):
+            first_group = min(a, b)
+            for group in groups[:first_group]:
+                orders[i, group] = -1
+            head_batches.append(batch_start[first_group] - 1)
+            heads.append(snapshots[head_batches[-1]] if first_group > 0 else None)
+        base_time = np.array([prefix_times[h] if h >= 0 else 0.0 for h in head_batches])
+        neighbour_snapshots = []
+        neighbour_time, max_length = cal_suffix_time(orders, self.max_gpu_num, self.epoch_num, self.epoch_time,
+                                                     stack_heads(heads), base_time, neighbour_snapshots)
+        self.evaluations += len(neighbours)
+
+        def get_states(i: int) -> Tuple[List[Dict[str, np.ndarray]], List[float]]:
+            # 第0个批次为head批次(从头模拟时为空批次), 对应原方案中的第head_batches[i]个批次。
+            h = head_batches[i]
+            new_snapshots = [{key: value[i] for key, value in snapshot.items()} for snapshot in neighbour_snapshots]
+            new_prefix_times = get_prefix_times(float(base_time[i]), max_length[i])
+            if h < 0:
+                return new_snapshots[1:], new_prefix_times[1:]
+            return snapshots[:h] + new_snapshots, prefix_times[:h] + new_prefix_times
+        return neighbour_time, get_states
+
+    @staticmethod
+    def apply_move(groups: List[List[int]], a: int, j: int, b: int, k: int = None) -> List[List[int]]:
+        groups = [group[:] for group in groups] + [[]]
+        groups[a].remove(j)
+        groups[b].append(j)
+        if k is not None:
+            groups[b].remove(k)
+            groups[a].append(k)
+        return [sorted(group) for group in groups if len(group) > 0]
+
+    def improve(self, orders: List[int], time_budget_ms: float = 0, chunk_size: int = 64) -> List[int]:
+        # 每轮选取最好的移动, 没有改进或超出时间预算时停止。利用空闲时间片时, 按不利用时的时间变化
+        # 从小到大每次向量化评估chunk_size个移动, 取第一批中有改进的最好移动。
+        deadline = time.perf_counter() + time_budget_ms / 1000 if time_budget_ms > 0 else float('inf')
+        groups = get_groups(orders)
+        total_time = self.get_total_time(orders)
+        job_nums = len(self.job_names)
+        if self.used_slice:
+            batch_states = get_batch_states(get_orders(groups, job_nums), self.max_gpu_num, self.epoch_num,
+                                            self.epoch_time)
+        while time.perf_counter() < deadline:
+            moves = self.get_moves(groups)
+            if len(moves) == 0:
+                break
+            if not self.used_slice:
+                delta, move = min(moves, key=lambda m: m[0])
+                if delta >= -1e-9:
+                    break
+                groups = self.apply_move(groups, *move)
+                total_time += delta
+            else:
+                moves.sort(key=lambda m: m[0])
+                best_groups = None
+                for i in range(0, len(moves), chunk_size):
+                    chunk_moves = [move for _, move in moves[i:i + chunk_size]]
+                    neighbours = [self.apply_move(groups, *move) for move in chunk_moves]
+                    neighbour_time, get_states = self.get_neighbour_time(groups, chunk_moves, neighbours, batch_states)
+                    k = int(neighbour_time.argmin())
+                    if neighbour_time[k] < total_time - 1e-9:
+                        best_groups, total_time = neighbours[k], float(neighbour_time[k])
+                        batch_states = get_states(k)
+                        break
+                    if time.perf_counter() >= deadline:
+                        break
+                if best_groups is None:
+                    break
+                groups = best_groups
+            self.move_nums += 1
+        return get_orders(groups, job_nums)
+
+
+def local_search_execution(plan: Plan,
+                           job_names: List[str],
+                           max_gpu_num: int,
+                           data: Dict[str, Dict[int, TrainingData]],
+                           used_slice: bool,
+                           cluster: Cluster = None,
+                           time_budget_ms: float = 0) -> Plan:
+    # 任一调度算法的方案按批次先后转换为染色体后做局部搜索, 只有得到更短的完成时间时才替换原方案。
+    start_time = time.perf_counter()
+    plan_orders = get_plan_orders(plan)
+    search = LocalSearch(job_names, max_gpu_num, data, used_slice)
+    best_individual = Individual(search.improve([plan_orders[job_name] for job_name in job_names], time_budget_ms))
+    cal_individual_plan(best_individual, max_gpu_num, job_names, data, used_slice)
+    elapsed_time = time.perf_counter() - start_time
+    if best_individual.total_time >= plan.total_time:
+        print(f'局部搜索: 未找到更短的完成时间, 移动次数: {search.move_nums}, 评估次数: {search.evaluations}, '
+              f'耗时: {round(elapsed_time * 1000, 3)}ms.')
+        return plan
+    report_plan(best_individual.plan, data, cluster)
+    print(f'局部搜索: 完成时间 {round(plan.total_time / 60)}minutes -> {round(best_individual.plan.total_time / 60)}'
+          f'minutes, 移动次数: {search.move_nums}, 评估次数: {search.evaluations}, '
+          f'耗时: {round(elapsed_time * 1000, 3)}ms.')
+    return best_individual.plan
@@ -1,33 +1,129 @@
 import argparse
+import contextlib
+import sys
 
-from database import get_training_data
-from experiment import *
+from entity import Plan, Cluster
 
+# 不超过该作业数时改用精确求解(状态数随作业数指数增长)。
+EXACT_MAX_JOBS = 15
+
+# 模块级只导入标准库和实体类: --help以及只读取参数定义的脚本(benchmark.py、online.py、service.py)
+# 不需要加载数据库驱动和numpy, 调度算法所需的模块在run中按选择的路径导入。
 parser = argparse.ArgumentParser(description='')
 parser.add_argument('-i', '--iteration-times', default=1000, type=int)
 parser.add_argument('-g', '--gpu-num', default=8, type=int)
 parser.add_argument('-n', '--individual-num', default=50, type=int)
 parser.add_argument('-c', '--category', default='image', type=str)
-args = parser.parse_args()
+parser.add_argument('--cache-size', default=100000, type=int)
+parser.add_argument('--workers', default=1, type=int)
+parser.add_argument('--islands', default=1, type=int)
+parser.add_argument('--migration-interval', default=50, type=int)
+parser.add_argument('--migration-topology', default='ring', choices=['ring', 'all'])
+parser.add_argument('--migration-num', default=1, type=int)
+parser.add_argument('--patience', default=0, type=int)
+parser.add_argument('--epsilon', default=0, type=float)
+parser.add_argument('--time-budget-ms', default=0, type=float)
+parser.add_argument('--target-time', default=0, type=float)
+parser.add_argument('--refresh-data', action='store_true')
+parser.add_argument('--interpolate', action='store_true')
+parser.add_argument('-s', '--seed', default=None, type=int)
+parser.add_argument('--rng', default='python', choices=['python', 'numpy'])
+parser.add_argument('--operators', default='list', choices=['list', 'matrix'])
+parser.add_argument('--warm-start', action='store_true')
+parser.add_argument('--archive', default=None, type=str)
+parser.add_argument('--archive-size', default=5, type=int)
+parser.add_argument('--exact-max-jobs', default=EXACT_MAX_JOBS, type=int)
+parser.add_argument('--local-search', action='store_true')
+parser.add_argument('--local-search-ms', default=0, type=float)
+parser.add_argument('--multi-objective', action='store_true')
+parser.add_argument('--source', default=None, choices=['mysql', 'sqlite', 'csv', 'json'])
+parser.add_argument('--source-path', default=None, type=str)
+parser.add_argument('--gpus-per-node', default=0, type=int)
+parser.add_argument('--intra-node-speed', default=1, type=float)
+parser.add_argument('--inter-node-speed', default=1, type=float)
+parser.add_argument('--stats', default=None, type=str)
+parser.add_argument('--format', default='text', choices=['text', 'json', 'csv'])
+parser.add_argument('-o', '--output', default=None, type=str)
+parser.add_argument('--profile', action='store_true')
+parser.add_argument('--profile-top', default=20, type=int)
 
 
-def main():
+def run(args):
+    from database import get_training_data
+    from experiment import sequential_execution, parallel_execution, optimus_execution, ga_execution, \
+        get_plan_orders
+
     job_names = []
     with open(f'./job_name_data/{args.category}.txt', 'r') as f:
         for job_name in f:
             job_names.append(job_name.strip())
     gpu_num = args.gpu_num
-    data = get_training_data(job_names, gpu_num)
-    # 顺序调度:
-    sequential_execution(job_names, gpu_num, data)
-    # 并行调度:
-    parallel_execution(job_names, gpu_num, data)
-    # Optimus调度:
-    optimus_execution(job_names, gpu_num, data)
-    # 遗传算法调度(不考虑利用时间片):
-    ga_execution(job_names, gpu_num, data, args, False)
-    # 遗传算法调度(考虑利用时间片):
-    ga_execution(job_names, gpu_num, data, args, True)
+    data = get_training_data(job_names, gpu_num, args.refresh_data, args.source, args.source_path, args.interpolate)
+    cluster = None
+    if args.gpus_per_node > 0:
+        if gpu_num % args.gpus_per_node != 0:
+            parser.error(f'GPU数目 {gpu_num} 不是每个节点GPU数目 {args.gpus_per_node} 的整数倍')
+        cluster = Cluster(gpu_num // args.gpus_per_node, args.gpus_per_node, args.intra_node_speed,
+                          args.inter_node_speed)
+        data = cluster.adjust_training_data(data)
+    # 每代的统计信息以JSON行的形式写入文件, 两次遗传算法调度以used_slice字段区分。
+    callbacks = []
+    if args.stats is not None:
+        from instrumentation import JsonLinesWriter
+        callbacks.append(JsonLinesWriter(args.stats))
+    plan_writer = None
+    if args.format != 'text':
+        from serialization import PlanWriter
+        plan_writer = PlanWriter(args.output, args.format)
+
+    def report(scheduler: str, plan: Plan, used_slice: bool = False):
+        # 局部搜索作为后处理, 在各调度算法的方案上移动或交换作业。
+        if args.local_search:
+            from local_search import local_search_execution
+            plan = local_search_execution(plan, job_names, gpu_num, data, used_slice, cluster, args.local_search_ms)
+        if plan_writer is not None:
+            plan_writer.write(scheduler, plan)
+
+    # 结构化输出写到标准输出时, 各调度算法的文本输出改写到标准错误。
+    with contextlib.redirect_stdout(sys.stderr if plan_writer is not None and args.output is None else sys.stdout):
+        # 顺序调度:
+        report('sequential', sequential_execution(job_names, gpu_num, data, cluster))
+        # 并行调度:
+        report('parallel', parallel_execution(job_names, gpu_num, data, cluster))
+        # Optimus调度:
+        report('optimus', optimus_execution(job_names, gpu_num, data, cluster))
+        if args.multi_objective:
+            # 多目标遗传算法, 同时优化完成时间、利用率和平均JCT, 输出Pareto前沿上的每个方案:
+            from multi_objective import nsga_execution
+            for used_slice, prefix in [(False, 'pareto'), (True, 'pareto_slice')]:
+                for k, pareto_plan in enumerate(nsga_execution(job_names, gpu_num, data, args, used_slice, cluster)):
+                    report(f'{prefix}_{k}', pareto_plan.plan, used_slice)
+        elif len(job_names) <= args.exact_max_jobs:
+            # 作业数较少时遗传算法不利用时间片的最优划分可以精确求解, 并作为利用时间片的遗传算法的初始个体:
+            from exact import exact_execution
+            plan = exact_execution(job_names, gpu_num, data, cluster)
+            report('exact', plan)
+            plan_orders = get_plan_orders(plan)
+            report('ga_slice', ga_execution(job_names, gpu_num, data, args, True, cluster, callbacks,
+                                            [[plan_orders[job_name] for job_name in job_names]]), True)
+        else:
+            # 遗传算法调度(不考虑利用时间片):
+            report('ga', ga_execution(job_names, gpu_num, data, args, False, cluster, callbacks))
+            # 遗传算法调度(考虑利用时间片):
+            report('ga_slice', ga_execution(job_names, gpu_num, data, args, True, cluster, callbacks), True)
+    for callback in callbacks:
+        callback.close()
+    if plan_writer is not None:
+        plan_writer.close()
+
+
+def main():
+    args = parser.parse_args()
+    if args.profile:
+        from instrumentation import run_profiled
+        run_profiled(run, args.profile_top, args)
+    else:
+        run(args)
 
 
 if __name__ == '__main__':
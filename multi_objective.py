@@ -0,0 +1,134 @@
+from typing import List, Dict
+
+import numpy as np
+
+from entity import TrainingData, Individual, Cluster, ParetoPlan
+from experiment import cal_individual_plan, report_plan
+from fitness import pack_training_data, cal_group_objectives, canonical_orders
+from genetic_algorithm import get_random, matrix_cross_over, matrix_mutation, Termination
+
+OBJECTIVES = ['total_time', 'utilization_rate', 'average_jct']
+
+
+def evaluate_objectives(orders: np.ndarray,
+                        max_gpu_num: int,
+                        epoch_num: np.ndarray,
+                        epoch_time: np.ndarray,
+                        used_slice: bool) -> np.ndarray:
+    # 返回需要最小化的目标矩阵(完成时间, -利用率, 平均JCT), 重新编号后相同的染色体只模拟一次。
+    unique_orders, unique_index, inverse = np.unique(canonical_orders(orders), axis=0, return_index=True,
+                                                     return_inverse=True)
+    total_time, utilization_rate, average_jct = cal_group_objectives(orders[unique_index], max_gpu_num, epoch_num,
+                                                                     epoch_time, used_slice)
+    objectives = np.stack([total_time, -utilization_rate, average_jct], axis=1)
+    return objectives[inverse.reshape(-1)]
+
+
+def non_dominated_sort(objectives: np.ndarray) -> np.ndarray:
+    # 支配关系一次性向量化为N×N矩阵, 之后逐层剥离: 每层只需减去该层个体对其余个体的支配计数。
+    less_equal = np.ones((len(objectives), len(objectives)), dtype=bool)
+    less = np.zeros((len(objectives), len(objectives)), dtype=bool)
+    for values in objectives.T:
+        less_equal &= values[:, None] <= values[None, :]
+        less |= values[:, None] < values[None, :]
+    dominates = less_equal & less
+    counts = np.count_nonzero(dominates, axis=0)
+    ranks = np.full(len(objectives), -1, dtype=np.int64)
+    front = np.nonzero(counts == 0)[0]
+    rank = 0
+    while len(front) > 0:
+        ranks[front] = rank
+        counts -= np.count_nonzero(dominates[front], axis=0)
+        counts[front] = -1
+        front = np.nonzero(counts == 0)[0]
+        rank += 1
+    return ranks
+
+
+def crowding_distance(objectives: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    # 每个目标按(层, 目标值)排序一次即可同时得到所有层内的相邻个体, 每层两端的个体距离为无穷大。
+    distance = np.zeros(len(objectives), dtype=np.float64)
+    for m in range(objectives.shape[1]):
+        order = np.lexsort((objectives[:, m], ranks))
+        values, order_ranks = objectives[order, m], ranks[order]
+        same_prev = np.concatenate([[False], order_ranks[1:] == order_ranks[:-1]])
+        same_next = np.concatenate([order_ranks[:-1] == order_ranks[1:], [False]])
+        lower = np.minimum.reduceat(values, np.flatnonzero(~same_prev))
+        upper = np.maximum.reduceat(values, np.flatnonzero(~same_prev))
+        span = np.repeat(upper - lower, np.diff(np.append(np.flatnonzero(~same_prev), len(values))))
+        gap = np.zeros(len(values), dtype=np.float64)
+        inner = same_prev & same_next
+        gap[inner] = (values[np.flatnonzero(inner) + 1] - values[np.flatnonzero(inner) - 1]) / \
+            np.where(span[inner] > 0, span[inner], 1)
+        gap[~inner] = np.inf
+        distance[order] += gap
+    return distance
+
+
+def tournament_selection(orders: np.ndarray,
+                         ranks: np.ndarray,
+                         distance: np.ndarray,
+                         rd: np.random.Generator) -> np.ndarray:
+    # 二元锦标赛: 层数小者胜, 同层时拥挤距离大者胜。
+    first, second = rd.integers(0, len(orders), (2, len(orders)))
+    first_wins = (ranks[first] < ranks[second]) | ((ranks[first] == ranks[second]) &
+                                                   (distance[first] >= distance[second]))
+    return orders[np.where(first_wins, first, second)]
+
+
+def survival_selection(orders: np.ndarray,
+                       objectives: np.ndarray,
+                       individual_num: int) -> tuple:
+    ranks = non_dominated_sort(objectives)
+    distance = crowding_distance(objectives, ranks)
+    index = np.lexsort((-distance, ranks))[:individual_num]
+    return orders[index], objectives[index], ranks[index], distance[index]
+
+
+def nsga_execution(job_names: List[str],
+                   max_gpu_num: int,
+                   data: Dict[str, Dict[int, TrainingData]],
+                   args,
+                   used_slice: bool,
+                   cluster: Cluster = None) -> List[ParetoPlan]:
+    termination = Termination(args.patience, args.epsilon, args.time_budget_ms, args.target_time)
+    rd = get_random(args.seed, 'numpy')
+    job_nums = len(job_names)
+    epoch_num, epoch_time = pack_training_data(job_names, max_gpu_num, data)
+    fitness_args = (max_gpu_num, epoch_num, epoch_time, used_slice)
+
+    orders = rd.integers(1, job_nums + 1, (args.individual_num, job_nums))
+    objectives = evaluate_objectives(orders, *fitness_args)
+    orders, objectives, ranks, distance = survival_selection(orders, objectives, args.individual_num)
+    termination.update(objectives[:, 0].min(), 0, len(orders))
+    for _ in range(args.iteration_times):
+        if termination.is_finished():
+            break
+        after_orders = tournament_selection(orders, ranks, distance, rd)
+        matrix_cross_over(after_orders, rd)
+        matrix_mutation(after_orders, rd)
+        after_objectives = evaluate_objectives(after_orders, *fitness_args)
+        orders, objectives, ranks, distance = survival_selection(np.concatenate([orders, after_orders]),
+                                                                 np.concatenate([objectives, after_objectives]),
+                                                                 args.individual_num)
+        termination.update(objectives[:, 0].min(), 1, len(after_orders))
+
+    # 第一层中目标值相同的个体只保留一个, 按完成时间排列后为每个个体构建执行方案。
+    front = {}
+    for k in np.nonzero(ranks == 0)[0]:
+        front.setdefault(tuple(objectives[k]), orders[k].tolist())
+    pareto_plans = []
+    for (total_time, utilization_rate, average_jct), front_orders in sorted(front.items()):
+        individual = Individual(front_orders)
+        cal_individual_plan(individual, max_gpu_num, job_names, data, used_slice)
+        individual.plan.cal_utilization_rate()
+        pareto_plans.append(ParetoPlan(front_orders, individual.plan, total_time, -utilization_rate, average_jct))
+
+    print(f'Pareto前沿: {len(pareto_plans)}个方案.')
+    for k, pareto_plan in enumerate(pareto_plans):
+        print(f'方案{k}: 完成时间: {round(pareto_plan.total_time / 60)}minutes, '
+              f'利用率: {round(pareto_plan.utilization_rate, 3)}%, '
+              f'平均JCT: {round(pareto_plan.average_jct / 60, 3)}minutes.')
+    report_plan(pareto_plans[0].plan, data, cluster)
+    termination.print_summary()
+    return pareto_plans
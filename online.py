@@ -0,0 +1,233 @@
+import argparse
+import heapq
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+
+from database import get_training_data
+from entity import Job, TrainingData, Plan, slotted
+from experiment import get_utility, get_plan_orders, ga_execution
+from main import parser as main_parser
+from workload import generate_training_data, generate_arrivals
+
+COMPLETION = 0
+ARRIVAL = 1
+
+
+@slotted
+@dataclass
+class OnlineJob:
+    seq: int
+    job: Job
+    arrival_time: float
+    start_time: float = -1
+    finish_time: float = -1
+    last_time: float = 0
+    version: int = 0
+
+
+class OptimusPolicy:
+    # 先到先服务, 空闲的GPU分配给效用最高的作业。
+    def get_priority(self, record: OnlineJob) -> tuple:
+        return record.arrival_time, record.seq
+
+    def get_score(self, record: OnlineJob, data: Dict[str, Dict[int, TrainingData]]) -> float:
+        return get_utility(record.job, data)
+
+
+class PlanPolicy:
+    # 按静态方案(如遗传算法)中的批次先后排队, 空闲的GPU分配给剩余时间最长的作业。
+    def __init__(self, plan: Plan):
+        self.orders = get_plan_orders(plan)
+        self.default_order = len(plan.plan) + 1
+
+    def get_priority(self, record: OnlineJob) -> tuple:
+        return self.orders.get(record.job.name, self.default_order), record.job.completion_time, record.seq
+
+    def get_score(self, record: OnlineJob, data: Dict[str, Dict[int, TrainingData]]) -> float:
+        return record.job.completion_time
+
+
+class OnlineScheduler:
+    def __init__(self,
+                 max_gpu_num: int,
+                 data: Dict[str, Dict[int, TrainingData]],
+                 policy):
+        self.max_gpu_num = max_gpu_num
+        self.data = data
+        self.policy = policy
+        self.now = 0
+        self.free_gpu_num = max_gpu_num
+        self.busy_resource = 0
+        self.event_nums = 0
+        self.records = []
+        self._events = []
+        self._waiting = []
+        # 扩容堆以(-得分, 序号, 版本)为键, 缩容堆以(-GPU数目, 序号, 版本)为键,
+        # 作业每次变化后版本加一, 旧版本的条目在弹出时丢弃。
+        self._grow_heap = []
+        self._shrink_heap = []
+
+    def submit(self, job_name: str, arrival_time: float):
+        training_data = self.data[job_name][1]
+        job = Job(name=job_name,
+                  order=0,
+                  gpu_num=1,
+                  epoch_num=training_data.epoch_num,
+                  epoch_time=training_data.epoch_time,
+                  completion_time=training_data.epoch_num * training_data.epoch_time)
+        record = OnlineJob(len(self.records), job, arrival_time)
+        self.records.append(record)
+        heapq.heappush(self._events, (arrival_time, ARRIVAL, record.seq, record.version))
+
+    def step(self):
+        event_time = self._events[0][0]
+        self.busy_resource += (self.max_gpu_num - self.free_gpu_num) * (event_time - self.now)
+        self.now = event_time
+        # 同一时刻的事件一起处理后再做一次分配决策。
+        while self._events and self._events[0][0] == event_time:
+            _, kind, seq, version = heapq.heappop(self._events)
+            record = self.records[seq]
+            if record.version != version:
+                continue
+            self.event_nums += 1
+            if kind == ARRIVAL:
+                heapq.heappush(self._waiting, (self.policy.get_priority(record), seq))
+            else:
+                self._advance(record)
+                self.free_gpu_num += record.job.gpu_num
+                record.finish_time = self.now
+                record.version += 1
+        self.reallocate()
+
+    def run(self) -> List[OnlineJob]:
+        while self._events:
+            self.step()
+        return self.records
+
+    def reallocate(self):
+        while len(self._waiting) > self.free_gpu_num and self._shrink():
+            pass
+        while self._waiting and self.free_gpu_num > 0:
+            _, seq = heapq.heappop(self._waiting)
+            record = self.records[seq]
+            record.start_time = self.now
+            record.last_time = self.now
+            self.free_gpu_num -= 1
+            self._update(record)
+        while self.free_gpu_num > 0 and self._grow():
+            pass
+
+    def _advance(self, record: OnlineJob):
+        if self.now > record.last_time:
+            record.job.reduce_epoch_num((self.now - record.last_time) / record.job.epoch_time)
+            record.last_time = self.now
+
+    def _update(self, record: OnlineJob):
+        record.version += 1
+        record.finish_time = self.now + record.job.completion_time
+        heapq.heappush(self._events, (record.finish_time, COMPLETION, record.seq, record.version))
+        if record.job.gpu_num < self.max_gpu_num:
+            score = self.policy.get_score(record, self.data)
+            heapq.heappush(self._grow_heap, (-score, record.seq, record.version))
+        if record.job.gpu_num > 1:
+            heapq.heappush(self._shrink_heap, (-record.job.gpu_num, record.seq, record.version))
+
+    def _resize(self, record: OnlineJob, gpu_num: int):
+        self._advance(record)
+        record.job.add_gpu(gpu_num, self.data)
+        self.free_gpu_num -= gpu_num
+        self._update(record)
+
+    def _grow(self) -> bool:
+        while self._grow_heap:
+            _, seq, version = heapq.heappop(self._grow_heap)
+            record = self.records[seq]
+            if record.version != version:
+                continue
+            # 正的得分只会随作业的推进而减小, 堆中的旧得分是上界, 重新计算后仍不小于堆顶时即为最大值。
+            # 得分不为正(增加GPU反而变慢)的作业不再扩容, 空闲的GPU留给之后到达的作业。
+            self._advance(record)
+            key = (-self.policy.get_score(record, self.data), seq, version)
+            if key[0] >= 0:
+                continue
+            if self._grow_heap and key > self._grow_heap[0]:
+                heapq.heappush(self._grow_heap, key)
+                continue
+            self._resize(record, 1)
+            return True
+        return False
+
+    def _shrink(self) -> bool:
+        while self._shrink_heap:
+            _, seq, version = heapq.heappop(self._shrink_heap)
+            record = self.records[seq]
+            if record.version == version:
+                self._resize(record, -1)
+                return True
+        return False
+
+    def get_makespan(self) -> float:
+        return max(r.finish_time for r in self.records) - min(r.arrival_time for r in self.records)
+
+    def get_utilization_rate(self) -> float:
+        return self.busy_resource / (self.get_makespan() * self.max_gpu_num) * 100
+
+    def print_report(self):
+        job_nums = len(self.records)
+        queueing_delay = sum(r.start_time - r.arrival_time for r in self.records) / job_nums
+        jct = sum(r.finish_time - r.arrival_time for r in self.records) / job_nums
+        print(f'完成时间: {round(self.get_makespan() / 60)}minutes.')
+        print(f'利用率: {round(self.get_utilization_rate(), 3)}%.')
+        print(f'平均排队时延: {round(queueing_delay / 60, 3)}minutes, 平均JCT: {round(jct / 60, 3)}minutes.')
+
+
+def online_execution(arrivals: List[Tuple[float, str]],
+                     max_gpu_num: int,
+                     data: Dict[str, Dict[int, TrainingData]],
+                     policy) -> OnlineScheduler:
+    scheduler = OnlineScheduler(max_gpu_num, data, policy)
+    for arrival_time, job_name in arrivals:
+        scheduler.submit(job_name, arrival_time)
+    start_time = time.perf_counter()
+    scheduler.run()
+    elapsed_time = time.perf_counter() - start_time
+    scheduler.print_report()
+    print(f'事件数: {scheduler.event_nums}, 每秒处理事件: {round(scheduler.event_nums / max(elapsed_time, 1e-9))}.')
+    return scheduler
+
+
+parser = argparse.ArgumentParser(description='')
+parser.add_argument('-c', '--category', default=None, type=str)
+parser.add_argument('-g', '--gpu-num', default=64, type=int)
+parser.add_argument('-j', '--job-nums', default=50, type=int)
+parser.add_argument('-a', '--arrival-nums', default=1000, type=int)
+parser.add_argument('-r', '--arrival-rate', default=0.01, type=float)
+parser.add_argument('-s', '--seed', default=0, type=int)
+parser.add_argument('-p', '--policy', default='optimus', choices=['optimus', 'ga'])
+parser.add_argument('--source', default=None, choices=['mysql', 'sqlite', 'csv', 'json'])
+parser.add_argument('--source-path', default=None, type=str)
+
+
+def main():
+    args, ga_argv = parser.parse_known_args()
+    if args.category is None:
+        job_names, data = generate_training_data(args.job_nums, args.gpu_num, args.seed)
+    else:
+        with open(f'./job_name_data/{args.category}.txt', 'r') as f:
+            job_names = [job_name.strip() for job_name in f]
+        data = get_training_data(job_names, args.gpu_num, source_type=args.source, source_path=args.source_path)
+
+    if args.policy == 'optimus':
+        policy = OptimusPolicy()
+    else:
+        # 遗传算法只对作业种类离线求解一次, 在线调度时按其批次先后排队。
+        ga_args = main_parser.parse_args(ga_argv)
+        ga_args.seed = args.seed if ga_args.seed is None else ga_args.seed
+        policy = PlanPolicy(ga_execution(job_names, args.gpu_num, data, ga_args, False))
+    arrivals = generate_arrivals(job_names, args.arrival_nums, args.arrival_rate, args.seed)
+    online_execution(arrivals, args.gpu_num, data, policy)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import csv
+import json
+import sys
+from typing import Dict, Iterator
+
+from entity import Plan
+
+PLAN_COLUMNS = ('scheduler', 'batch', 'slice', 'job_name', 'gpu_num', 'epoch_num', 'epoch_time', 'start_time',
+                'end_time', 'gpu_ids', 'makespan', 'utilization_rate')
+
+
+def iter_plan_records(plan: Plan) -> Iterator[Dict]:
+    # 批次依次执行, 时间片内的作业依次执行, 由此得到每个作业的开始和结束时间。
+    batch_start_time = 0
+    for batch_index, batch in enumerate(plan.plan):
+        for slice_index, ts in enumerate(batch.slice_list):
+            start_time = batch_start_time
+            for job in ts.job_list:
+                yield {'batch': batch_index,
+                       'slice': slice_index,
+                       'job_name': job.name,
+                       'gpu_num': ts.gpu_num,
+                       'epoch_num': job.epoch_num,
+                       'epoch_time': job.epoch_time,
+                       'start_time': start_time,
+                       'end_time': start_time + job.completion_time,
+                       'gpu_ids': ts.gpu_ids}
+                start_time += job.completion_time
+        batch_start_time += batch.max_slice_length
+
+
+def get_plan_header(scheduler: str, plan: Plan) -> Dict:
+    return {'scheduler': scheduler,
+            'max_gpu_num': plan.max_gpu_num,
+            'makespan': plan.total_time,
+            'utilization_rate': plan.utilization_rate}
+
+
+class PlanWriter:
+    def __init__(self, path: str = None, output_format: str = 'json'):
+        self.output_format = output_format
+        self.file = open(path, 'w', encoding='utf-8', newline='') if path is not None else sys.stdout
+        self.plan_nums = 0
+        if output_format == 'csv':
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(PLAN_COLUMNS)
+        else:
+            self.file.write('[')
+
+    def write(self, scheduler: str, plan: Plan):
+        # 逐个作业写入文件, 不在内存中拼接整个方案。
+        plan.cal_utilization_rate()
+        if self.output_format == 'csv':
+            for record in iter_plan_records(plan):
+                gpu_ids = ' '.join(map(str, record['gpu_ids'])) if record['gpu_ids'] is not None else ''
+                self.writer.writerow((scheduler, record['batch'], record['slice'], record['job_name'],
+                                      record['gpu_num'], record['epoch_num'], record['epoch_time'],
+                                      record['start_time'], record['end_time'], gpu_ids, plan.total_time,
+                                      plan.utilization_rate))
+        else:
+            header = get_plan_header(scheduler, plan)
+            self.file.write((',\n' if self.plan_nums > 0 else '\n') + json.dumps(header)[:-1] + ', "jobs": [')
+            for i, record in enumerate(iter_plan_records(plan)):
+                self.file.write((',\n' if i > 0 else '\n') + json.dumps(record, ensure_ascii=False))
+            self.file.write('\n]}')
+        self.plan_nums += 1
+        self.file.flush()
+
+    def close(self):
+        if self.output_format != 'csv':
+            self.file.write('\n]\n')
+        if self.file is not sys.stdout:
+            self.file.close()
+        else:
+            self.file.flush()
@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Dict, Tuple
+
+from archive import ScheduleArchive
+from database import get_data_source
+from entity import TrainingData, Plan, Individual, Cluster
+from exact import exact_execution
+from experiment import sequential_execution, parallel_execution, optimus_execution, ga_execution
+from main import parser as main_parser
+from serialization import iter_plan_records, get_plan_header
+
+SCHEDULERS = ['sequential', 'parallel', 'optimus', 'exact', 'ga', 'ga_slice']
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error'}
+
+parser = argparse.ArgumentParser(description='')
+parser.add_argument('--host', default='127.0.0.1', type=str)
+parser.add_argument('-p', '--port', default=8080, type=int)
+parser.add_argument('--unix', default=None, type=str)
+parser.add_argument('-g', '--gpu-num', default=8, type=int)
+parser.add_argument('--categories', default=None, type=str, nargs='*')
+parser.add_argument('--source', default=None, choices=['mysql', 'sqlite', 'csv', 'json'])
+parser.add_argument('--source-path', default=None, type=str)
+parser.add_argument('--interpolate', action='store_true')
+parser.add_argument('--pool-workers', default=2, type=int)
+parser.add_argument('--plan-cache-size', default=1000, type=int)
+parser.add_argument('--archive', default=None, type=str)
+parser.add_argument('--warm-patience', default=20, type=int)
+
+
+def run_scheduler(scheduler: str,
+                  job_names: List[str],
+                  max_gpu_num: int,
+                  data: Dict[str, Dict[int, TrainingData]],
+                  args,
+                  cluster: Cluster = None,
+                  seed_orders: List[List[int]] = None) -> Plan:
+    # 在工作进程中执行, 各调度算法的文本输出不写到服务的标准输出。
+    with contextlib.redirect_stdout(io.StringIO()):
+        if scheduler == 'sequential':
+            plan = sequential_execution(job_names, max_gpu_num, data, cluster)
+        elif scheduler == 'parallel':
+            plan = parallel_execution(job_names, max_gpu_num, data, cluster)
+        elif scheduler == 'optimus':
+            plan = optimus_execution(job_names, max_gpu_num, data, cluster)
+        elif scheduler == 'exact':
+            plan = exact_execution(job_names, max_gpu_num, data, cluster)
+        else:
+            plan = ga_execution(job_names, max_gpu_num, data, args, scheduler == 'ga_slice', cluster,
+                                seed_orders=seed_orders)
+    plan.cal_utilization_rate()
+    return plan
+
+
+def get_last_orders(plan: Plan, job_names: List[str]) -> List[int]:
+    # 利用空闲时间片时作业的一部分可能提前填入前一批次, 按作业最后所在的批次还原染色体。
+    orders = {}
+    for i, batch in enumerate(plan.plan, 1):
+        for ts in batch.slice_list:
+            for job in ts.job_list:
+                orders[job.name] = i
+    return [orders[job_name] for job_name in job_names]
+
+
+class SchedulerService:
+    # 常驻的调度服务: 训练数据、方案缓存和各作业集合的最优染色体保存在内存中,
+    # 调度算法在进程池中执行, 事件循环只负责解析请求和查找缓存, 不会被耗时的搜索阻塞。
+    def __init__(self, args, ga_args, executor: Executor):
+        self.args = args
+        self.ga_args = ga_args
+        self.executor = executor
+        self.source = get_data_source(args.source, args.source_path)
+        self.categories = {}
+        self.profiles = {}
+        self.plans = OrderedDict()
+        self.running = {}
+        self.archive = ScheduleArchive(args.archive, ga_args.archive_size)
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load_category(self, category: str) -> List[str]:
+        job_names = self.categories.get(category)
+        if job_names is None:
+            path = f'./job_name_data/{category}.txt'
+            if not os.path.exists(path):
+                raise ValueError(f'未知的作业类别: {category}')
+            with open(path, 'r') as f:
+                job_names = [job_name.strip() for job_name in f if job_name.strip()]
+            self.categories[category] = job_names
+        return job_names
+
+    def load_profiles(self, job_names: List[str], max_gpu_num: int) -> Dict[str, Dict[int, TrainingData]]:
+        # 训练数据按GPU数目常驻内存, 只从数据源读取尚未加载过的作业。
+        profiles = self.profiles.setdefault(max_gpu_num, {})
+        missing = [job_name for job_name in job_names if job_name not in profiles]
+        if len(missing) > 0:
+            profiles.update(self.source.get_training_data(missing, max_gpu_num, False, self.args.interpolate))
+        return {job_name: profiles[job_name] for job_name in job_names}
+
+    def preload(self, categories: List[str] = None):
+        if categories is None:
+            categories = sorted(name[:-4] for name in os.listdir('./job_name_data') if name.endswith('.txt'))
+        for category in categories:
+            self.load_profiles(self.load_category(category), self.args.gpu_num)
+
+    def parse_request(self, request: Dict) -> Tuple[str, List[str], int, argparse.Namespace, Dict]:
+        scheduler = request.get('scheduler', 'ga_slice')
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f'未知的调度算法: {scheduler}, 可选: {", ".join(SCHEDULERS)}')
+        if 'job_names' in request:
+            job_names = [str(job_name) for job_name in request['job_names']]
+        elif 'category' in request:
+            job_names = self.load_category(request['category'])
+        else:
+            raise ValueError('请求中需要指定 job_names 或 category')
+        if len(job_names) == 0 or len(set(job_names)) != len(job_names):
+            raise ValueError('作业列表为空或包含重复的作业')
+        max_gpu_num = int(request.get('gpu_num', self.args.gpu_num))
+        if max_gpu_num <= 0:
+            raise ValueError(f'GPU数目必须为正整数: {max_gpu_num}')
+
+        # 遗传算法等参数与main.py的命令行参数同名, 在服务启动时的参数上逐项覆盖。
+        options = request.get('options', {})
+        args = argparse.Namespace(**vars(self.ga_args))
+        for key, value in options.items():
+            if key not in vars(args):
+                raise ValueError(f'未知的参数: {key}')
+            setattr(args, key, value)
+        if scheduler == 'exact' and len(job_names) > args.exact_max_jobs:
+            raise ValueError(f'精确求解最多支持 {args.exact_max_jobs} 个作业')
+        return scheduler, job_names, max_gpu_num, args, options
+
+    async def compute(self,
+                      scheduler: str,
+                      job_names: List[str],
+                      max_gpu_num: int,
+                      args) -> Dict:
+        loop = asyncio.get_event_loop()
+        data = await loop.run_in_executor(None, self.load_profiles, job_names, max_gpu_num)
+        cluster = None
+        if args.gpus_per_node > 0:
+            if max_gpu_num % args.gpus_per_node != 0:
+                raise ValueError(f'GPU数目 {max_gpu_num} 不是每个节点GPU数目 {args.gpus_per_node} 的整数倍')
+            cluster = Cluster(max_gpu_num // args.gpus_per_node, args.gpus_per_node, args.intra_node_speed,
+                              args.inter_node_speed)
+            data = cluster.adjust_training_data(data)
+
+        # 相同或相近的作业集合之前得到的最优染色体作为初始个体, 未指定提前终止条件时按warm_patience提前结束。
+        used_slice = scheduler == 'ga_slice'
+        seed_orders = self.archive.lookup(job_names, max_gpu_num, used_slice) if scheduler in ['ga', 'ga_slice'] \
+            else []
+        if len(seed_orders) > 0 and args.patience == 0:
+            args.patience = self.args.warm_patience
+        plan = await loop.run_in_executor(self.executor, run_scheduler, scheduler, job_names, max_gpu_num, data,
+                                          args, cluster, seed_orders)
+        if scheduler in ['exact', 'ga', 'ga_slice']:
+            self.archive.update(job_names, max_gpu_num, used_slice,
+                                [Individual(get_last_orders(plan, job_names), total_time=plan.total_time)])
+        response = get_plan_header(scheduler, plan)
+        response['jobs'] = list(iter_plan_records(plan))
+        response['warm_start'] = len(seed_orders)
+        return response
+
+    async def schedule(self, request: Dict) -> Dict:
+        start_time = time.perf_counter()
+        scheduler, job_names, max_gpu_num, args, options = self.parse_request(request)
+        key = json.dumps([scheduler, job_names, max_gpu_num, options], sort_keys=True)
+        self.requests += 1
+        response = self.plans.get(key) if not request.get('refresh', False) else None
+        cached = response is not None
+        if cached:
+            self.hits += 1
+            self.plans.move_to_end(key)
+        else:
+            self.misses += 1
+            # 相同的请求正在计算时等待同一个结果; 客户端断开时不取消计算, 结果仍会写入缓存。
+            task = self.running.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self.compute(scheduler, job_names, max_gpu_num, args))
+                self.running[key] = task
+                task.add_done_callback(lambda _: self.running.pop(key, None))
+            response = await asyncio.shield(task)
+            self.plans[key] = response
+            self.plans.move_to_end(key)
+            while len(self.plans) > self.args.plan_cache_size:
+                self.plans.popitem(last=False)
+        return dict(response, cached=cached, elapsed_ms=round((time.perf_counter() - start_time) * 1000, 3))
+
+    def get_status(self) -> Dict:
+        return {'requests': self.requests,
+                'plan_cache': {'size': len(self.plans), 'hits': self.hits, 'misses': self.misses},
+                'running': len(self.running),
+                'profiles': {str(max_gpu_num): len(profiles) for max_gpu_num, profiles in self.profiles.items()},
+                'categories': sorted(self.categories),
+                'archive_entries': len(self.archive.entries)}
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        path = path.split('?', 1)[0]
+        routes = {'/status': 'GET', '/schedule': 'POST'}
+        if path not in routes:
+            return 404, {'error': f'未知的路径: {path}'}
+        if method != routes[path]:
+            return 405, {'error': f'{path} 只支持 {routes[path]} 请求'}
+        if path == '/status':
+            return 200, self.get_status()
+        request = json.loads(body.decode('utf-8')) if len(body) > 0 else {}
+        if not isinstance(request, dict):
+            raise ValueError('请求体必须是JSON对象')
+        return 200, await self.schedule(request)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # 只实现调度接口需要的HTTP/1.1子集: 每个连接处理一个请求, 请求体按Content-Length读取。
+        try:
+            method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if len(line) == 0:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            status, response = await self.dispatch(method, path, body)
+        except ValueError as e:
+            status, response = 400, {'error': str(e)}
+        except Exception as e:
+            status, response = 500, {'error': repr(e)}
+        payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        head = f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n' \
+               f'Content-Type: application/json; charset=utf-8\r\n' \
+               f'Content-Length: {len(payload)}\r\n' \
+               f'Connection: close\r\n\r\n'
+        writer.write(head.encode('latin-1') + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host: str = None, port: int = None, unix: str = None) -> asyncio.AbstractServer:
+        # 先启动所有工作进程再监听: 之后才创建的子进程会继承已接受的连接, 服务端关闭连接后客户端收不到EOF。
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, os.getpid) for _ in range(self.args.pool_workers)])
+        if unix is not None:
+            return await asyncio.start_unix_server(self.handle, unix)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def serve(args, ga_args):
+    with ProcessPoolExecutor(args.pool_workers) as executor:
+        service = SchedulerService(args, ga_args, executor)
+        # 启动时预先读取训练数据, 之后的请求不再承担这些开销。
+        await asyncio.get_event_loop().run_in_executor(None, service.preload, args.categories)
+        server = await service.start(args.host, args.port, args.unix)
+        address = args.unix if args.unix is not None else f'http://{args.host}:{server.sockets[0].getsockname()[1]}'
+        print(f'调度服务已启动: {address}, 工作进程数: {args.pool_workers}, '
+              f'已加载 {sum(map(len, service.profiles.values()))} 个作业的训练数据.', flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    # 未识别的参数作为遗传算法等调度参数的默认值, 与main.py的命令行参数相同。
+    args, ga_argv = parser.parse_known_args()
+    ga_args = main_parser.parse_args(ga_argv)
+    try:
+        asyncio.run(serve(args, ga_args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+from typing import List, Dict, Iterable, Tuple
+
+import numpy as np
+
+from entity import TrainingData
+
+
+def fit_speedup_exponent(gpu_nums: np.ndarray, epoch_times: np.ndarray) -> float:
+    # 按幂律t(g) = k * g^-alpha在对数坐标下做最小二乘, alpha限制在[0, 1]之间(不会超线性加速, 也不会变慢);
+    # 只有一个测量点时按线性加速估计。
+    if len(gpu_nums) == 1:
+        return 1.0
+    slope = np.polyfit(np.log(gpu_nums), np.log(epoch_times), 1)[0]
+    return float(np.clip(-slope, 0, 1))
+
+
+def get_dense_epoch_time(gpu_nums: np.ndarray, epoch_times: np.ndarray, max_gpu_num: int) -> np.ndarray:
+    # 测量范围内在对数坐标下分段线性插值(相邻测量点之间按幂律变化), 范围外从边界测量点起按拟合的幂律外推。
+    # 返回值的下标为GPU数目, 下标0不使用。
+    order = np.argsort(gpu_nums)
+    gpu_nums, epoch_times = gpu_nums[order], epoch_times[order]
+    all_gpu_nums = np.arange(1, max_gpu_num + 1, dtype=np.float64)
+    dense = np.exp(np.interp(np.log(all_gpu_nums), np.log(gpu_nums), np.log(epoch_times)))
+
+    alpha = fit_speedup_exponent(gpu_nums, epoch_times)
+    for edge, outside in [(0, all_gpu_nums < gpu_nums[0]), (-1, all_gpu_nums > gpu_nums[-1])]:
+        dense[outside] = epoch_times[edge] * (all_gpu_nums[outside] / gpu_nums[edge]) ** -alpha
+    return np.concatenate([[0], np.maximum(np.round(dense, 3), 0.001)])
+
+
+def fit_training_data(rows: Iterable[Tuple[str, int, int, float]],
+                      job_names: List[str],
+                      max_gpu_num: int,
+                      min_points: int = 3) -> Tuple[Dict[str, Dict[int, TrainingData]], Dict[str, str]]:
+    # 由稀疏的测量值为每个作业生成1~max_gpu_num个GPU的完整数据, 测量过的GPU数目保留原值;
+    # 同时返回测量点过少或需要外推的作业及原因。
+    measurements = {job_name: {} for job_name in job_names}
+    for job_name, gpu_num, epoch_num, epoch_time in rows:
+        if job_name in measurements:
+            measurements[job_name].setdefault(gpu_num, TrainingData(epoch_num, epoch_time))
+
+    missing = [job_name for job_name in job_names if len(measurements[job_name]) == 0]
+    if len(missing) > 0:
+        raise ValueError(f'training_times 中缺少 {len(missing)} 个作业的训练数据: {", ".join(missing)}')
+
+    data, flags = {}, {}
+    for job_name in job_names:
+        measured = measurements[job_name]
+        gpu_nums = np.array(sorted(measured), dtype=np.float64)
+        epoch_times = np.array([measured[g].epoch_time for g in sorted(measured)])
+        epoch_num = measured[min(measured)].epoch_num
+        dense = get_dense_epoch_time(gpu_nums, epoch_times, max_gpu_num)
+        data[job_name] = {g: measured[g] if g in measured else TrainingData(epoch_num, float(dense[g]))
+                          for g in range(1, max_gpu_num + 1)}
+
+        reasons = []
+        if len(measured) < min_points:
+            reasons.append(f'仅有{len(measured)}个测量点')
+        if min(measured) > 1:
+            reasons.append(f'最少测量到{min(measured)}个GPU, 外推至1个GPU')
+        if max(measured) < max_gpu_num:
+            reasons.append(f'最多测量到{max(measured)}个GPU, 外推至{max_gpu_num}个GPU')
+        if len(reasons) > 0:
+            flags[job_name] = ', '.join(reasons)
+    return data, flags
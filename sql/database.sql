@@ -10,4 +10,5 @@ create table if not exists training_times
     epoch_time float        default 0         not null
 );
 
-
+create index idx_training_times_job_name_gpu_num
+    on training_times (job_name, gpu_num);
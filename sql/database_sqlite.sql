@@ -0,0 +1,13 @@
+create table if not exists training_times
+(
+    id         integer primary key autoincrement,
+    job_name   varchar(100) default 'job'     not null,
+    dataset    varchar(100) default 'dataset' not null,
+    batch_size int          default 0         not null,
+    epoch_num  int          default 0         not null,
+    gpu_num    int          default 0         not null,
+    epoch_time float        default 0         not null
+);
+
+create index if not exists idx_training_times_job_name_gpu_num
+    on training_times (job_name, gpu_num);
@@ -1,8 +1,50 @@
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 
-from database import get_training_data
-from experiment import sequential_execution, parallel_execution, cal_individual_plan, optimus_execution, ga_execution
-from genetic_algorithm import *
+import draw_experience
+from database import get_training_data, build_training_data, get_snapshot_path, load_snapshot, save_snapshot, \
+    CSVSource, JSONSource, SQLiteSource
+from entity import TrainingData, TimeSlice, Batch, Plan, Job, Cluster, Individual
+from main import parser as main_parser
+from serialization import PlanWriter, iter_plan_records
+from topology import NodePool, place_plan, get_slice_node_span, get_node_placement
+from workload import generate_profiles, generate_rows, generate_training_data, generate_arrivals
+
+
+def make_training_data(job_nums: int, max_gpu_num: int, seed: int):
+    rd = random.Random(seed)
+    job_names = [f'job{i}' for i in range(job_nums)]
+    data = {}
+    for job_name in job_names:
+        epoch_num = rd.choice([10, 20, 50])
+        epoch_time = rd.choice([10, 20, 30, rd.uniform(5, 100)])
+        alpha = rd.uniform(0.3, 1.0)
+        data[job_name] = {g: TrainingData(epoch_num, round(epoch_time / g ** alpha, rd.choice([0, 1, 3])))
+                          for g in range(1, max_gpu_num + 1)}
+    return job_names, data
+
+
+def make_args(**kwargs) -> argparse.Namespace:
+    args = main_parser.parse_args(['-i', '100', '-n', '20'])
+    vars(args).update(kwargs)
+    return args
+
+
+def describe_plan(plan: Plan) -> list:
+    return [[(ts.gpu_num, [(j.name, j.completion_time) for j in ts.job_list]) for ts in batch.slice_list]
+            for batch in plan.plan]
 
 
 class MyTestCase(unittest.TestCase):
@@ -14,6 +56,7 @@ class MyTestCase(unittest.TestCase):
             print(training_data[i])
 
     def test_ga(self):
+        from experiment import cal_individual_plan
         job_names = ['alexnet', 'resnet50', 'resnext50', 'seresnet101', 'googlenet', 'vgg16', 'densenet201']
         max_gpu_num = 8
         training_data = get_training_data(job_names, max_gpu_num)
@@ -32,6 +75,7 @@ class MyTestCase(unittest.TestCase):
             print('=' * 100)
 
     def test_iter_ga(self):
+        from experiment import ga_execution
         job_names = ['alexnet', 'resnet50', 'resnext50', 'seresnet101', 'googlenet', 'vgg16', 'densenet201']
         max_gpu_num = 8
         training_data = get_training_data(job_names, max_gpu_num)
@@ -46,6 +90,7 @@ class MyTestCase(unittest.TestCase):
             print('=' * 100)
 
     def test_seq(self):
+        from experiment import sequential_execution
         job_names = ['alexnet', 'resnet50', 'resnext50', 'seresnet101', 'googlenet', 'vgg16', 'densenet201']
         max_gpu_num = 8
         training_data = get_training_data(job_names, max_gpu_num)
@@ -60,6 +105,7 @@ class MyTestCase(unittest.TestCase):
             print('=' * 100)
 
     def test_parallel(self):
+        from experiment import parallel_execution
         job_names = ['alexnet', 'resnet50', 'resnext50', 'seresnet101', 'googlenet', 'vgg16', 'densenet201']
         max_gpu_num = 4
         training_data = get_training_data(job_names, max_gpu_num)
@@ -74,6 +120,7 @@ class MyTestCase(unittest.TestCase):
             print('=' * 100)
 
     def test_optimus(self):
+        from experiment import optimus_execution
         job_names = ['alexnet', 'resnet50', 'resnext50', 'seresnet101', 'googlenet', 'vgg16', 'densenet201']
         max_gpu_num = 8
         training_data = get_training_data(job_names, max_gpu_num)
@@ -88,6 +135,8 @@ class MyTestCase(unittest.TestCase):
             print('=' * 100)
 
     def test_something(self):
+        from experiment import cal_individual_plan
+        from genetic_algorithm import init_individual
         job_names = ['alexnet', 'resnet50', 'resnext50', 'seresnet101', 'googlenet', 'vgg16', 'densenet201']
         max_gpu_num = 8
         data = get_training_data(job_names, max_gpu_num)
@@ -97,6 +146,999 @@ class MyTestCase(unittest.TestCase):
             cal_individual_plan(i, max_gpu_num, job_names, data, False)
             i.plan.print_plan()
 
+    def test_group_fitness(self):
+        from experiment import cal_individual_plan
+        from fitness import pack_training_data, cal_group_fitness
+        from genetic_algorithm import init_individual
+        for seed in range(50):
+            rd = random.Random(seed)
+            max_gpu_num = rd.choice([1, 2, 4, 8, 16])
+            job_names, data = make_training_data(rd.randint(1, 20), max_gpu_num, seed)
+            epoch_num, epoch_time = pack_training_data(job_names, max_gpu_num, data)
+            group = [init_individual(job_names) for _ in range(20)]
+            orders = [individual.orders for individual in group]
+            for used_slice in [False, True]:
+                total_time, utilization_rate = cal_group_fitness(orders, max_gpu_num, epoch_num, epoch_time,
+                                                                 used_slice)
+                for i, individual in enumerate(group):
+                    cal_individual_plan(individual, max_gpu_num, job_names, data, used_slice)
+                    individual.plan.cal_utilization_rate()
+                    self.assertEqual(individual.plan.total_time, total_time[i])
+                    self.assertEqual(individual.plan.utilization_rate, utilization_rate[i])
+
+    def test_fitness_cache(self):
+        from experiment import cal_individual_plan
+        from fitness import pack_training_data, evaluate_group, get_canonical_orders, FitnessCache
+        from genetic_algorithm import init_individual
+        key = FitnessCache.canonical_key([2, 2, 1], 8, True)
+        self.assertEqual(key, FitnessCache.canonical_key([5, 5, 3], 8, True))
+        self.assertNotEqual(key, FitnessCache.canonical_key([1, 1, 2], 8, True))
+        self.assertEqual(get_canonical_orders([5, 5, 3, 9]), (2, 2, 1, 3))
+        self.assertEqual(key, (get_canonical_orders([2, 2, 1]), 8, True))
+
+        cache = FitnessCache(2)
+        for i in range(3):
+            cache.put(i, float(i))
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(2), 2.0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        max_gpu_num = 8
+        job_names, data = make_training_data(10, max_gpu_num, 0)
+        epoch_num, epoch_time = pack_training_data(job_names, max_gpu_num, data)
+        group = [init_individual(job_names) for _ in range(20)]
+        group += [Individual([order + 10 for order in individual.orders]) for individual in group]
+        cache = FitnessCache(100)
+        evaluate_group(group, max_gpu_num, epoch_num, epoch_time, True, cache)
+        key_nums = len({FitnessCache.canonical_key(individual.orders, max_gpu_num, True) for individual in group})
+        self.assertEqual(cache.misses, key_nums)
+        self.assertEqual(cache.hits, len(group) - key_nums)
+        for individual in group:
+            cal_individual_plan(individual, max_gpu_num, job_names, data, True)
+            self.assertEqual(individual.plan.total_time, individual.total_time)
+
+    def test_evaluation_pool(self):
+        import numpy as np
+        from fitness import pack_training_data, cal_group_fitness, EvaluationPool
+        from genetic_algorithm import init_individual
+        max_gpu_num = 8
+        job_names, data = make_training_data(12, max_gpu_num, 1)
+        epoch_num, epoch_time = pack_training_data(job_names, max_gpu_num, data)
+        orders = [init_individual(job_names).orders for _ in range(30)]
+        for used_slice in [False, True]:
+            pool = EvaluationPool(3, max_gpu_num, epoch_num, epoch_time, used_slice)
+            total_time, _ = cal_group_fitness(orders, max_gpu_num, epoch_num, epoch_time, used_slice)
+            self.assertEqual(pool.cal_total_time(np.array(orders)).tolist(), total_time.tolist())
+            pool.shutdown()
+
+    def test_migration(self):
+        from genetic_algorithm import migration
+        islands = [[Individual([k, i], total_time=k * 10 + i) for i in range(4)] for k in range(3)]
+        migration(islands, 'ring', 2)
+        self.assertEqual([i.total_time for i in islands[0]], [0, 1, 20, 21])
+        self.assertEqual([i.total_time for i in islands[1]], [0, 1, 10, 11])
+
+        islands = [[Individual([k, i], total_time=k * 10 + i) for i in range(4)] for k in range(3)]
+        migration(islands, 'all', 1)
+        self.assertEqual([i.total_time for i in islands[2]], [0, 10, 20, 21])
+
+    def test_island_ga(self):
+        from experiment import ga_execution
+        max_gpu_num = 8
+        job_names, data = make_training_data(10, max_gpu_num, 2)
+        outputs = []
+        for _ in range(2):
+            random.seed(0)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                ga_execution(job_names, max_gpu_num, data, make_args(islands=3, migration_topology='all'), True)
+            outputs.append(output.getvalue().split('迭代次数')[0])
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_termination(self):
+        from experiment import ga_execution
+        from genetic_algorithm import Termination
+        termination = Termination(3, 1, 0, 10)
+        termination.update(100, 0, 50)
+        for best_time in [99.5, 99, 98.5]:
+            self.assertFalse(termination.is_finished())
+            termination.update(best_time, 1, 50)
+        self.assertTrue(termination.is_finished())
+        self.assertEqual((termination.generations, termination.evaluations), (3, 200))
+
+        termination = Termination(0, 0, 0, 10)
+        termination.update(9)
+        self.assertTrue(termination.is_finished())
+
+        termination = Termination(0, 0, 1, 0)
+        time.sleep(0.01)
+        self.assertTrue(termination.is_finished())
+
+        max_gpu_num = 8
+        job_names, data = make_training_data(10, max_gpu_num, 2)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ga_execution(job_names, max_gpu_num, data, make_args(iteration_times=100000, time_budget_ms=200), False)
+        self.assertIn('迭代次数', output.getvalue())
+
+    def test_incremental_plan(self):
+        from experiment import cal_individual_plan
+        from genetic_algorithm import init_individual
+        max_gpu_num = 8
+        job_names, data = make_training_data(15, max_gpu_num, 3)
+        for _ in range(20):
+            individual = init_individual(job_names)
+            cal_individual_plan(individual, max_gpu_num, job_names, data, True)
+            plan = individual.plan
+            slice_lists = [list(batch.slice_list) for batch in plan.plan]
+            for batch in plan.plan:
+                for ts in batch.slice_list:
+                    actual_length = ts.actual_length
+                    ts.cal_actual_length()
+                    self.assertEqual(actual_length, ts.actual_length)
+            remain_lengths = [[ts.remain_length for ts in batch.slice_list] for batch in plan.plan]
+            reverse_slice_lists = [batch.get_reverse_slice_list() for batch in plan.plan]
+            total_time = plan.total_time
+            plan.arrange_plan()
+            self.assertEqual(total_time, plan.total_time)
+            self.assertEqual(slice_lists, [batch.slice_list for batch in plan.plan])
+            self.assertEqual(remain_lengths, [[ts.remain_length for ts in batch.slice_list] for batch in plan.plan])
+            self.assertEqual(reverse_slice_lists, [sorted(batch.slice_list, key=lambda s: s.actual_length, reverse=True)
+                                                   for batch in plan.plan])
+
+        # 重新插入长度变化的时间片时, 长度相同的按修改前的先后排在未修改的时间片之前。
+        batch = Batch([TimeSlice([Job(name, 1, 1, 1, length, length)], 1) for name, length in
+                       [('a', 1.0), ('b', 2.0), ('c', 3.0), ('d', 3.0)]])
+        batch.arrange_batch()
+        for ts in batch.slice_list[:2]:
+            ts.add_job(Job('e', 1, 1, 1, 3.0 - ts.actual_length, 3.0 - ts.actual_length))
+        batch.update_slices(batch.slice_list[:2])
+        self.assertEqual([ts.job_list[0].name for ts in batch.slice_list], ['a', 'b', 'c', 'd'])
+        self.assertEqual((batch.max_slice_length, [ts.remain_length for ts in batch.slice_list]), (3.0, [0.0] * 4))
+        reverse_slice_list = batch.get_reverse_slice_list()
+        for ts, completion_time in zip(reverse_slice_list, [2.0, 1.0, 1.5]):
+            job = ts.pop_job()
+            ts.add_job(Job(job.name, 1, 1, 1, completion_time, completion_time))
+        batch.update_slices(reverse_slice_list[:3])
+        self.assertEqual(batch.slice_list, sorted(reverse_slice_list, key=lambda s: s.actual_length))
+        self.assertEqual([ts.job_list[0].name for ts in batch.slice_list], ['c', 'a', 'b', 'd'])
+        self.assertEqual(batch.max_slice_length, 3.0)
+        self.assertEqual([ts.remain_length for ts in batch.slice_list], [1.5, 0.0, 0.0, 0.0])
+
+        # 没有传入实际时间时按作业列表计算, 传入时保留传入的值。
+        self.assertEqual(TimeSlice([Job('a', 1, 1, 2, 5.0, 10.0)], 1).actual_length, 10.0)
+        self.assertEqual(TimeSlice([Job('a', 1, 1, 2, 5.0, 10.0)], 1, 20.0).actual_length, 20.0)
+
+    def test_training_data_snapshot(self):
+        rows = [('alexnet', 1, 90, 25.245), ('alexnet', 2, 90, 16.03),
+                ('alexnet', 1, 90, 1.0), ('vgg16', 1, 90, 15.391)]
+        data = build_training_data(rows, ['alexnet'], 2)
+        self.assertEqual(data, {'alexnet': {1: TrainingData(90, 25.245), 2: TrainingData(90, 16.03)}})
+        with self.assertRaisesRegex(ValueError, r'vgg16\(gpu_num=2\)'):
+            build_training_data(rows, ['alexnet', 'vgg16'], 2)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = get_snapshot_path(cache_dir, ['alexnet'], 2)
+            self.assertEqual(path, get_snapshot_path(cache_dir, ['alexnet', 'alexnet'], 2))
+            self.assertNotEqual(path, get_snapshot_path(cache_dir, ['alexnet'], 4))
+            save_snapshot(path, (4, 4), data)
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(load_snapshot(path), ((4, 4), data))
+
+    def test_data_source(self):
+        fixture_path = './training_time_data/training_times.csv'
+        job_names = []
+        for category in ['image', 'action']:
+            with open(f'./job_name_data/{category}.txt', 'r') as f:
+                job_names += [job_name.strip() for job_name in f]
+        data = get_training_data(job_names, 8, source_type='csv', source_path=fixture_path)
+        self.assertEqual(data['alexnet'][1], TrainingData(90, 25.245))
+        self.assertEqual(data['i3d'][8], TrainingData(90, 35.078))
+
+        with open(fixture_path, 'r', encoding='utf-8', newline='') as f:
+            records = list(csv.DictReader(f))
+        with tempfile.TemporaryDirectory() as source_dir:
+            json_path = os.path.join(source_dir, 'training_times.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f)
+            self.assertEqual(JSONSource(json_path).get_training_data(job_names, 8), data)
+
+            sqlite_path = os.path.join(source_dir, 'training_times.db')
+            conn = sqlite3.connect(sqlite_path)
+            with open('./sql/database_sqlite.sql', 'r', encoding='utf-8') as f:
+                conn.executescript(f.read())
+            conn.executemany('INSERT INTO training_times '
+                             '(job_name, dataset, batch_size, epoch_num, gpu_num, epoch_time) '
+                             'VALUES (:job_name, :dataset, :batch_size, :epoch_num, :gpu_num, :epoch_time)',
+                             records)
+            conn.commit()
+            conn.close()
+            self.assertEqual(SQLiteSource(sqlite_path).get_training_data(job_names, 8), data)
+
+        with self.assertRaises(ValueError):
+            CSVSource(fixture_path).get_training_data(['alexnet'], 16)
+
+    def test_benchmark(self):
+        import benchmark
+        args = benchmark.parser.parse_args(['--jobs', '5', '--gpus', '8', '-r', '1', '-i', '5', '-n', '10'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchmark.benchmark(args)
+        self.assertEqual([r['scheduler'] for r in results], benchmark.SCHEDULERS)
+        self.assertEqual(benchmark.check_regression(results, results, args), [])
+        # 精确求解是不利用时间片的染色体空间内的最优划分, 同一空间内的遗传算法不会更短。
+        gaps = {r['scheduler']: r['exact_gap'] for r in results if 'exact_gap' in r}
+        self.assertEqual(list(gaps), benchmark.SCHEDULERS)
+        self.assertEqual(gaps['exact'], 0)
+        self.assertGreaterEqual(gaps['ga'], -1e-9)
+        self.assertGreaterEqual(gaps['sequential'], -1e-9)
+
+        # 精确求解在最后运行时, 之前的调度算法也与同一负载的精确求解比较。
+        reversed_args = benchmark.parser.parse_args(['--jobs', '5', '--gpus', '8', '-r', '1', '-i', '5', '-n', '10',
+                                                     '--seeds', '0', '1', '--schedulers', 'sequential', 'exact'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            reversed_results = benchmark.benchmark(reversed_args)
+        for seed in [0, 1]:
+            group = {r['scheduler']: r for r in reversed_results if r['seed'] == seed}
+            self.assertEqual(group['sequential']['exact_gap'],
+                             group['sequential']['total_time'] / group['exact']['total_time'] - 1)
+
+        baseline_results = [dict(r, total_time=r['total_time'] * 0.9) for r in results]
+        self.assertEqual(len(benchmark.check_regression(results, baseline_results, args)), len(results))
+
+    def test_draw_experience(self):
+        import numpy as np
+        results = [{'scheduler': scheduler, 'category': 'image', 'gpu_num': gpu_num, 'seed': seed,
+                    'total_time': gpu_num * (seed + 1) * (2 if scheduler == 'ga' else 1)}
+                   for seed in range(2) for gpu_num in [32, 16] for scheduler in ['ga_slice', 'ga']]
+        results.append({'scheduler': 'exact', 'category': 'image', 'gpu_num': 16, 'seed': 0, 'total_time': 16})
+        with tempfile.TemporaryDirectory() as result_dir:
+            result_path = os.path.join(result_dir, 'results.json')
+            with open(result_path, 'w', encoding='utf-8') as f:
+                json.dump({'results': results}, f)
+            x_data, data_dict = draw_experience.load_experience_data(result_path, 'image', 'total_time')
+        self.assertEqual(x_data, [2, 4])
+        self.assertEqual(data_dict['ga_slice'], [24, 48])
+        self.assertEqual(data_dict['ga'], [48, 96])
+        self.assertEqual(data_dict['exact'][0], 16)
+        self.assertTrue(np.isnan(data_dict['exact'][1]))
+        self.assertEqual(draw_experience.get_base_name(data_dict), 'ga_slice')
+        self.assertEqual(draw_experience.get_ratio_dict(data_dict, 'ga_slice')['ga'], [2, 2])
+
+        _, paper_dict = draw_experience.load_experience_data('./benchmark_data/paper_results.json', 'image', 'total_time')
+        self.assertEqual(draw_experience.get_base_name(paper_dict), 'OMRU')
+        with self.assertRaises(ValueError):
+            draw_experience.get_base_name({'sequential': [1]})
+
+    def test_workload(self):
+        job_names, data = generate_training_data(20, 64, 0)
+        self.assertEqual((job_names, data), generate_training_data(20, 64, 0))
+        self.assertNotEqual(data, generate_training_data(20, 64, 1)[1])
+        self.assertEqual(sorted(data['job0']), list(range(1, 65)))
+
+        for model in ['amdahl', 'power']:
+            for profile in generate_profiles(10, 0, model, 'pareto'):
+                epoch_times = [profile.get_epoch_time(g) for g in range(1, 65)]
+                self.assertEqual(epoch_times, sorted(epoch_times, reverse=True))
+        for profile in generate_profiles(10, 0, 'communication', 'uniform'):
+            epoch_times = [profile.get_epoch_time(g) for g in range(1, 65)]
+            self.assertLess(min(epoch_times), epoch_times[-1])
+
+        profiles = generate_profiles(5, 0)
+        with tempfile.TemporaryDirectory() as source_dir:
+            for source in [CSVSource(os.path.join(source_dir, 'training_times.csv')),
+                           JSONSource(os.path.join(source_dir, 'training_times.json')),
+                           SQLiteSource(os.path.join(source_dir, 'training_times.db'))]:
+                source.write_rows(generate_rows(profiles, 16))
+                self.assertEqual(source.get_training_data(job_names[:5], 16), generate_training_data(5, 16, 0)[1])
+
+    def test_heap_allocation(self):
+        import benchmark
+        from benchmark import linear_maximum_allocation, linear_sorting_allocation, linear_optimus_allocation, \
+            run_allocation
+        from experiment import optimus_execution, get_job_list, get_plan, maximum_allocation, sorting_allocation, \
+            get_optimus_plan
+        def run(allocation, job_names, max_gpu_num, data) -> list:
+            return describe_plan(run_allocation(allocation, job_names, max_gpu_num, data))
+
+        pairs = [(maximum_allocation, linear_maximum_allocation),
+                 (sorting_allocation, linear_sorting_allocation)]
+        # 训练时间经过取整, 会出现大量完成时间相同的作业, 用来检验平局时的选择。
+        for seed in range(50):
+            rd = random.Random(seed)
+            max_gpu_num, job_nums = rd.choice([2, 4, 8, 16]), rd.randint(1, 40)
+            job_names, data = make_training_data(job_nums, max_gpu_num + 1, seed)
+            if max_gpu_num >= job_nums:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    plan = optimus_execution(job_names, max_gpu_num, data)
+                self.assertEqual(describe_plan(plan), run(linear_optimus_allocation, job_names, max_gpu_num, data))
+            for allocation, linear_allocation in pairs:
+                if (allocation is sorting_allocation) == (max_gpu_num <= job_nums):
+                    self.assertEqual(run(allocation, job_names, max_gpu_num, data),
+                                     run(linear_allocation, job_names, max_gpu_num, data))
+
+        # 作业数等于GPU数目时没有剩余GPU可分配, 不需要更多GPU数目的训练数据。
+        for job_names in [['a'], ['a', 'b']]:
+            data = {job_name: {1: TrainingData(10, 5.0 * k)} for k, job_name in enumerate(job_names, 1)}
+            plan = get_optimus_plan(job_names, len(job_names), data)
+            self.assertEqual(describe_plan(plan), describe_plan(get_plan([get_job_list(
+                job_names, [1] * len(job_names), [1] * len(job_names), data)], len(job_names))))
+            self.assertEqual(plan.total_time, 50.0 * len(job_names))
+
+        # 大规模负载下结果同样一致, 耗时比较见benchmark.py --allocation。
+        job_names, data = generate_training_data(300, 1025, 0)
+        sorting_job_names, sorting_data = generate_training_data(3000, 1, 0)
+        for allocation, linear_allocation, job_names, max_gpu_num, data in [
+                (get_optimus_plan, linear_optimus_allocation, job_names, 1024, data),
+                (maximum_allocation, linear_maximum_allocation, job_names, 1024, data),
+                (sorting_allocation, linear_sorting_allocation, sorting_job_names, 256, sorting_data)]:
+            self.assertEqual(run(allocation, job_names, max_gpu_num, data),
+                             run(linear_allocation, job_names, max_gpu_num, data))
+
+        args = benchmark.parser.parse_args(['--allocation', '-r', '1'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchmark.allocation_benchmark(args)
+        self.assertEqual([r['allocation'] for r in results], ['optimus', 'maximum', 'sorting'])
+        self.assertTrue(all(r['heap_total_time'] == r['linear_total_time'] for r in results))
+        slow_results = [dict(r, heap_time=r['linear_time'] * 2) for r in results]
+        self.assertEqual(len(benchmark.check_allocation(slow_results)), len(results))
+
+    def test_compact_entity(self):
+        from experiment import cal_individual_plan
+        from genetic_algorithm import init_individual, selection
+        job_names, data = make_training_data(10, 8, 0)
+        individual = init_individual(job_names)
+        cal_individual_plan(individual, 8, job_names, data, True)
+        for entity in [individual, individual.plan, individual.plan.plan[0],
+                       individual.plan.plan[0].slice_list[0], individual.plan.plan[0].slice_list[0].job_list[0],
+                       data[job_names[0]][1]]:
+            self.assertFalse(hasattr(entity, '__dict__'))
+
+        # 复制的个体只携带染色体和适应度, 且修改染色体不影响原个体。
+        for copied in selection([individual]) + [individual.copy()]:
+            self.assertIsNone(copied.plan)
+            self.assertEqual((copied.orders, copied.total_time), (individual.orders, individual.total_time))
+            copied.orders[0] += 1
+            self.assertNotEqual(copied.orders, individual.orders)
+
+    def test_online(self):
+        import benchmark
+        from experiment import sequential_execution, optimus_execution
+        from online import OnlineScheduler, OptimusPolicy, PlanPolicy, get_plan_orders, online_execution
+        # 所有作业同时到达且GPU充足时, 第一次分配与离线的Optimus调度一致。
+        job_names, data = generate_training_data(20, 64, 0, 'power')
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = optimus_execution(job_names, 64, data)
+        scheduler = OnlineScheduler(64, data, OptimusPolicy())
+        for job_name in job_names:
+            scheduler.submit(job_name, 0)
+        scheduler.step()
+        self.assertEqual(sorted((r.job.name, r.job.gpu_num, r.finish_time) for r in scheduler.records),
+                         sorted((ts.job_list[0].name, ts.gpu_num, ts.actual_length) for ts in plan.plan[0].slice_list))
+
+        job_names, data = generate_training_data(50, 64, 0)
+        arrivals = generate_arrivals(job_names, 5000, 0.02, 0)
+        self.assertEqual(arrivals, generate_arrivals(job_names, 5000, 0.02, 0))
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = sequential_execution(job_names, 64, data)
+        self.assertEqual(sorted(get_plan_orders(plan).values()), list(range(1, 51)))
+        for policy in [OptimusPolicy(), PlanPolicy(plan)]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                scheduler = online_execution(arrivals, 64, data, policy)
+            # 每次到达和完成各一个事件, 全部完成后GPU全部释放; 吞吐量见benchmark.py --online。
+            self.assertEqual(scheduler.event_nums, 10000)
+            self.assertEqual(len(scheduler.records), 5000)
+            self.assertEqual(scheduler.free_gpu_num, 64)
+            self.assertLessEqual(scheduler.get_utilization_rate(), 100 + 1e-9)
+            for record in scheduler.records:
+                self.assertLessEqual(record.arrival_time, record.start_time)
+                self.assertLess(record.start_time, record.finish_time)
+                self.assertAlmostEqual(record.job.epoch_num, 0, delta=1e-6)
+
+        args = benchmark.parser.parse_args(['--online', '-r', '1'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchmark.online_benchmark(args)
+        self.assertEqual([(r['policy'], r['event_nums']) for r in results], [('optimus', 10000), ('plan', 10000)])
+        self.assertEqual(len(benchmark.check_online([dict(r, event_rate=1) for r in results], args)), len(results))
+
+    def test_topology(self):
+        from experiment import parallel_execution, optimus_execution
+        cluster = Cluster(4, 8, 1, 0.5)
+        self.assertEqual([cluster.get_node_span(g) for g in [1, 8, 9, 16, 17]], [1, 1, 2, 2, 3])
+        job_names, data = generate_training_data(6, 32, 0, 'power')
+        adjusted_data = cluster.adjust_training_data(data)
+        self.assertEqual(adjusted_data[job_names[0]][8], data[job_names[0]][8])
+        self.assertEqual(adjusted_data[job_names[0]][9].epoch_time, data[job_names[0]][9].epoch_time / 0.5)
+
+        # 单节点集群与原来的扁平模型结果一致。
+        with contextlib.redirect_stdout(io.StringIO()):
+            flat_plan = optimus_execution(job_names, 32, data)
+            node_plan = optimus_execution(job_names, 32, Cluster(1, 32).adjust_training_data(data), Cluster(1, 32))
+        self.assertEqual(describe_plan(node_plan), describe_plan(flat_plan))
+
+        # 6+6+5+5+5+5个GPU放在4个8卡节点上, 最后两个5卡时间片只能跨节点, 迭代时间按跨节点速度修正。
+        slice_list = [TimeSlice([Job(job_name, 1, g, 10, adjusted_data[job_name][g].epoch_time,
+                                     10 * adjusted_data[job_name][g].epoch_time)], g)
+                      for job_name, g in zip(job_names, [6, 6, 5, 5, 5, 5])]
+        plan = Plan([Batch(slice_list)], 32)
+        plan.arrange_plan()
+        place_plan(plan, cluster, adjusted_data)
+        spans = {ts.job_list[0].name: get_slice_node_span(ts, cluster) for ts in plan.plan[0].slice_list}
+        self.assertEqual([spans[job_name] for job_name in job_names[:2]], [1, 1])
+        self.assertEqual(sorted(spans.values()), [1, 1, 1, 1, 2, 2])
+        self.assertEqual(sorted(i for ts in plan.plan[0].slice_list for i in ts.gpu_ids), list(range(32)))
+        for ts in plan.plan[0].slice_list:
+            job = ts.job_list[0]
+            ratio = 2 if spans[job.name] == 2 else 1
+            self.assertEqual(job.epoch_time, adjusted_data[job.name][ts.gpu_num].epoch_time * ratio)
+        self.assertEqual(plan.total_time, max(ts.actual_length for ts in plan.plan[0].slice_list))
+        self.assertEqual(sum(len(gpu_ids) for node_jobs in get_node_placement(plan.plan[0], cluster).values()
+                             for _, gpu_ids in node_jobs), 32)
+
+        # 碎片化时剩余的GPU多于每个节点的GPU数目, 逐个节点占用, 不会超出节点的空闲GPU。
+        for node_num, gpus_per_node, gpu_nums in [(5, 4, [7, 7, 6]), (6, 3, [8, 5, 5])]:
+            pool = NodePool(Cluster(node_num, gpus_per_node))
+            gpu_ids = []
+            for gpu_num in gpu_nums:
+                slice_gpu_ids = pool.allocate(gpu_num)
+                self.assertEqual(len(slice_gpu_ids), gpu_num)
+                self.assertTrue(all(count >= 0 for count in pool.counts))
+                gpu_ids += slice_gpu_ids
+            self.assertEqual(len(gpu_ids), sum(gpu_nums))
+            self.assertEqual(sorted(set(gpu_ids)), sorted(gpu_ids))
+            self.assertTrue(all(0 <= gpu_id < node_num * gpus_per_node for gpu_id in gpu_ids))
+
+        cluster = Cluster(200, 8, 1, 0.7)
+        job_names, data = generate_training_data(300, 1600, 0)
+        data = cluster.adjust_training_data(data)
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = parallel_execution(job_names, 1600, data, cluster)
+        gpu_ids = [i for ts in plan.plan[0].slice_list for i in ts.gpu_ids]
+        self.assertEqual(len(gpu_ids), len(set(gpu_ids)))
+        self.assertEqual(len(gpu_ids), 1600)
+
+    def test_instrumentation(self):
+        from experiment import ga_execution
+        from instrumentation import JsonLinesWriter, run_profiled, get_diversity
+        job_names, data = make_training_data(10, 8, 0)
+        for islands in [1, 2]:
+            args = make_args(iteration_times=20, islands=islands, migration_interval=5)
+            stats_list = []
+            outputs = []
+            for callbacks in [None, [stats_list.append]]:
+                random.seed(0)
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    plan = ga_execution(job_names, 8, data, args, False, None, callbacks)
+                outputs.append(output.getvalue().split('迭代次数')[0])
+            # 统计信息不影响随机数流, 调度结果与不统计时一致。
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(len(stats_list), 21 if islands == 1 else 4)
+            self.assertEqual(stats_list[-1]['best_time'], plan.total_time)
+            for stats in stats_list:
+                self.assertLessEqual(stats['best_time'], stats['mean_time'])
+                self.assertLessEqual(stats['mean_time'], stats['worst_time'])
+                self.assertFalse(stats['used_slice'])
+                self.assertGreaterEqual(stats['evaluation_ms'], 0)
+            self.assertEqual(stats_list[-1]['total_evaluations'], sum(s['evaluations'] for s in stats_list))
+            self.assertGreater(sum(s['selection_ms'] for s in stats_list), 0)
+
+        group = [Individual([1, 1, 2]), Individual([2, 2, 3]), Individual([2, 1, 1])]
+        for individual, total_time in zip(group, [1, 2, 3]):
+            individual.total_time = total_time
+        self.assertEqual(get_diversity(group), (2 / 3, 2 / 9))
+
+        with tempfile.TemporaryDirectory() as stats_dir:
+            writer = JsonLinesWriter(os.path.join(stats_dir, 'stats.jsonl'))
+            for stats in stats_list:
+                writer(stats)
+            writer.close()
+            with open(os.path.join(stats_dir, 'stats.jsonl'), 'r', encoding='utf-8') as f:
+                self.assertEqual([json.loads(line) for line in f], stats_list)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(run_profiled(sorted, 5, [3, 1, 2]), [1, 2, 3])
+        self.assertIn('function calls', output.getvalue())
+
+    def test_serialization(self):
+        from experiment import cal_individual_plan
+        job_names, data = make_training_data(12, 4, 0)
+        individual = Individual([1, 1, 2, 2, 2, 3, 3, 3, 3, 3, 4, 4])
+        cal_individual_plan(individual, 4, job_names, data, True)
+        plan = individual.plan
+        records = list(iter_plan_records(plan))
+        for job_name in job_names:
+            self.assertEqual(sum(r['epoch_num'] for r in records if r['job_name'] == job_name),
+                             data[job_name][1].epoch_num)
+        self.assertAlmostEqual(max(r['end_time'] for r in records), plan.total_time)
+        batch_start_time = 0
+        for batch_index, batch in enumerate(plan.plan):
+            slice_records = [[r for r in records if (r['batch'], r['slice']) == (batch_index, slice_index)]
+                             for slice_index in range(len(batch.slice_list))]
+            self.assertEqual([r[0]['start_time'] for r in slice_records], [batch_start_time] * len(slice_records))
+            self.assertEqual([r[0]['gpu_num'] for r in slice_records], [ts.gpu_num for ts in batch.slice_list])
+            batch_start_time += batch.max_slice_length
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            for output_format in ['json', 'csv']:
+                path = os.path.join(output_dir, f'plan.{output_format}')
+                writer = PlanWriter(path, output_format)
+                writer.write('ga_slice', plan)
+                writer.write('copy', plan)
+                writer.close()
+                with open(path, 'r', encoding='utf-8', newline='') as f:
+                    if output_format == 'json':
+                        plans = json.load(f)
+                        self.assertEqual([p['scheduler'] for p in plans], ['ga_slice', 'copy'])
+                        self.assertEqual(plans[0]['makespan'], plan.total_time)
+                        self.assertEqual(plans[0]['utilization_rate'], plan.utilization_rate)
+                        self.assertEqual(plans[1]['jobs'], records)
+                    else:
+                        rows = list(csv.DictReader(f))
+                        self.assertEqual(len(rows), 2 * len(records))
+                        self.assertEqual([(r['job_name'], float(r['end_time'])) for r in rows[:len(records)]],
+                                         [(r['job_name'], r['end_time']) for r in records])
+                        self.assertEqual(float(rows[0]['makespan']), plan.total_time)
+
+    def test_seeded_random(self):
+        from experiment import ga_execution
+        from genetic_algorithm import cross_over, draw_integers, draw_permutation, draw_random, get_random, \
+            init_individual, mutation_process, selection
+        job_names, data = make_training_data(10, 8, 0)
+        for rng in ['python', 'numpy']:
+            for islands in [1, 2]:
+                args = make_args(iteration_times=20, islands=islands, migration_interval=5, seed=5, rng=rng)
+                outputs = []
+                for _ in range(2):
+                    random_state = random.getstate()
+                    output = io.StringIO()
+                    with contextlib.redirect_stdout(output):
+                        ga_execution(job_names, 8, data, args, True)
+                    outputs.append(output.getvalue().split('迭代次数')[0])
+                    # 指定种子时不使用也不改变全局的随机数流。
+                    self.assertEqual(random.getstate(), random_state)
+                self.assertEqual(outputs[0], outputs[1])
+
+        for rd in [get_random(0), get_random(0, 'numpy')]:
+            group = [init_individual(job_names, rd) for _ in range(20)]
+            for individual in group:
+                self.assertTrue(all(1 <= order <= 10 for order in individual.orders))
+                individual.total_time = rd.random() + 1
+            after_group = selection(group, rd)
+            cross_over(after_group, job_names, rd)
+            before_orders = [individual.orders[:] for individual in after_group]
+            mutation_process(after_group, list(range(1, 11)), rd)
+            for orders, individual in zip(before_orders, after_group):
+                changed = [k for k in range(10) if orders[k] != individual.orders[k]]
+                self.assertEqual(len(changed), 1)
+                self.assertTrue(1 <= individual.orders[changed[0]] <= 10)
+            self.assertEqual(len(draw_random(rd, 7)), 7)
+            self.assertEqual(sorted(draw_permutation(rd, 7)), list(range(7)))
+            self.assertTrue(all(1 <= x < 4 for x in draw_integers(rd, 1, 4, 50)))
+
+        # 使用相同种子的random.Random与全局random模块得到相同的种群。
+        random.seed(3)
+        global_orders = [init_individual(job_names).orders for _ in range(5)]
+        rd = get_random(3)
+        self.assertEqual([init_individual(job_names, rd).orders for _ in range(5)], global_orders)
+
+    def test_matrix_operators(self):
+        import numpy as np
+        from experiment import ga_execution
+        from fitness import pack_training_data, evaluate_group, evaluate_orders, canonical_orders, \
+            get_canonical_orders, FitnessCache
+        from genetic_algorithm import cross_over, get_random, matrix_cross_over, matrix_mutation, \
+            matrix_preferential_admission, matrix_selection, selection
+        job_names, data = make_training_data(10, 8, 0)
+        epoch_num, epoch_time = pack_training_data(job_names, 8, data)
+        rd = get_random(1, 'numpy')
+        orders = rd.integers(1, 11, (20, 10))
+        group = [Individual(row) for row in orders.tolist()]
+
+        # 矩阵评估与列表评估的完成时间、缓存键一致, 重新编号后相同的染色体只评估一次。
+        orders[0] = (orders[0] + 1) // 2
+        orders[1] = orders[0] * 2
+        group[0].orders = orders[0].tolist()
+        group[1].orders = orders[1].tolist()
+        self.assertEqual(canonical_orders(orders).tolist(),
+                         [list(get_canonical_orders(row)) for row in orders.tolist()])
+        list_cache, matrix_cache = FitnessCache(100), FitnessCache(100)
+        evaluate_group(group, 8, epoch_num, epoch_time, True, list_cache)
+        total_time, evaluations = evaluate_orders(orders, 8, epoch_num, epoch_time, True, matrix_cache)
+        self.assertEqual(total_time.tolist(), [individual.total_time for individual in group])
+        self.assertEqual(evaluations, 19)
+        self.assertEqual((matrix_cache.hits, matrix_cache.misses), (list_cache.hits, list_cache.misses))
+        self.assertEqual(evaluate_orders(orders, 8, epoch_num, epoch_time, True, matrix_cache)[1], 0)
+
+        # 相同的随机数流下, 矩阵选择和交叉与列表实现的结果相同。
+        list_rd, matrix_rd = get_random(2, 'numpy'), get_random(2, 'numpy')
+        after_group = selection(group, list_rd)
+        cross_over(after_group, job_names, list_rd)
+        after_orders = matrix_selection(orders, total_time, matrix_rd)
+        matrix_cross_over(after_orders, matrix_rd)
+        self.assertEqual(after_orders.tolist(), [individual.orders for individual in after_group])
+
+        before_orders = after_orders.copy()
+        matrix_mutation(after_orders, matrix_rd)
+        self.assertTrue(np.all((before_orders != after_orders).sum(axis=1) == 1))
+        self.assertTrue(np.all((after_orders >= 1) & (after_orders <= 10)))
+
+        after_time = evaluate_orders(after_orders, 8, epoch_num, epoch_time, True)[0]
+        new_orders, new_time = matrix_preferential_admission(orders, total_time, after_orders, after_time)
+        self.assertEqual(new_time.tolist(), sorted(total_time.tolist() + after_time.tolist())[:20])
+        self.assertEqual(len(new_orders), 20)
+
+        args = make_args(iteration_times=30, seed=4, operators='matrix')
+        outputs = []
+        for _ in range(2):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                plan = ga_execution(job_names, 8, data, args, True)
+            outputs.append(output.getvalue().split('迭代次数')[0])
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual({job.name for batch in plan.plan for ts in batch.slice_list for job in ts.job_list},
+                         set(job_names))
+
+    def test_warm_start(self):
+        from experiment import ga_execution, get_heuristic_orders, get_sequential_plan, get_parallel_plan
+        from archive import ScheduleArchive, translate_orders
+        from online import get_plan_orders
+        job_names, data = make_training_data(10, 8, 0)
+        seeds = get_heuristic_orders(job_names, 8, data)
+        self.assertEqual(seeds[0], list(range(1, 11)))
+        self.assertEqual(get_plan_orders(get_sequential_plan(job_names, 8, data)),
+                         dict(zip(job_names, range(1, 11))))
+        self.assertEqual(set(get_plan_orders(get_parallel_plan(job_names, 4, data)).values()), {1})
+
+        # 新增的作业放在最后, 删除作业后重新编号, 编号始终在1~作业数之间。
+        self.assertEqual(translate_orders({'a': 3, 'b': 7, 'c': 3}, ['c', 'd', 'b']), [1, 3, 2])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'archive', 'schedule_archive.json')
+            archive = ScheduleArchive(path, capacity=2)
+            self.assertEqual(archive.lookup(job_names, 8, True), [])
+            group = [Individual([1] * 10, total_time=3), Individual([2] * 10, total_time=1),
+                     Individual(list(range(1, 11)), total_time=2)]
+            archive.update(job_names, 8, True, group)
+            archive = ScheduleArchive(path, capacity=2)
+            self.assertEqual(archive.lookup(job_names, 8, True), [[1] * 10, list(range(1, 11))])
+            self.assertEqual(archive.lookup(job_names, 8, False), [])
+            self.assertEqual(archive.lookup(job_names[:7] + ['new'], 8, True)[1], list(range(1, 9)))
+            self.assertEqual(archive.lookup(job_names[:4] + ['x', 'y', 'z', 'w'], 8, True), [])
+
+            # 第二次运行从归档的最优染色体开始, 初始种群的最优完成时间不差于上一次的结果。
+            args = make_args(iteration_times=30, seed=2, archive=path, warm_start=True)
+            best_times = []
+            for _ in range(2):
+                stats = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    plan = ga_execution(job_names, 8, data, args, False, callbacks=[stats.append])
+                best_times.append((stats[0]['best_time'], plan.total_time))
+            self.assertLessEqual(best_times[1][0], best_times[0][1])
+            for operators, islands in [('matrix', 1), ('list', 2)]:
+                stats = []
+                args = make_args(iteration_times=0, seed=2, archive=path, operators=operators, islands=islands)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ga_execution(job_names, 8, data, args, False, callbacks=[stats.append])
+                self.assertLessEqual(stats[0]['best_time'], best_times[1][1])
+
+    def test_exact(self):
+        import numpy as np
+        from experiment import cal_individual_plan, ga_execution
+        from fitness import pack_training_data, cal_group_fitness
+        from exact import ExactSolver, exact_execution
+        for job_nums, max_gpu_num, seed in [(5, 8, 0), (6, 3, 1), (6, 2, 2)]:
+            job_names, data = generate_training_data(job_nums, max_gpu_num, seed)
+            epoch_num, epoch_time = pack_training_data(job_names, max_gpu_num, data)
+            # 与枚举所有染色体得到的最优值一致。
+            all_orders = np.array(list(itertools.product(range(1, job_nums + 1), repeat=job_nums)))
+            optimal_time = cal_group_fitness(all_orders, max_gpu_num, epoch_num, epoch_time, False)[0].min()
+            solver = ExactSolver(job_names, max_gpu_num, data)
+            orders = solver.solve()
+            self.assertAlmostEqual(solver.total_time, optimal_time)
+            self.assertLessEqual(solver.lower_bound[-1], optimal_time)
+            with contextlib.redirect_stdout(io.StringIO()):
+                plan = exact_execution(job_names, max_gpu_num, data)
+            self.assertAlmostEqual(plan.total_time, optimal_time)
+            individual = Individual(orders)
+            cal_individual_plan(individual, max_gpu_num, job_names, data, False)
+            self.assertAlmostEqual(individual.total_time, optimal_time)
+
+            # 上界不大于最优值时所有状态都被剪枝。
+            solver = ExactSolver(job_names, max_gpu_num, data)
+            self.assertEqual(solver.solve(optimal_time), [])
+
+        job_names, data = generate_training_data(12, 8, 0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = exact_execution(job_names, 8, data)
+            ga_plan = ga_execution(job_names, 8, data, make_args(iteration_times=50, seed=0), False)
+        self.assertLessEqual(plan.total_time, ga_plan.total_time + 1e-6)
+
+    def test_speedup_model(self):
+        import numpy as np
+        from experiment import optimus_execution
+        from speedup import fit_training_data, fit_speedup_exponent
+        fixture_path = './training_time_data/training_times.csv'
+        with open('./job_name_data/image.txt', 'r') as f:
+            job_names = [job_name.strip() for job_name in f]
+        data = get_training_data(job_names, 8, source_type='csv', source_path=fixture_path)
+        self.assertEqual(get_training_data(job_names, 8, source_type='csv', source_path=fixture_path,
+                                           interpolate=True), data)
+
+        # 只保留1/2/4/8个GPU的测量值, 测量过的保留原值, 其余插值的平均误差很小。
+        rows = [(job_name, g, data[job_name][g].epoch_num, data[job_name][g].epoch_time)
+                for job_name in job_names for g in [1, 2, 4, 8]]
+        dense, flags = fit_training_data(rows, job_names, 8)
+        self.assertEqual(flags, {})
+        errors = []
+        for job_name in job_names:
+            self.assertEqual(dense[job_name][4], data[job_name][4])
+            errors += [abs(dense[job_name][g].epoch_time / data[job_name][g].epoch_time - 1) for g in [3, 5, 6, 7]]
+        self.assertLess(sum(errors) / len(errors), 0.05)
+
+        # 超出测量范围时按幂律外推, 测量点过少或需要外推的作业会被标记。
+        self.assertEqual(fit_speedup_exponent(np.array([1., 2, 4]), np.array([8., 4, 2])), 1)
+        self.assertEqual(fit_speedup_exponent(np.array([1., 2]), np.array([8., 9])), 0)
+        dense, flags = fit_training_data(rows + [('extra', 4, 10, 5.0)], job_names + ['extra'], 256)
+        self.assertEqual(set(flags), set(job_names + ['extra']))
+        self.assertIn('仅有1个测量点', flags['extra'])
+        self.assertIn('最少测量到4个GPU, 外推至1个GPU', flags['extra'])
+        self.assertNotIn('外推至1个GPU', flags[job_names[0]])
+        _, flags = fit_training_data([(job_name, g, 10, 8.0 / g) for job_name in job_names for g in [2, 4, 8]],
+                                     job_names, 8)
+        self.assertEqual(flags, {job_name: '最少测量到2个GPU, 外推至1个GPU' for job_name in job_names})
+        self.assertEqual(dense['extra'][2], TrainingData(10, 10.0))
+        self.assertEqual(dense['extra'][256], TrainingData(10, 0.078))
+        for job_name in job_names:
+            times = [dense[job_name][g].epoch_time for g in range(8, 257)]
+            self.assertTrue(all(t > 0 for t in times))
+            self.assertTrue(all(x >= y for x, y in zip(times, times[1:])))
+        with self.assertRaisesRegex(ValueError, 'missing'):
+            fit_training_data(rows, job_names + ['missing'], 8)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = optimus_execution(job_names, 256, dense)
+        self.assertEqual(sum(ts.gpu_num for batch in plan.plan for ts in batch.slice_list), 256)
+
+        # 插值时超过目标GPU数目的测量值同样参与拟合: 9~12个GPU在8和16个GPU的测量值之间插值而不是外推,
+        # 只测量了1和16个GPU的作业在两者之间插值而不是按单点的线性加速估计。
+        with tempfile.TemporaryDirectory() as source_dir:
+            source = CSVSource(os.path.join(source_dir, 'training_times.csv'))
+            source.write_rows([('a', g, 10, t) for g, t in [(1, 100.0), (2, 50.0), (4, 25.0), (8, 12.5), (16, 12.5)]] +
+                              [('b', g, 10, t) for g, t in [(1, 100.0), (16, 50.0)]])
+            self.assertEqual(len(source.fetch_rows(['a', 'b'], 8)), 5)
+            with contextlib.redirect_stdout(io.StringIO()):
+                dense_a = source.get_training_data(['a'], 12, interpolate=True)
+                dense_b = source.get_training_data(['b'], 8, interpolate=True)
+        self.assertEqual(sorted(dense_a['a']), list(range(1, 13)))
+        self.assertEqual(dense_a['a'][12], TrainingData(10, 12.5))
+        self.assertAlmostEqual(dense_b['b'][8].epoch_time, 100 * 0.5 ** 0.75, places=3)
+
+    def test_local_search(self):
+        import numpy as np
+        import benchmark
+        from experiment import sequential_execution
+        from fitness import pack_training_data, cal_group_fitness, get_batch_states
+        from local_search import LocalSearch, local_search_execution, get_groups, get_orders
+        job_names, data = generate_training_data(20, 8, 0)
+        epoch_num, epoch_time = pack_training_data(job_names, 8, data)
+        rd = random.Random(0)
+        orders = [rd.randint(1, 6) for _ in range(20)]
+        self.assertEqual(get_orders(get_groups(orders), 20), get_orders(get_groups([o * 2 for o in orders]), 20))
+
+        # 只重新计算涉及的两个批次得到的时间变化与完整评估一致。
+        search = LocalSearch(job_names, 8, data, False)
+        groups = get_groups(orders)
+        total_time = cal_group_fitness(np.array([orders]), 8, epoch_num, epoch_time, False)[0][0]
+        self.assertAlmostEqual(search.get_total_time(orders), total_time)
+        moves = search.get_moves(groups)
+        neighbours = np.array([get_orders(search.apply_move(groups, *move), 20) for _, move in moves])
+        neighbour_time = cal_group_fitness(neighbours, 8, epoch_num, epoch_time, False)[0]
+        self.assertTrue(np.allclose([delta for delta, _ in moves], neighbour_time - total_time))
+
+        for used_slice in [False, True]:
+            search = LocalSearch(job_names, 8, data, used_slice)
+            start_time = search.get_total_time(orders)
+            best_orders = search.improve(orders)
+            best_time = cal_group_fitness(np.array([best_orders]), 8, epoch_num, epoch_time, used_slice)[0][0]
+            self.assertLess(best_time, start_time)
+            self.assertGreater(search.move_nums, 0)
+            if not used_slice:
+                self.assertTrue(all(delta >= -1e-9 for delta, _ in search.get_moves(get_groups(best_orders))))
+
+        # 利用空闲时间片时从涉及的第一个分组的前一个批次继续模拟, 结果与完整评估一致。
+        search = LocalSearch(job_names, 8, data, True)
+        moves = [move for _, move in search.get_moves(groups)]
+        neighbours = [search.apply_move(groups, *move) for move in moves]
+        batch_states = get_batch_states(get_orders(groups, 20), 8, epoch_num, epoch_time)
+        neighbour_time, get_states = search.get_neighbour_time(groups, moves, neighbours, batch_states)
+        neighbour_orders = np.array([get_orders(neighbour, 20) for neighbour in neighbours])
+        self.assertTrue(np.array_equal(neighbour_time,
+                                       cal_group_fitness(neighbour_orders, 8, epoch_num, epoch_time, True)[0]))
+        for i in [0, len(moves) // 2, len(moves) - 1]:
+            # 同一次模拟中其他邻居的批次更多时, 多出的批次只在末尾补齐, 不会被用到。
+            prefix_times = get_batch_states(neighbour_orders[i], 8, epoch_num, epoch_time)[1]
+            self.assertEqual(get_states(i)[1][:len(prefix_times)], prefix_times)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = sequential_execution(job_names, 8, data)
+            total_time = plan.total_time
+            refined_plan = local_search_execution(plan, job_names, 8, data, False)
+            self.assertLess(refined_plan.total_time, total_time)
+            self.assertIs(local_search_execution(refined_plan, job_names, 8, data, False), refined_plan)
+
+        args = benchmark.parser.parse_args(['--local-search', '--jobs', '10', '--gpus', '4', '-i', '2', '-n', '4'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchmark.local_search_benchmark(args)
+        self.assertEqual([r['scheduler'] for r in results], ['ga', 'ga_slice'])
+        for r in results:
+            self.assertLessEqual(r['local_search_total_time'], r['ga_total_time'])
+            self.assertGreater(r['wall_time'], 0)
+
+    def test_multi_objective(self):
+        import numpy as np
+        from experiment import cal_individual_plan
+        from fitness import pack_training_data, cal_group_fitness, cal_group_objectives
+        from multi_objective import non_dominated_sort, crowding_distance, evaluate_objectives, nsga_execution
+        job_names, data = generate_training_data(20, 8, 0)
+        epoch_num, epoch_time = pack_training_data(job_names, 8, data)
+        rd = random.Random(0)
+        orders = np.array([[rd.randint(1, 8) for _ in range(20)] for _ in range(30)])
+        for used_slice in [False, True]:
+            total_time, utilization_rate, average_jct = cal_group_objectives(orders, 8, epoch_num, epoch_time,
+                                                                             used_slice)
+            expected_time, expected_rate = cal_group_fitness(orders, 8, epoch_num, epoch_time, used_slice)
+            self.assertTrue(np.allclose(total_time, expected_time))
+            self.assertTrue(np.allclose(utilization_rate, expected_rate))
+            # 平均JCT与按执行方案逐个时间片推算的作业结束时刻一致, 拆分的作业取最后一部分的结束时刻,
+            # 已全部填入前一批次的作业在原批次中剩余0次迭代, 不计入。
+            for k in range(len(orders)):
+                individual = Individual(orders[k].tolist())
+                cal_individual_plan(individual, 8, job_names, data, used_slice)
+                end_time = {}
+                for record in filter(lambda r: r['epoch_num'] > 0, iter_plan_records(individual.plan)):
+                    end_time[record['job_name']] = max(end_time.get(record['job_name'], 0), record['end_time'])
+                self.assertAlmostEqual(average_jct[k], sum(end_time.values()) / 20, places=6)
+
+        # 分层和拥挤距离与逐对比较的实现一致。
+        objectives = np.round(np.random.default_rng(0).random((60, 3)), 1)
+        ranks = non_dominated_sort(objectives)
+        remain = set(range(len(objectives)))
+        rank = 0
+        while remain:
+            front = {i for i in remain if not any(np.all(objectives[j] <= objectives[i]) and
+                                                  np.any(objectives[j] < objectives[i]) for j in remain)}
+            self.assertEqual(set(np.nonzero(ranks == rank)[0]), front)
+            remain -= front
+            rank += 1
+        distance = crowding_distance(objectives, ranks)
+        for rank in range(ranks.max() + 1):
+            front = np.nonzero(ranks == rank)[0]
+            expected = np.zeros(len(front))
+            for m in range(3):
+                order = np.lexsort((objectives[front, m], np.zeros(len(front))))
+                values = objectives[front[order], m]
+                span = values[-1] - values[0] if values[-1] > values[0] else 1
+                expected[order[0]] = expected[order[-1]] = np.inf
+                expected[order[1:-1]] += (values[2:] - values[:-2]) / span
+            self.assertTrue(np.allclose(distance[front], expected))
+
+        # Pareto前沿中的方案互不支配、按完成时间排列, 相同种子的结果可以复现。
+        args = make_args(iteration_times=30, individual_num=40, seed=1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            pareto_plans = nsga_execution(job_names, 8, data, args, True)
+            self.assertEqual([p.orders for p in nsga_execution(job_names, 8, data, args, True)],
+                             [p.orders for p in pareto_plans])
+        front = np.array([[p.total_time, -p.utilization_rate, p.average_jct] for p in pareto_plans])
+        self.assertTrue(np.all(non_dominated_sort(front) == 0))
+        self.assertEqual([p.total_time for p in pareto_plans], sorted(p.total_time for p in pareto_plans))
+        self.assertTrue(np.allclose(evaluate_objectives(np.array([p.orders for p in pareto_plans]), 8, epoch_num,
+                                                        epoch_time, True), front))
+        for pareto_plan in pareto_plans:
+            self.assertAlmostEqual(pareto_plan.plan.total_time, pareto_plan.total_time)
+
+    def test_service(self):
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor
+        from experiment import sequential_execution
+        from service import SchedulerService, parser as service_parser
+        async def request(port: int, method: str, path: str, body=None) -> tuple:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            payload = json.dumps(body).encode('utf-8') if body is not None else b''
+            writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+            response = await reader.read()
+            writer.close()
+            head, _, content = response.partition(b'\r\n\r\n')
+            return int(head.split()[1]), json.loads(content.decode('utf-8'))
+
+        async def run(service: SchedulerService) -> list:
+            server = await service.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            results = [await request(port, 'POST', '/schedule', {'scheduler': 'sequential', 'category': 'image'}),
+                       await request(port, 'POST', '/schedule', {'scheduler': 'sequential', 'category': 'image'})]
+            # 耗时的遗传算法在进程池中执行时, 其他请求仍能立即得到响应。
+            ga_request = asyncio.ensure_future(request(port, 'POST', '/schedule', {
+                'scheduler': 'ga_slice', 'category': 'image', 'options': {'iteration_times': 200, 'seed': 1}}))
+            await asyncio.sleep(0.05)
+            results.append(await request(port, 'GET', '/status'))
+            results.append(await ga_request)
+            job_names = service.load_category('image') + service.load_category('action')[:1]
+            results.append(await request(port, 'POST', '/schedule', {
+                'scheduler': 'ga_slice', 'job_names': job_names, 'options': {'iteration_times': 200, 'seed': 1}}))
+            results.append(await request(port, 'POST', '/schedule', {
+                'scheduler': 'ga_slice', 'category': 'image', 'options': {'iteration_times': 200, 'seed': 1},
+                'refresh': True}))
+            for body in [{'scheduler': 'unknown', 'category': 'image'}, {'category': 'unknown'},
+                         {'category': 'image', 'options': {'unknown': 1}}, {'job_names': ['unknown']}]:
+                results.append(await request(port, 'POST', '/schedule', body))
+            results.append(await request(port, 'GET', '/schedule'))
+            results.append(await request(port, 'GET', '/unknown'))
+            server.close()
+            await server.wait_closed()
+            return results
+
+        args = service_parser.parse_args(['--source', 'csv', '--categories', 'image', '--pool-workers', '1'])
+        with ProcessPoolExecutor(1) as executor:
+            service = SchedulerService(args, make_args(), executor)
+            service.preload(args.categories)
+            self.assertEqual(service.get_status()['profiles'], {'8': len(service.load_category('image'))})
+            results = asyncio.run(run(service))
+
+        job_names = service.load_category('image')
+        data = get_training_data(job_names, 8, source_type='csv')
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = sequential_execution(job_names, 8, data)
+        (status, first), (_, second), (_, running), (_, ga), (_, similar), (_, repeated) = results[:6]
+        self.assertEqual(status, 200)
+        self.assertAlmostEqual(first['makespan'], plan.total_time)
+        self.assertEqual([record['job_name'] for record in first['jobs']],
+                         [record['job_name'] for record in iter_plan_records(plan)])
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(second['jobs'], first['jobs'])
+        self.assertEqual(running['running'], 1)
+        # 相近的作业集合从之前的最优染色体开始演化, 相同种子的结果可以复现。
+        self.assertEqual(ga['warm_start'], 0)
+        self.assertGreater(similar['warm_start'], 0)
+        self.assertEqual({record['job_name'] for record in similar['jobs']},
+                         set(job_names + service.load_category('action')[:1]))
+        self.assertGreater(repeated['warm_start'], 0)
+        self.assertLessEqual(repeated['makespan'], ga['makespan'])
+        self.assertEqual([status for status, _ in results[6:]], [400, 400, 400, 400, 405, 404])
+        self.assertEqual(service.get_status()['plan_cache'], {'size': 3, 'hits': 1, 'misses': 5})
+
+    def test_lazy_imports(self):
+        import benchmark
+        # 其他测试可能已经在当前进程加载了可选依赖, 因此在新的解释器中检查导入了哪些可选依赖。
+        def get_optional_modules(code: str) -> list:
+            completed = subprocess.run([sys.executable, '-c', f'import sys\n{code}\n'
+                                        f'print(" ".join(m for m in {benchmark.OPTIONAL_MODULES} if m in sys.modules))'],
+                                       stdout=subprocess.PIPE, universal_newlines=True, check=True)
+            return completed.stdout.split()
+
+        self.assertEqual(get_optional_modules('import main, database, workload, draw_epoch, draw_experience'), [])
+        job_names = "[job_name.strip() for job_name in open('./job_name_data/image.txt') if job_name.strip()]"
+        self.assertEqual(get_optional_modules(f'from database import get_training_data\n'
+                                              f'get_training_data({job_names}, 8, source_type="csv")'), [])
+        self.assertEqual(get_optional_modules(f'from database import get_training_data\n'
+                                              f'get_training_data({job_names}, 8, source_type="csv", '
+                                              f'interpolate=True)'), ['numpy'])
+
+        stderr = 'import time: self [us] | cumulative | imported package\n' \
+                 'import time:       100 |        100 |   numpy.core\n' \
+                 'import time:        50 |        150 | numpy\n' \
+                 'import time:        20 |         20 | json\n'
+        import_time, modules = benchmark.parse_import_time(stderr)
+        self.assertAlmostEqual(import_time, 170e-6)
+        self.assertEqual(modules, ['numpy'])
+
+        args = benchmark.parser.parse_args(['--startup', '--startup-commands', 'help', '--startup-repeat', '1'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchmark.startup_benchmark(args)
+        self.assertEqual([(r['command'], r['optional_modules']) for r in results], [('help', [])])
+        self.assertEqual(benchmark.check_startup_regression(results, results, args), [])
+        slower = [dict(r, wall_time=r['wall_time'] + 1, optional_modules=['mysql']) for r in results]
+        self.assertEqual(len(benchmark.check_startup_regression(slower, results, args)), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
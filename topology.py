@@ -0,0 +1,107 @@
+import heapq
+from typing import List, Dict, Tuple
+
+from entity import TrainingData, TimeSlice, Batch, Plan, Cluster
+
+
+class NodePool:
+    def __init__(self, cluster: Cluster):
+        self.gpus_per_node = cluster.gpus_per_node
+        self.free = [cluster.gpus_per_node] * cluster.node_num
+        # 按空闲GPU数目分桶, 桶内为节点编号的最小堆, 节点空闲数变化后旧条目在弹出时丢弃。
+        self.buckets = [[] for _ in range(cluster.gpus_per_node + 1)]
+        self.buckets[cluster.gpus_per_node] = list(range(cluster.node_num))
+        self.counts = [0] * (cluster.gpus_per_node + 1)
+        self.counts[cluster.gpus_per_node] = cluster.node_num
+
+    def _take(self, free_num: int, gpu_num: int) -> List[int]:
+        bucket = self.buckets[free_num]
+        while self.free[bucket[0]] != free_num:
+            heapq.heappop(bucket)
+        node = heapq.heappop(bucket)
+        start = node * self.gpus_per_node + self.gpus_per_node - free_num
+        self.free[node] -= gpu_num
+        self.counts[free_num] -= 1
+        self.counts[self.free[node]] += 1
+        heapq.heappush(self.buckets[self.free[node]], node)
+        return list(range(start, start + gpu_num))
+
+    def allocate(self, gpu_num: int) -> List[int]:
+        full_num, remain_num = divmod(gpu_num, self.gpus_per_node)
+        fit_num = next((free_num for free_num in range(remain_num, self.gpus_per_node)
+                        if remain_num > 0 and self.counts[free_num] > 0), self.gpus_per_node)
+        gpu_ids = []
+        if self.counts[self.gpus_per_node] >= full_num + (fit_num == self.gpus_per_node and remain_num > 0):
+            # 优先占用整节点, 余下的GPU放在空闲数最接近的节点上(最佳适应), 跨越的节点数最少。
+            for _ in range(full_num):
+                gpu_ids += self._take(self.gpus_per_node, self.gpus_per_node)
+            if remain_num > 0:
+                gpu_ids += self._take(fit_num, remain_num)
+            return gpu_ids
+        # 碎片化导致无法以最少的节点放下时, 余下的GPU能放进某个节点则最佳适应, 否则从空闲GPU最多的节点
+        # (优先整节点)起逐个占用, 每个节点最多占用其空闲的GPU。
+        while gpu_num > 0:
+            if gpu_num <= self.gpus_per_node:
+                fit_num = next((free_num for free_num in range(gpu_num, self.gpus_per_node + 1)
+                                if self.counts[free_num] > 0), 0)
+                if fit_num > 0:
+                    return gpu_ids + self._take(fit_num, gpu_num)
+            free_num = next(free_num for free_num in range(self.gpus_per_node, 0, -1) if self.counts[free_num] > 0)
+            take_num = min(gpu_num, free_num)
+            gpu_ids += self._take(free_num, take_num)
+            gpu_num -= take_num
+        return gpu_ids
+
+
+def place_batch(batch: Batch, cluster: Cluster):
+    pool = NodePool(cluster)
+    for ts in sorted(batch.slice_list, key=lambda s: s.gpu_num, reverse=True):
+        ts.gpu_ids = pool.allocate(ts.gpu_num)
+
+
+def get_slice_node_span(ts: TimeSlice, cluster: Cluster) -> int:
+    return len(set(gpu_id // cluster.gpus_per_node for gpu_id in ts.gpu_ids))
+
+
+def place_plan(plan: Plan,
+               cluster: Cluster,
+               data: Dict[str, Dict[int, TrainingData]]):
+    # data为Cluster.adjust_training_data调整后的数据, 已按最少节点数计入跨节点开销,
+    # 这里只需修正因碎片化而跨越了更多节点的时间片。
+    changed = False
+    for batch in plan.plan:
+        place_batch(batch, cluster)
+        for ts in batch.slice_list:
+            node_span = get_slice_node_span(ts, cluster)
+            if node_span == cluster.get_node_span(ts.gpu_num):
+                continue
+            ratio = cluster.get_speed(cluster.get_node_span(ts.gpu_num)) / cluster.get_speed(node_span)
+            for job in ts.job_list:
+                job.epoch_time = data[job.name][ts.gpu_num].epoch_time * ratio
+                job.cal_completion_time()
+            ts.cal_actual_length()
+            changed = True
+    if changed:
+        plan.arrange_plan()
+
+
+def get_node_placement(batch: Batch, cluster: Cluster) -> Dict[int, List[Tuple[str, List[int]]]]:
+    placement = {}
+    for ts in batch.slice_list:
+        job_names = '+'.join(job.name for job in ts.job_list)
+        for gpu_id in ts.gpu_ids:
+            node_jobs = placement.setdefault(gpu_id // cluster.gpus_per_node, [])
+            if len(node_jobs) == 0 or node_jobs[-1][0] != job_names:
+                node_jobs.append((job_names, []))
+            node_jobs[-1][1].append(gpu_id % cluster.gpus_per_node)
+    return dict(sorted(placement.items()))
+
+
+def print_placement(plan: Plan, cluster: Cluster):
+    print(f'节点分配({cluster.node_num}个节点, 每个节点{cluster.gpus_per_node}个GPU):')
+    print('=' * 100)
+    for batch in plan.plan:
+        for node, node_jobs in get_node_placement(batch, cluster).items():
+            print(f'节点{node}: ' + ', '.join(f'{job_names}{gpu_ids}' for job_names, gpu_ids in node_jobs))
+        print('-' * 100)
+    print('=' * 100)
@@ -0,0 +1,118 @@
+import argparse
+import math
+import random
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Iterator
+
+from database import get_data_source
+from entity import TrainingData
+
+SCALING_MODELS = ['amdahl', 'power', 'communication']
+SIZE_DISTRIBUTIONS = ['uniform', 'lognormal', 'pareto']
+
+
+@dataclass
+class JobProfile:
+    name: str
+    epoch_num: int
+    epoch_time: float
+    model: str
+    parallel_fraction: float = 1
+    alpha: float = 1
+    communication_cost: float = 0
+
+    def get_epoch_time(self, gpu_num: int) -> float:
+        if self.model == 'amdahl':
+            ratio = 1 - self.parallel_fraction + self.parallel_fraction / gpu_num
+        elif self.model == 'power':
+            ratio = gpu_num ** -self.alpha
+        else:
+            # 通信开销随GPU数目线性增长, GPU过多时迭代时间反而变长(如seresnet101在8个GPU时)。
+            ratio = 1 - self.parallel_fraction + self.parallel_fraction / gpu_num + \
+                    self.communication_cost * (gpu_num - 1)
+        return max(round(self.epoch_time * ratio, 3), 0.001)
+
+
+def get_job_size(rd: random.Random, distribution: str) -> float:
+    if distribution == 'uniform':
+        return rd.uniform(10, 300)
+    elif distribution == 'lognormal':
+        return min(rd.lognormvariate(math.log(60), 0.8), 3600)
+    return min(10 * rd.paretovariate(1.5), 3600)
+
+
+def generate_profiles(job_nums: int,
+                      seed: int,
+                      model: str = 'mixed',
+                      distribution: str = 'lognormal',
+                      prefix: str = 'job') -> List[JobProfile]:
+    rd = random.Random(seed)
+    profiles = []
+    for i in range(job_nums):
+        job_model = rd.choice(SCALING_MODELS) if model == 'mixed' else model
+        profiles.append(JobProfile(name=f'{prefix}{i}',
+                                   epoch_num=rd.randint(10, 100),
+                                   epoch_time=get_job_size(rd, distribution),
+                                   model=job_model,
+                                   parallel_fraction=rd.uniform(0.7, 0.99),
+                                   alpha=rd.uniform(0.5, 0.95),
+                                   communication_cost=rd.uniform(0.002, 0.02)))
+    return profiles
+
+
+def generate_rows(profiles: List[JobProfile],
+                  max_gpu_num: int) -> Iterator[Tuple[str, int, int, float]]:
+    for profile in profiles:
+        for gpu_num in range(1, max_gpu_num + 1):
+            yield profile.name, gpu_num, profile.epoch_num, profile.get_epoch_time(gpu_num)
+
+
+def generate_training_data(job_nums: int,
+                           max_gpu_num: int,
+                           seed: int,
+                           model: str = 'mixed',
+                           distribution: str = 'lognormal') -> Tuple[List[str], Dict[str, Dict[int, TrainingData]]]:
+    profiles = generate_profiles(job_nums, seed, model, distribution)
+    data = {profile.name: {} for profile in profiles}
+    for job_name, gpu_num, epoch_num, epoch_time in generate_rows(profiles, max_gpu_num):
+        data[job_name][gpu_num] = TrainingData(epoch_num, epoch_time)
+    return [profile.name for profile in profiles], data
+
+
+def generate_arrivals(job_names: List[str],
+                      arrival_nums: int,
+                      arrival_rate: float,
+                      seed: int) -> List[Tuple[float, str]]:
+    # 泊松到达过程, 每次到达的作业从作业种类中等概率抽取。
+    rd = random.Random(seed)
+    arrivals = []
+    arrival_time = 0
+    for _ in range(arrival_nums):
+        arrivals.append((arrival_time, rd.choice(job_names)))
+        arrival_time += rd.expovariate(arrival_rate)
+    return arrivals
+
+
+parser = argparse.ArgumentParser(description='')
+parser.add_argument('-n', '--job-nums', default=100, type=int)
+parser.add_argument('-g', '--gpu-num', default=64, type=int)
+parser.add_argument('-s', '--seed', default=0, type=int)
+parser.add_argument('-m', '--model', default='mixed', choices=['mixed'] + SCALING_MODELS)
+parser.add_argument('-d', '--distribution', default='lognormal', choices=SIZE_DISTRIBUTIONS)
+parser.add_argument('--source', default=None, choices=['mysql', 'sqlite', 'csv', 'json'])
+parser.add_argument('--source-path', default=None, type=str)
+parser.add_argument('--prefix', default='job', type=str)
+parser.add_argument('--job-names', default=None, type=str)
+
+
+def main():
+    args = parser.parse_args()
+    profiles = generate_profiles(args.job_nums, args.seed, args.model, args.distribution, args.prefix)
+    get_data_source(args.source, args.source_path).write_rows(generate_rows(profiles, args.gpu_num))
+    if args.job_names is not None:
+        with open(args.job_names, 'w') as f:
+            f.write('\n'.join(profile.name for profile in profiles))
+
+
+if __name__ == '__main__':
+    main()